@@ -3,6 +3,7 @@ from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 from alembic import context
 from app.db.database import Base
+from app.models import chat, message, user  # noqa: F401 - таблицы для autogenerate
 from app.core.config import settings
 
 config = context.config
@@ -15,11 +16,16 @@ target_metadata = Base.metadata
 def get_url():
     return settings.DATABASE_URL
 
+def include_object(object, name, type_, reflected, compare_to):
+    # Таблицы FTS5-поиска создаются DDL-событием messages, моделей у них нет
+    return not (type_ == "table" and reflected and name.startswith("messages_fts"))
+
 def run_migrations_offline() -> None:
     url = get_url()
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -38,7 +44,11 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            # SQLite меняет таблицы через пересоздание (batch mode)
+            render_as_batch=connection.dialect.name == "sqlite",
         )
 
         with context.begin_transaction():
@@ -0,0 +1,32 @@
+"""index messages by (chat_id, id)
+
+Revision ID: 1a7e3c5d9f20
+Revises:
+Create Date: 2026-10-18 15:40:00.000000
+
+Keyset pagination of chat history (WHERE chat_id = ? AND id < ? ORDER BY
+id DESC) and unread counts are range scans over this index. create_all
+does not add indexes to existing tables, so databases created before it
+get it here.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1a7e3c5d9f20'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    indexes = {index["name"] for index in sa.inspect(op.get_bind()).get_indexes("messages")}
+    if "ix_messages_chat_id_id" not in indexes:
+        op.create_index("ix_messages_chat_id_id", "messages", ["chat_id", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_chat_id_id", table_name="messages")
@@ -0,0 +1,53 @@
+"""chat list summary columns
+
+Revision ID: 2b8f4d6a0c31
+Revises: 1a7e3c5d9f20
+Create Date: 2026-10-18 15:50:00.000000
+
+chats.last_message_* hold the last message for the chat list and
+user_chat.last_read_message_id the read marker for unread counts. Only
+the schema is changed here; existing chats get their values from
+app/scripts/backfill_chat_summary.py. Columns already created by
+create_all are left alone.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b8f4d6a0c31'
+down_revision: Union[str, None] = '1a7e3c5d9f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _columns() -> dict:
+    # Новые объекты Column на каждый вызов: колонка привязывается к таблице
+    return {
+        "chats": [
+            sa.Column("last_message_id", sa.Integer(), nullable=True),
+            sa.Column("last_message_preview", sa.String(), nullable=True),
+            sa.Column("last_message_at", sa.DateTime(timezone=True), nullable=True),
+        ],
+        "user_chat": [
+            sa.Column("last_read_message_id", sa.Integer(), nullable=False, server_default="0"),
+        ],
+    }
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for table, columns in _columns().items():
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        for column in columns:
+            if column.name not in existing:
+                op.add_column(table, column)
+
+
+def downgrade() -> None:
+    for table, columns in _columns().items():
+        with op.batch_alter_table(table) as batch:
+            for column in reversed(columns):
+                batch.drop_column(column.name)
@@ -0,0 +1,115 @@
+"""consolidate chat participants into user_chat
+
+Revision ID: 3f1c2a9d7b10
+Revises: 5d0b6f8e2c53
+Create Date: 2026-10-18 12:00:00.000000
+
+user_chat gets the joined_at and role columns and absorbs the unused
+chat_participants table. It gains an index leading with chat_id for the
+participants-of-a-chat direction; the (user_id, chat_id) key already
+serves chats-of-a-user. On SQLite the table is rebuilt WITHOUT ROWID, so
+the key itself is the covering index for that direction.
+
+Existing memberships get joined_at = chat creation time (or the
+chat_participants value where there is one) and the chat creator
+becomes its owner. Safe on databases already created by create_all with
+the new schema: only the missing parts are applied.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a9d7b10'
+down_revision: Union[str, None] = '5d0b6f8e2c53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Enum хранит имена членов ChatRole, как и messages.message_type
+role_type = sa.Enum("OWNER", "ADMIN", "MEMBER", name="chatrole")
+
+
+def _recreate(bind) -> str:
+    # SQLite не умеет ADD COLUMN с DEFAULT CURRENT_TIMESTAMP и не меняет
+    # WITHOUT ROWID на месте - таблица пересобирается
+    return "always" if bind.dialect.name == "sqlite" else "auto"
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = inspector.get_table_names()
+    columns = {column["name"] for column in inspector.get_columns("user_chat")}
+    indexes = {index["name"] for index in inspector.get_indexes("user_chat")}
+
+    if not {"joined_at", "role"} <= columns:
+        role_type.create(bind, checkfirst=True)
+        with op.batch_alter_table(
+            "user_chat", recreate=_recreate(bind), table_kwargs={"sqlite_with_rowid": False}
+        ) as batch:
+            if "joined_at" not in columns:
+                batch.add_column(sa.Column(
+                    "joined_at", sa.DateTime(timezone=True), nullable=False,
+                    server_default=sa.func.now(),
+                ))
+            if "role" not in columns:
+                batch.add_column(sa.Column(
+                    "role", role_type, nullable=False, server_default="MEMBER"
+                ))
+        # Время вступления неизвестно - берём время создания чата
+        if "joined_at" not in columns:
+            op.execute(
+                "UPDATE user_chat SET joined_at = COALESCE("
+                "(SELECT chats.created_at FROM chats WHERE chats.id = user_chat.chat_id), "
+                "joined_at)"
+            )
+        if "role" not in columns:
+            op.execute(
+                "UPDATE user_chat SET role = 'OWNER' WHERE EXISTS ("
+                "SELECT 1 FROM chats WHERE chats.id = user_chat.chat_id "
+                "AND chats.creator_id = user_chat.user_id)"
+            )
+
+    if "chat_participants" in tables:
+        op.execute(
+            "UPDATE user_chat SET joined_at = ("
+            "SELECT cp.joined_at FROM chat_participants cp "
+            "WHERE cp.chat_id = user_chat.chat_id AND cp.user_id = user_chat.user_id) "
+            "WHERE EXISTS (SELECT 1 FROM chat_participants cp "
+            "WHERE cp.chat_id = user_chat.chat_id AND cp.user_id = user_chat.user_id "
+            "AND cp.joined_at IS NOT NULL)"
+        )
+        op.execute(
+            "INSERT INTO user_chat (user_id, chat_id, joined_at) "
+            "SELECT cp.user_id, cp.chat_id, COALESCE(cp.joined_at, CURRENT_TIMESTAMP) "
+            "FROM chat_participants cp WHERE NOT EXISTS ("
+            "SELECT 1 FROM user_chat uc "
+            "WHERE uc.chat_id = cp.chat_id AND uc.user_id = cp.user_id)"
+        )
+        op.drop_table("chat_participants")
+
+    if "ix_user_chat_chat_id_user_id" not in indexes:
+        op.create_index("ix_user_chat_chat_id_user_id", "user_chat", ["chat_id", "user_id"])
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    op.create_table(
+        "chat_participants",
+        sa.Column("chat_id", sa.Integer(), sa.ForeignKey("chats.id"), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("joined_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.execute(
+        "INSERT INTO chat_participants (chat_id, user_id, joined_at) "
+        "SELECT chat_id, user_id, joined_at FROM user_chat"
+    )
+    op.drop_index("ix_user_chat_chat_id_user_id", table_name="user_chat")
+    with op.batch_alter_table(
+        "user_chat", recreate=_recreate(bind), table_kwargs={"sqlite_with_rowid": True}
+    ) as batch:
+        batch.drop_column("role")
+        batch.drop_column("joined_at")
+    role_type.drop(bind, checkfirst=True)
@@ -0,0 +1,56 @@
+"""per-chat message numbers
+
+Revision ID: 4c9a5e7b1d42
+Revises: 2b8f4d6a0c31
+Create Date: 2026-10-18 16:10:00.000000
+
+messages.seq numbers messages inside a chat (handed out through
+chats.last_seq) so a reconnecting client can fetch what it missed with
+WHERE chat_id = ? AND seq > ?. Existing messages keep seq NULL here - the
+unique index allows that - and get numbered by
+app/scripts/backfill_message_seq.py, which has to run before the app
+starts writing. Parts already created by create_all are left alone.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c9a5e7b1d42'
+down_revision: Union[str, None] = '2b8f4d6a0c31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _columns() -> dict:
+    # Новые объекты Column на каждый вызов: колонка привязывается к таблице
+    return {
+        "chats": [
+            sa.Column("last_seq", sa.Integer(), nullable=False, server_default="0"),
+        ],
+        "messages": [
+            sa.Column("seq", sa.Integer(), nullable=True),
+        ],
+    }
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for table, columns in _columns().items():
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        for column in columns:
+            if column.name not in existing:
+                op.add_column(table, column)
+    indexes = {index["name"] for index in inspector.get_indexes("messages")}
+    if "ix_messages_chat_id_seq" not in indexes:
+        op.create_index("ix_messages_chat_id_seq", "messages", ["chat_id", "seq"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_chat_id_seq", table_name="messages")
+    for table, columns in _columns().items():
+        with op.batch_alter_table(table) as batch:
+            for column in reversed(columns):
+                batch.drop_column(column.name)
@@ -0,0 +1,70 @@
+"""full-text search index over messages
+
+Revision ID: 5d0b6f8e2c53
+Revises: 4c9a5e7b1d42
+Create Date: 2026-10-18 16:20:00.000000
+
+The FTS5 table messages_fts (external content over messages) and the
+triggers that keep it in sync, as created by create_all on SQLite. A
+new index is filled from the existing messages; one that is already
+there is left alone. Other dialects have no search, nothing to do.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d0b6f8e2c53'
+down_revision: Union[str, None] = '4c9a5e7b1d42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Копия app.models.message.MESSAGE_SEARCH_DDL на момент этой ревизии
+SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, content='messages', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite":
+        return
+    exists = "messages_fts" in sa.inspect(bind).get_table_names()
+    for statement in SEARCH_DDL:
+        op.execute(statement)
+    if not exists:
+        # Внешнее содержимое: индекс читает уже лежащие в messages строки
+        op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for trigger in ("messages_fts_insert", "messages_fts_delete", "messages_fts_update"):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS messages_fts")
@@ -0,0 +1,35 @@
+"""add users.role
+
+Revision ID: 8c4d2e7a5b31
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 17:00:00.000000
+
+The role ("USER" or "ADMIN") the admin endpoints, the users role
+endpoint and the create_admin script rely on. Some existing databases
+already got the column by hand, so it is only added where missing.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4d2e7a5b31'
+down_revision: Union[str, None] = '3f1c2a9d7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("users")}
+    if "role" not in columns:
+        # ADD COLUMN с постоянным DEFAULT SQLite умеет без пересборки
+        op.add_column("users", sa.Column(
+            "role", sa.String(), nullable=False, server_default="USER"
+        ))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("role")
@@ -1,9 +1,10 @@
 from fastapi import APIRouter
-from app.api.endpoints import auth, chat, message, users
+from app.api.endpoints import admin, auth, chat, message, users
 
 api_router = APIRouter()
 
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(chat.router, prefix="/chats", tags=["chats"])
-api_router.include_router(message.router, prefix="/messages", tags=["messages"]) 
\ No newline at end of file
+api_router.include_router(message.router, prefix="/messages", tags=["messages"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"]) 
\ No newline at end of file
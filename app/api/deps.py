@@ -1,15 +1,15 @@
-from typing import Generator, Optional
+from typing import AsyncGenerator, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
-from pydantic import ValidationError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 import logging
 
+from app.core.cache import principal_cache
 from app.core.config import settings
 from app.core.security import verify_token
-from app.db.database import SessionLocal
-from app.services.user import UserService
+from app.db.database import AsyncSessionLocal
+from app.services.user import AsyncUserService
 from app.models.user import User
 
 # Настройка логирования
@@ -18,47 +18,63 @@ logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
-def get_db() -> Generator:
-    db = SessionLocal()
-    try:
+# Что из пользователя держит кэш принципала: только нужное для
+# авторизации, без хэша пароля
+PRINCIPAL_FIELDS = ("id", "username", "email", "is_active", "role")
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    """The one async session dependency of the API; tests override it here."""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+async def get_user_from_token(db: AsyncSession, token: str) -> Optional[User]:
+    """Resolve a bearer token to its user, or None if it is invalid."""
+    # Подпись проверяется один раз, дальше claims берутся из кэша до exp
+    payload = verify_token(token)
+    if payload is None:
+        logger.error("Invalid or expired token")
+        return None
+    username: Optional[str] = payload.get("sub")
+    if username is None:
+        logger.error("Username not found in token")
+        return None
+
+    # Сначала кэш: пользователь восстанавливается в сессии без запроса к базе
+    columns = principal_cache.get(username)
+    if columns is not None:
+        return await _attach_principal(db, columns)
+
+    # Получаем пользователя из базы данных
+    user = await AsyncUserService.get_by_username(db, username)
+    if user is None:
+        logger.error(f"User not found in database: {username}")
+        return None
+    principal_cache.set(username, {field: getattr(user, field) for field in PRINCIPAL_FIELDS})
+    return user
+
+async def _attach_principal(db: AsyncSession, columns: dict) -> User:
+    # Остальные колонки не загружены: кому нужен хэш пароля, читает
+    # пользователя из базы
+    user = User(**columns)
+    make_transient_to_detached(user)
+    # load=False: объект просто регистрируется в сессии как persistent
+    return await db.merge(user, load=False)
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        # Декодируем JWT токен
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM]
-        )
-        username: str = payload.get("sub")
-        if username is None:
-            logger.error("Username not found in token")
-            raise credentials_exception
-            
-        logger.info(f"Token decoded successfully for user: {username}")
-    except JWTError as e:
-        logger.error(f"JWT decode error: {str(e)}")
-        raise credentials_exception
-
-    # Получаем пользователя из базы данных
-    user = db.query(User).filter(User.username == username).first()
+    user = await get_user_from_token(db, token)
     if user is None:
-        logger.error(f"User not found in database: {username}")
         raise credentials_exception
 
-    # Важно: возвращаем пользователя, привязанного к текущей сессии
-    return db.merge(user)
+    # Пользователь привязан к сессии запроса: get_db кэшируется на запрос
+    return user
 
 def get_current_active_user(
     current_user: User = Depends(get_current_user),
@@ -70,7 +86,7 @@ def get_current_active_user(
 def get_current_active_superuser(
     current_user: User = Depends(get_current_user),
 ) -> User:
-    if not current_user.is_superuser:
+    if current_user.role != "ADMIN":
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
         )
@@ -0,0 +1,97 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.types import Receive, Scope, Send
+import logging
+from app.api.deps import get_current_active_superuser, get_db
+from app.models.user import User
+from app.services.backup import BackupService
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+def _check_sqlite() -> None:
+    if BackupService.database_path() is None:
+        raise HTTPException(
+            status_code=501,
+            detail="Backups require a file-based SQLite database",
+        )
+
+class SnapshotResponse(StreamingResponse):
+    """
+    Stream a backup snapshot file and delete it when the response is over,
+    however it ends. The generator's own cleanup only runs once it has
+    been started, and a BackgroundTask is skipped when sending fails, so
+    neither covers a client that is gone before the first chunk.
+    """
+
+    def __init__(self, path: str, compress: bool, **kwargs):
+        super().__init__(BackupService.iter_file(path, compress=compress), **kwargs)
+        self.path = path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            BackupService.remove_snapshot(self.path)
+
+@router.post("/backup")
+async def backup_database(
+    compress: bool = True,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_superuser),
+):
+    """
+    Горячая резервная копия базы: согласованный снимок, снятый без
+    остановки записи, отдаётся потоком (по умолчанию в gzip)
+    """
+    _check_sqlite()
+    # Транзакция сессии запроса не должна висеть, пока копия скачивается
+    await db.close()
+    logger.info(f"Database backup requested by {current_user.username}")
+    snapshot = await BackupService.create_snapshot()
+    filename = f"pet_chat-{datetime.utcnow():%Y%m%d-%H%M%S}.db" + (".gz" if compress else "")
+    return SnapshotResponse(
+        snapshot,
+        compress=compress,
+        media_type="application/gzip" if compress else "application/vnd.sqlite3",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/restore")
+async def restore_database(
+    backup: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_superuser),
+):
+    """
+    Восстановить базу из резервной копии (файл базы, можно в gzip).
+    База заменяется целиком одной транзакцией
+    """
+    _check_sqlite()
+    await db.close()
+    logger.info(f"Database restore from {backup.filename} requested by {current_user.username}")
+    try:
+        await BackupService.restore(backup.file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"detail": "Database restored"}
+
+@router.post("/reset")
+async def reset_database(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_superuser),
+):
+    """
+    Сбросить базу: все таблицы пересоздаются, остаётся только текущий
+    администратор, чтобы не потерять доступ
+    """
+    _check_sqlite()
+    await db.close()
+    logger.warning(f"Database reset requested by {current_user.username}")
+    await BackupService.reset(keep_user_id=current_user.id)
+    return {"detail": "Database reset"}
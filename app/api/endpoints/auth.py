@@ -1,54 +1,22 @@
 from datetime import datetime, timedelta
 from typing import Optional, Any, Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_current_user, get_db
+from app.core.cache import principal_cache
 from app.core.config import settings
-from app.db.database import get_db
 from app.models.user import User
 from app.schemas.user import UserCreate, User as UserSchema, Token, TokenData
-from app.core.security import verify_password, get_password_hash, create_access_token, verify_token
-from app.services.user import UserService
+from app.core.security import create_access_token, password_hasher
+from app.services.user import AsyncUserService
 
 router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
-
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        return None
-    if not verify_password(password, user.hashed_password):
-        return None
-    return user
-
-async def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    payload = verify_token(token)
-    if payload is None:
-        raise credentials_exception
-        
-    username: str = payload.get("sub")
-    if username is None:
-        raise credentials_exception
-        
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise credentials_exception
-        
-    return user
 
 @router.post("/register", response_model=UserSchema)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     # Проверяем, существует ли пользователь с таким email
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await AsyncUserService.get_by_email(db, user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -56,15 +24,15 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Проверяем, существует ли пользователь с таким username
-    db_user = db.query(User).filter(User.username == user.username).first()
+    db_user = await AsyncUserService.get_by_username(db, user.username)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already taken"
         )
     
-    # Создаем нового пользователя
-    hashed_password = get_password_hash(user.password)
+    # Создаем нового пользователя; bcrypt считается в отдельном пуле
+    hashed_password = await password_hasher.hash(user.password)
     db_user = User(
         email=user.email,
         username=user.username,
@@ -72,25 +40,27 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         is_active=True
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.post("/login", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Any:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    # Пытаемся найти пользователя по имени пользователя
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user:
-        # Если не нашли по имени пользователя, пробуем по email
-        user = db.query(User).filter(User.email == form_data.username).first()
+    # Ищем пользователя по имени пользователя, затем по email
+    user = await AsyncUserService.get_by_login(db, form_data.username)
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await password_hasher.verify_and_update(
+            form_data.password, user.hashed_password
+        )
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username/email or password",
@@ -102,6 +72,12 @@ async def login(
             detail="Inactive user"
         )
 
+    if new_hash:
+        # Параметры pwd_context поменялись - сохраняем хэш в новом формате
+        user.hashed_password = new_hash
+        await db.commit()
+        principal_cache.invalidate(user.username)
+
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
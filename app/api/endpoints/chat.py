@@ -1,12 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import logging
-from app.db.database import get_db
+from app.models.chat import ChatRole
 from app.models.user import User
-from app.models.chat import Chat
-from app.api.deps import get_current_user
-from app.schemas.chat import ChatCreate, Chat as ChatSchema, ChatWithParticipants
+from app.api.deps import get_current_user, get_db
+from app.core.events import EventType, event
+from app.core.serialization import serialize
+from app.core.websocket import manager
+from app.services.chat import AsyncChatService
+from app.services.export import ChatExportService
+from app.services.membership import MembershipService
+from app.schemas.chat import (
+    ChatCreate, Chat as ChatSchema, ChatRead, ChatSummary, ChatWithParticipants,
+    ParticipantsChanged, ParticipantsUpdate
+)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -14,10 +23,24 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+async def _check_participant(db: AsyncSession, chat_id: int, user: User) -> None:
+    if await MembershipService.is_member(db, chat_id=chat_id, user_id=user.id):
+        return
+    # Сам чат читаем только для отказа: 404 или 403
+    if await AsyncChatService.get_by_id(db, chat_id=chat_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found"
+        )
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Not a participant of this chat"
+    )
+
 @router.post("/", response_model=ChatSchema)
 async def create_chat(
     chat: ChatCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -26,71 +49,140 @@ async def create_chat(
     logger.info(f"Creating chat with name: {chat.name} for user: {current_user.username}")
 
     try:
-        # Получаем пользователя из текущей сессии
-        user_db = db.query(User).filter(User.id == current_user.id).first()
-        if not user_db:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-
-        # Создаем чат
-        db_chat = Chat(
-            name=chat.name.strip(),
-            creator_id=user_db.id
+        # Создаем чат, создатель становится участником
+        db_chat = await AsyncChatService.create(
+            db, name=chat.name.strip(), creator=current_user,
+            participant_ids=chat.participant_ids
         )
-        db.add(db_chat)
-        
-        # Добавляем создателя как участника
-        db_chat.participants.append(user_db)
-        
-        # Сохраняем изменения
-        db.commit()
-        db.refresh(db_chat)
-        
         logger.info(f"Chat created successfully: {db_chat.id}")
         return db_chat
         
     except Exception as e:
         logger.error(f"Error creating chat: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create chat: {str(e)}"
         )
 
-@router.get("/", response_model=List[ChatWithParticipants])
+@router.get("/", response_model=List[ChatSummary])
 async def get_chats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Получить список чатов текущего пользователя
+    Получить список чатов текущего пользователя: последнее сообщение и
+    число непрочитанных, свежие чаты первыми
     """
-    user_db = db.query(User).filter(User.id == current_user.id).first()
-    return user_db.chats
+    return serialize(
+        List[ChatSummary], await AsyncChatService.get_user_summaries(db, user_id=current_user.id)
+    )
+
+@router.post("/{chat_id}/read", response_model=ChatSummary)
+async def mark_chat_read(
+    chat_id: int,
+    read: ChatRead,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Отметить чат прочитанным до message_id (по умолчанию - целиком)
+    """
+    if await AsyncChatService.get_user_summary(db, current_user.id, chat_id) is None:
+        if await AsyncChatService.get_by_id(db, chat_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Chat not found"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not a participant of this chat"
+        )
+
+    await AsyncChatService.mark_read(db, chat_id, current_user.id, read.message_id)
+    return await AsyncChatService.get_user_summary(db, current_user.id, chat_id)
 
 @router.get("/{chat_id}", response_model=ChatWithParticipants)
 async def get_chat(
     chat_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Получить информацию о конкретном чате
     """
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
+    # Участие проверяем по индексу, список участников грузим только для ответа
+    await _check_participant(db, chat_id, current_user)
+
+    chat = await AsyncChatService.get_by_id(db, chat_id=chat_id, with_participants=True)
     if not chat:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Chat not found"
         )
-    
-    user_db = db.query(User).filter(User.id == current_user.id).first()
-    if user_db not in chat.participants:
+    return chat
+
+@router.post("/{chat_id}/participants", response_model=ParticipantsChanged)
+async def update_participants(
+    chat_id: int,
+    changes: ParticipantsUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Добавить и исключить участников одним запросом, в одной транзакции.
+    Добавлять может любой участник, исключать других - владелец или
+    администратор; владельца исключить нельзя. Подписчики чата получают
+    одно событие membership со списками added и removed
+    """
+    role = await MembershipService.role(db, chat_id, current_user.id)
+    if role is None:
+        if await AsyncChatService.get_by_id(db, chat_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Chat not found"
+            )
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not a participant of this chat"
         )
-    
-    return chat 
\ No newline at end of file
+    if role == ChatRole.MEMBER and set(changes.remove) - {current_user.id}:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the owner or an admin can remove participants"
+        )
+
+    added, removed = await AsyncChatService.update_participants(
+        db, chat_id, add=changes.add, remove=changes.remove
+    )
+    await db.commit()
+    if added or removed:
+        # Одно событие на весь запрос; исключённые отключаются после него
+        manager.publish_nowait(chat_id, event(
+            EventType.MEMBERSHIP, chat_id, {"added": added, "removed": removed}
+        ))
+    return ParticipantsChanged(added=added, removed=removed)
+
+@router.get("/{chat_id}/export")
+async def export_chat(
+    chat_id: int,
+    compress: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Выгрузить историю чата в NDJSON: по сообщению на строку, старые
+    первыми. С compress=true - тот же NDJSON в gzip. Отдаётся потоком,
+    страница за страницей, память сервера не зависит от размера чата
+    """
+    await _check_participant(db, chat_id, current_user)
+    # Страницы читаются в своих сессиях; соединение запроса на всё время
+    # выгрузки не держим
+    await db.close()
+
+    filename = f"chat-{chat_id}.ndjson" + (".gz" if compress else "")
+    return StreamingResponse(
+        ChatExportService.iter_ndjson(chat_id, compress=compress),
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
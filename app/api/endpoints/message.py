@@ -1,76 +1,155 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
-
-from app.api.deps import get_current_user, get_db
-from app.services.message import MessageService
-from app.services.chat import ChatService
-from app.schemas.message import Message, MessageCreate, MessageUpdate
+from typing import Any, List, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_current_user, get_db, get_user_from_token
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.services.message import AsyncMessageService, encode_cursor, decode_cursor
+from app.services.chat import AsyncChatService
+from app.services.ingest import message_buffer
+from app.services.membership import MembershipService
+from app.services.search import MessageSearchService
+from app.schemas.event import MessageCreatedEvent
+from app.schemas.message import Message, MessageCreate, MessageSearchHit, MessageUpdate
+from app.schemas.user import User as UserSchema
 from app.models.user import User
-from app.core.websocket import ConnectionManager
+from app.core.events import EventType, decode_frame, event, negotiate
+from app.core.serialization import serialize
+from app.core.websocket import manager
 
 router = APIRouter()
-manager = ConnectionManager()
+
+async def _check_participant(db: AsyncSession, chat_id: int, user: User) -> None:
+    if await MembershipService.is_member(db, chat_id=chat_id, user_id=user.id):
+        return
+    # Сам чат читаем только для отказа: 404 или 403
+    if not await AsyncChatService.get_by_id(db=db, chat_id=chat_id):
+        raise HTTPException(
+            status_code=404,
+            detail="Chat not found",
+        )
+    raise HTTPException(
+        status_code=403,
+        detail="Not a chat participant",
+    )
 
 @router.get("/chat/{chat_id}", response_model=List[Message])
-def get_chat_messages(
+async def get_chat_messages(
     chat_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 50,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
 ) -> Any:
     """
-    Retrieve messages from a chat.
+    Retrieve messages from a chat, newest first.
+
+    Paging is keyset-based: pass the ``X-Next-Cursor`` response header back
+    as ``cursor`` to load older messages, or ``X-Prev-Cursor`` to load newer
+    ones. ``before_id``/``after_id`` may be used instead of a cursor.
     """
-    chat = ChatService.get_by_id(db=db, chat_id=chat_id)
-    if not chat:
-        raise HTTPException(
-            status_code=404,
-            detail="Chat not found",
-        )
-    if current_user not in chat.participants:
+    if cursor is not None:
+        try:
+            direction, message_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid cursor",
+            )
+        if direction == "before":
+            before_id, after_id = message_id, None
+        else:
+            before_id, after_id = None, message_id
+    await _check_participant(db, chat_id, current_user)
+    messages = await AsyncMessageService.get_chat_messages(
+        db=db, chat_id=chat_id, before_id=before_id, after_id=after_id, limit=limit
+    )
+    if messages:
+        response.headers["X-Prev-Cursor"] = encode_cursor("after", messages[0].id)
+        if len(messages) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor("before", messages[-1].id)
+    return serialize(List[Message], messages, response)
+
+@router.get("/search", response_model=List[MessageSearchHit])
+async def search_messages(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    chat_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    order: str = Query("rank", pattern="^(rank|recent)$"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Full-text search in the user's chats, best matches first
+    (``order=recent`` - newest first, much faster for common words).
+
+    Every word of ``q`` must occur, the last one as a prefix. Pass the
+    ``X-Next-Cursor`` response header back as ``cursor`` for the next page.
+
+    Paging by rank is best-effort: pages continue after the last (rank, id),
+    but bm25 is recomputed on every request and shifts as messages are
+    written, so a hit may repeat or be skipped between pages. ``order=recent``
+    pages by message id and is the stable mode for walking all results.
+    """
+    if db.get_bind().dialect.name != "sqlite":
         raise HTTPException(
-            status_code=403,
-            detail="Not a chat participant",
+            status_code=501,
+            detail="Search requires the SQLite FTS5 index",
         )
-    messages = MessageService.get_chat_messages(
-        db=db, chat_id=chat_id, skip=skip, limit=limit
+    after = None
+    if cursor is not None:
+        try:
+            after = MessageSearchService.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid cursor",
+            )
+    if chat_id is not None:
+        await _check_participant(db, chat_id, current_user)
+    match = MessageSearchService.match_query(q)
+    if match is None:
+        return []
+    hits, next_position = await MessageSearchService.search(
+        db, current_user.id, match, chat_id=chat_id, after=after, limit=limit, order=order
     )
-    return messages
+    if next_position is not None:
+        response.headers["X-Next-Cursor"] = MessageSearchService.encode_cursor(*next_position)
+    return serialize(List[MessageSearchHit], [
+        MessageSearchHit.model_validate(message).model_copy(update={"snippet": snippet})
+        for message, snippet in hits
+    ], response)
 
 @router.post("/", response_model=Message)
-def create_message(
+async def create_message(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     message_in: MessageCreate,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Create new message.
+
+    The message is pushed to the chat's WebSocket subscribers in the
+    background; the response does not wait for delivery.
     """
-    chat = ChatService.get_by_id(db=db, chat_id=message_in.chat_id)
-    if not chat:
-        raise HTTPException(
-            status_code=404,
-            detail="Chat not found",
-        )
-    if current_user not in chat.participants:
-        raise HTTPException(
-            status_code=403,
-            detail="Not a chat participant",
-        )
-    message = MessageService.create(
-        db=db, message_in=message_in, sender_id=current_user.id
-    )
+    await _check_participant(db, message_in.chat_id, current_user)
+    message = await _store_message(message_in, UserSchema.model_validate(current_user))
     # Отправляем сообщение всем подключенным клиентам в чате
-    manager.broadcast_to_chat(chat_id=chat.id, message=message)
+    manager.publish_nowait(message.chat_id, MessageCreatedEvent.from_message(message))
     return message
 
 @router.put("/{message_id}", response_model=Message)
-def update_message(
+async def update_message(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     message_id: int,
     message_in: MessageUpdate,
     current_user: User = Depends(get_current_user),
@@ -78,7 +157,7 @@ def update_message(
     """
     Update a message.
     """
-    message = MessageService.get_by_id(db=db, message_id=message_id)
+    message = await AsyncMessageService.get_by_id(db=db, message_id=message_id)
     if not message:
         raise HTTPException(
             status_code=404,
@@ -89,22 +168,22 @@ def update_message(
             status_code=403,
             detail="Not enough permissions",
         )
-    message = MessageService.update(
+    message = await AsyncMessageService.update(
         db=db, db_message=message, message_in=message_in
     )
     return message
 
 @router.delete("/{message_id}")
-def delete_message(
+async def delete_message(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     message_id: int,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Delete a message.
     """
-    message = MessageService.get_by_id(db=db, message_id=message_id)
+    message = await AsyncMessageService.get_by_id(db=db, message_id=message_id)
     if not message:
         raise HTTPException(
             status_code=404,
@@ -115,20 +194,140 @@ def delete_message(
             status_code=403,
             detail="Not enough permissions",
         )
-    MessageService.delete(db=db, db_message=message)
+    await AsyncMessageService.delete(db=db, db_message=message)
     return {"status": "success"}
 
+async def _authorize_websocket(token: Optional[str], chat_id: int) -> Optional[UserSchema]:
+    """
+    Handshake check: returns the user if the token is valid and the user
+    participates in the chat. Runs once per connection in its own session.
+    """
+    if not token:
+        return None
+    async with AsyncSessionLocal() as db:
+        user = await get_user_from_token(db, token)
+        if user is None or not user.is_active:
+            return None
+        if not await MembershipService.is_member(db, chat_id=chat_id, user_id=user.id):
+            return None
+        return UserSchema.model_validate(user)
+
+async def _store_message(message_in: MessageCreate, sender: UserSchema) -> Message:
+    if settings.MESSAGE_WRITE_BEHIND:
+        return await message_buffer.submit(message_in, sender)
+    # Короткая сессия на одно сообщение: открытые сокеты не держат соединения пула
+    async with AsyncSessionLocal() as db:
+        message = await AsyncMessageService.create(
+            db=db, message_in=message_in, sender_id=sender.id
+        )
+        return Message.model_validate(message)
+
+async def _load_missed(chat_id: int, after_seq: int, limit: int) -> List[dict]:
+    async with AsyncSessionLocal() as db:
+        messages = await AsyncMessageService.get_since_seq(
+            db, chat_id=chat_id, after_seq=after_seq, limit=limit
+        )
+        return [
+            MessageCreatedEvent.from_message(Message.model_validate(m)).model_dump(mode="json")
+            for m in messages
+        ]
+
+# Служебные кадры WebSocket: не сообщения, а сигналы присутствия
+CONTROL_FRAMES = {"typing", "heartbeat"}
+
+def _parse_frame(frame: Union[dict, str], chat_id: int) -> Union[dict, MessageCreate]:
+    """Returns a control frame as a dict or the message to store."""
+    if not isinstance(frame, dict):
+        # Обычный текст считаем содержимым сообщения
+        frame = {"content": frame}
+    elif frame.get("type") in CONTROL_FRAMES:
+        return frame
+    return MessageCreate(**{**frame, "chat_id": chat_id})
+
+async def _receive_frame(websocket: WebSocket) -> Union[dict, str]:
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+    return decode_frame(message)
+
 @router.websocket("/ws/{chat_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
     chat_id: int,
-    db: Session = Depends(get_db),
+    token: Optional[str] = Query(None),
+    last_seq: Optional[int] = Query(None, ge=0),
 ):
-    await manager.connect(websocket, chat_id)
+    """
+    Chat stream. Authenticate with ``?token=<access token>`` or an
+    ``Authorization: Bearer`` header. Each client frame is either an object
+    with MessageCreate fields or plain message text.
+
+    Server frames are envelopes ``{"type", "chat_id", "data"}`` plus
+    ``seq`` on ``message.created`` events. The ``pet-chat.msgpack``
+    subprotocol switches both directions to binary msgpack frames;
+    ``pet-chat.json`` or no subprotocol keeps JSON text frames.
+
+    A reconnecting client passes ``?last_seq=`` with the highest message
+    ``seq`` it has seen. It first receives the messages it missed, then a
+    ``replay`` event with ``data: {"last_seq", "complete"}``; with
+    ``complete: false`` the gap was longer than WS_REPLAY_MAX_MESSAGES and
+    the rest should be paged over REST. Messages may arrive twice around
+    the replay boundary, so clients should ignore seq values they have.
+
+    Control frames ``{"type": "typing", "active": true}`` and
+    ``{"type": "heartbeat"}`` update presence; any frame counts as a
+    heartbeat. ``presence`` events carry the statuses and typing flags
+    that changed.
+
+    ``membership`` events carry ``{"added", "removed"}`` user ids; a removed
+    user's socket receives the event and is then closed with code 1008.
+    """
+    if token is None:
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer":
+            token = credentials
+    # Аутентификация и проверка участия - один раз на всё соединение
+    user = await _authorize_websocket(token, chat_id)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    presence = manager.presence
+    await manager.connect(
+        websocket,
+        chat_id,
+        user_id=user.id,
+        last_seq=last_seq,
+        load_missed=_load_missed,
+        subprotocol=negotiate(websocket.scope.get("subprotocols", [])),
+    )
     try:
         while True:
-            data = await websocket.receive_text()
-            # Здесь можно добавить обработку входящих сообщений
-            await manager.broadcast_to_chat(chat_id, data)
+            try:
+                frame = _parse_frame(await _receive_frame(websocket), chat_id)
+            except ValidationError as e:
+                manager.send_to(websocket, chat_id, event(
+                    EventType.ERROR, chat_id, e.errors(include_url=False)
+                ))
+                continue
+            except ValueError as e:
+                manager.send_to(websocket, chat_id, event(
+                    EventType.ERROR, chat_id, [{"msg": str(e)}]
+                ))
+                continue
+            if isinstance(frame, dict):
+                if frame["type"] == "typing":
+                    presence.typing(user.id, chat_id, active=bool(frame.get("active", True)))
+                else:
+                    presence.touch(user.id)
+                continue
+            message = await _store_message(frame, user)
+            # Отправленное сообщение гасит индикатор набора
+            presence.typing(user.id, chat_id, active=False)
+            await manager.broadcast_to_chat(chat_id, MessageCreatedEvent.from_message(message))
     except WebSocketDisconnect:
-        manager.disconnect(websocket, chat_id) 
\ No newline at end of file
+        pass
+    finally:
+        # И при любой другой ошибке: иначе сокет остаётся в менеджере, а
+        # пользователь - в сети
+        await manager.disconnect(websocket, chat_id)
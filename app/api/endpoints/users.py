@@ -1,15 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 import os
 import shutil
 
-from app.db.database import get_db
-from app.core.security import get_password_hash
+from app.core.cache import principal_cache
+from app.core.serialization import serialize
+from app.core.security import password_hasher
 from app.models.user import User
 from app.schemas import schemas
 from app.api import deps
+from app.services.user import AsyncUserService
 
 router = APIRouter()
 
@@ -25,7 +27,7 @@ async def read_user_me(
 @router.patch("/me", response_model=schemas.User)
 async def update_user_me(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(deps.get_db),
     user_in: schemas.UserUpdate,
     current_user: User = Depends(deps.get_current_user),
     avatar: Optional[UploadFile] = File(None)
@@ -51,43 +53,50 @@ async def update_user_me(
         # Update avatar_url in user_in
         current_user.avatar_url = f"/avatars/{avatar_filename}"
 
+    # Кэш держит старые значения, в том числе под старым username
+    principal_cache.invalidate(current_user.username)
+
     # Update other fields
-    for field, value in user_in.dict(exclude_unset=True).items():
+    update_data = user_in.dict(exclude_unset=True)
+    if "password" in update_data:
+        current_user.hashed_password = await password_hasher.hash(update_data.pop("password"))
+    for field, value in update_data.items():
         setattr(current_user, field, value)
 
     current_user.last_seen = datetime.utcnow()
     db.add(current_user)
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
+    principal_cache.invalidate(current_user.username)
     
     return current_user
 
 @router.get("/", response_model=List[schemas.User])
-def get_users(
+async def get_users(
     current_user: User = Depends(deps.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(deps.get_db)
 ):
-    return db.query(User).all()
+    return serialize(List[schemas.User], await AsyncUserService.get_all(db))
 
 @router.get("/{user_id}", response_model=schemas.User)
-def read_user(
+async def read_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_user),
 ):
     """
     Get user by ID.
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await AsyncUserService.get_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @router.put("/{user_id}/role", response_model=schemas.User)
-def update_user_role(
+async def update_user_role(
     user_id: int,
     role: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_user),
 ):
     """
@@ -105,11 +114,12 @@ def update_user_role(
             detail="Invalid role. Must be either USER or ADMIN"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await AsyncUserService.get_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     user.role = role
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    principal_cache.invalidate(user.username)
+    await db.refresh(user)
     return user 
\ No newline at end of file
@@ -0,0 +1,70 @@
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, TypeVar
+
+from app.core.config import settings
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """
+    Size-bounded in-process cache with per-entry expiry.
+
+    Entries live for `ttl` seconds; once `max_size` is reached the least
+    recently used entry is evicted. A ttl of 0 disables the cache. Not
+    shared between worker processes, so keep the ttl short for anything
+    another process may change.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> None:
+        """Store a value; `ttl` overrides the cache-wide lifetime for this entry."""
+        if self.ttl <= 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *keys: Hashable) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Колонки пользователя по username из токена (см. app/api/deps.py)
+principal_cache: TTLCache[dict] = TTLCache(
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+)
+
+
+# Участие в чате по (chat_id, user_id) -> bool (см. app/services/membership.py)
+membership_cache: TTLCache[bool] = TTLCache(
+    ttl=settings.MEMBERSHIP_CACHE_TTL_SECONDS,
+    max_size=settings.MEMBERSHIP_CACHE_MAX_SIZE,
+)
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 
@@ -11,9 +11,102 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your-secret-key-here"  # В продакшене использовать безопасный ключ
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Ключи подписи JWT по kid. Новые токены подписываются JWT_ACTIVE_KID,
+    # проверяются все перечисленные - так ключ можно сменить, не разлогинивая
+    # пользователей. Пустой словарь - единственный ключ SECRET_KEY.
+    JWT_SIGNING_KEYS: Dict[str, str] = {}
+    JWT_ACTIVE_KID: str = "default"
+    # Сколько проверенных токенов держать в памяти (до их exp)
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+    BCRYPT_ROUNDS: int = 12
+    # Пул для bcrypt: потоки и сколько операций может ждать в очереди
+    # сверх них, прежде чем сервер начнёт отвечать 503
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 32
+    # Кэш пользователя по subject токена, чтобы не читать его из базы на
+    # каждый запрос; 0 - выключен
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+    # Кэш проверки участия в чате; 0 - выключен, каждая проверка - один
+    # EXISTS по user_chat. Другие воркеры увидят исключение участника
+    # только через TTL, поэтому держать его коротким
+    MEMBERSHIP_CACHE_TTL_SECONDS: float = 0
+    MEMBERSHIP_CACHE_MAX_SIZE: int = 100000
     
     # Database
     DATABASE_URL: str = "sqlite:///./pet_chat.db"
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+
+    # Профиль SQLite, применяется к каждому новому соединению
+    SQLITE_TUNING: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 268435456  # 256 MiB
+    SQLITE_CACHE_SIZE: int = -65536  # в KiB (отрицательное значение), 64 MiB
+
+    # Отложенная пакетная запись входящих сообщений (см. app/services/ingest.py)
+    MESSAGE_WRITE_BEHIND: bool = False
+    MESSAGE_BATCH_MAX_ROWS: int = 500
+    MESSAGE_BATCH_MAX_DELAY_MS: int = 5
+
+    # Быстрая сериализация ответов (см. app/core/serialization.py): списки
+    # пишутся в JSON прямо из pydantic-core, остальное - через orjson
+    FAST_JSON_RESPONSES: bool = False
+    # Выгрузка истории чата (см. app/services/export.py): сообщений на
+    # страницу - столько строк одновременно держится в памяти
+    EXPORT_PAGE_SIZE: int = 1000
+    # Резервные копии (см. app/services/backup.py): страниц базы за один
+    # шаг online backup и пауза между шагами, чтобы копия не забирала весь
+    # диск у рабочих запросов; уровень gzip для выгрузки копии (1 - в разы
+    # быстрее 6, а страницы SQLite и так хорошо сжимаются)
+    BACKUP_PAGES_PER_STEP: int = 1024
+    BACKUP_STEP_SLEEP_MS: int = 0
+    BACKUP_COMPRESSION_LEVEL: int = 1
+
+    # Rate limiting (см. app/core/rate_limit.py): запросов в минуту для
+    # анонимных клиентов (по IP), для пользователей (по токену) и отдельные
+    # лимиты для маршрутов по префиксу пути. "redis" - общие счётчики для
+    # всех воркеров.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_PER_MINUTE: int = 120
+    RATE_LIMIT_USER_PER_MINUTE: int = 600
+    RATE_LIMIT_ROUTES: Dict[str, int] = {
+        "/api/v1/auth/login": 10,
+        "/api/v1/auth/register": 5,
+    }
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    # Входящие сообщения на одно WebSocket-соединение: средняя скорость и
+    # сколько можно прислать разом
+    WS_MESSAGES_PER_MINUTE: int = 600
+    WS_MESSAGE_BURST: int = 20
+
+    # Redis
+    REDIS_URL: str = "redis://localhost:6379"
+
+    # WebSocket: "memory" - один процесс, "redis" - рассылка между воркерами
+    BROADCAST_BACKEND: str = "memory"
+    # Сколько ждать подтверждения SUBSCRIBE от Redis при подключении к чату
+    BROADCAST_SUBSCRIBE_TIMEOUT: float = 5
+    # Очередь исходящих сообщений на одно соединение и что делать при её
+    # переполнении: "disconnect" или "drop"
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SLOW_CONSUMER_POLICY: str = "disconnect"
+    # Досылка после переподключения (?last_seq=): сколько последних
+    # сообщений на чат держать в памяти и сколько максимум дослать из базы
+    WS_REPLAY_BUFFER_SIZE: int = 256
+    WS_REPLAY_MAX_MESSAGES: int = 500
+    # Сжатие кадров permessage-deflate (RFC 7692), согласуется с клиентом
+    WS_PER_MESSAGE_DEFLATE: bool = True
+    # Присутствие и индикатор набора: хранятся в памяти ("memory") или в
+    # Redis ("redis"), в таблицу users не пишутся. Изменения копятся и
+    # рассылаются одним событием на чат раз в PRESENCE_FLUSH_INTERVAL_MS
+    PRESENCE_BACKEND: str = "memory"
+    PRESENCE_HEARTBEAT_TTL: int = 60
+    PRESENCE_TYPING_TTL: int = 5
+    PRESENCE_FLUSH_INTERVAL_MS: int = 500
     
     # CORS
     BACKEND_CORS_ORIGINS: List[str] = [
@@ -0,0 +1,92 @@
+import enum
+import json
+from typing import Any, Iterable, Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # msgpack - необязательная зависимость
+    msgpack = None
+
+
+# Конверт события: {"type", "chat_id", "data"} и "seq" у новых сообщений
+class EventType(str, enum.Enum):
+    MESSAGE_CREATED = "message.created"
+    PRESENCE = "presence"
+    MEMBERSHIP = "membership"
+    REPLAY = "replay"
+    ERROR = "error"
+
+
+class Encoding(str, enum.Enum):
+    JSON = "json"
+    MSGPACK = "msgpack"
+
+
+SUBPROTOCOLS = {
+    "pet-chat.json": Encoding.JSON,
+    "pet-chat.msgpack": Encoding.MSGPACK,
+}
+
+# Кадр в том виде, в каком он уходит в сокет
+Frame = Union[str, bytes]
+
+
+def event(type: EventType, chat_id: int, data: Any = None, seq: Optional[int] = None) -> dict:
+    envelope = {"type": type.value, "chat_id": chat_id, "data": data}
+    if seq is not None:
+        envelope["seq"] = seq
+    return envelope
+
+
+def negotiate(offered: Iterable[str]) -> Optional[str]:
+    """First subprotocol offered by the client that this server can speak."""
+    for subprotocol in offered:
+        encoding = SUBPROTOCOLS.get(subprotocol.strip())
+        if encoding is Encoding.MSGPACK and msgpack is None:
+            continue
+        if encoding is not None:
+            return subprotocol.strip()
+    return None
+
+
+def encoding_for(subprotocol: Optional[str]) -> Encoding:
+    return SUBPROTOCOLS.get(subprotocol, Encoding.JSON)
+
+
+def encode(data: str, encoding: Encoding) -> Frame:
+    """
+    Turn a JSON-encoded event into a frame. Broadcasts travel between
+    workers as JSON, so this runs once per encoding per delivery.
+    """
+    if encoding is Encoding.MSGPACK:
+        return msgpack.packb(json.loads(data), use_bin_type=True)
+    return data
+
+
+def decode_frame(message: dict) -> Union[dict, str]:
+    """
+    Client frame from an ASGI ``websocket.receive`` message: a JSON or
+    msgpack object as a dict, otherwise the frame's text.
+    Raises ValueError for binary frames that are not a msgpack map with
+    string keys or a string.
+    """
+    raw = message.get("bytes")
+    if raw is not None:
+        if msgpack is None:
+            raise ValueError("Binary frames need the msgpack encoding")
+        try:
+            frame = msgpack.unpackb(raw, raw=False)
+        except Exception:
+            raise ValueError("Invalid msgpack frame")
+        if not isinstance(frame, (dict, str)):
+            raise ValueError("Frame must be a map or a string")
+        # Ключи bin msgpack пропускает, а в поля модели они не лягут
+        if isinstance(frame, dict) and not all(isinstance(key, str) for key in frame):
+            raise ValueError("Frame map keys must be strings")
+        return frame
+    text = message.get("text") or ""
+    try:
+        frame = json.loads(text)
+    except ValueError:
+        return text
+    return frame if isinstance(frame, dict) else text
@@ -1,55 +1,142 @@
-from fastapi import Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
-from datetime import datetime, timedelta
-from typing import Dict, List
-import json
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Optional
+from urllib.parse import parse_qs
+import math
 from app.core.config import settings
+from app.core.rate_limit import RateLimiter, TokenBucket, create_rate_limiter
+from app.core.security import verify_token
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, requests_per_minute: int):
-        super().__init__(app)
-        self.requests_per_minute = requests_per_minute
-        self.requests: Dict[str, List[datetime]] = {}
-
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host
-        now = datetime.now()
-
-        # Очистка старых записей
-        if client_ip in self.requests:
-            self.requests[client_ip] = [
-                req_time for req_time in self.requests[client_ip]
-                if now - req_time < timedelta(minutes=1)
-            ]
-
-        # Проверка лимита
-        if client_ip in self.requests and len(self.requests[client_ip]) >= self.requests_per_minute:
-            raise HTTPException(
+# 1008 - "Policy Violation": клиент шлёт сообщения чаще, чем разрешено
+WS_RATE_LIMIT_CLOSE_CODE = 1008
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI rate limiter for HTTP requests and WebSocket traffic.
+
+    HTTP requests and WebSocket handshakes are counted by the shared
+    RateLimiter; over the limit, requests get a 429 and handshakes are
+    refused. Inside an accepted WebSocket each connection also gets a
+    token bucket for incoming messages; a client that exceeds it is
+    closed with code 1008.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: Optional[RateLimiter] = None,
+        ws_messages_per_minute: Optional[int] = None,
+        ws_message_burst: Optional[int] = None,
+    ):
+        self.app = app
+        self.limiter = limiter or create_rate_limiter()
+        self.ws_messages_per_minute = ws_messages_per_minute or settings.WS_MESSAGES_PER_MINUTE
+        self.ws_message_burst = ws_message_burst or settings.WS_MESSAGE_BURST
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            await self._http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def _hit(self, scope: Scope):
+        client = scope.get("client")
+        return await self.limiter.hit(
+            scope["path"], client[0] if client else "unknown", _token_subject(scope)
+        )
+
+    async def _http(self, scope: Scope, receive: Receive, send: Send) -> None:
+        result = await self._hit(scope)
+        headers = {
+            "X-RateLimit-Limit": str(result.limit),
+            "X-RateLimit-Remaining": str(result.remaining),
+        }
+        if not result.allowed:
+            headers["Retry-After"] = str(math.ceil(result.retry_after))
+            response = JSONResponse(
+                {"detail": "Too many requests. Please try again later."},
                 status_code=429,
-                detail="Too many requests. Please try again later."
+                headers=headers,
             )
+            await response(scope, receive, send)
+            return
+
+        raw_headers = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + raw_headers
+            await send(message)
 
-        # Добавление нового запроса
-        if client_ip not in self.requests:
-            self.requests[client_ip] = []
-        self.requests[client_ip].append(now)
+        await self.app(scope, receive, send_with_headers)
 
-        response = await call_next(request)
-        return response
+    async def _websocket(self, scope: Scope, receive: Receive, send: Send) -> None:
+        result = await self._hit(scope)
+        if not result.allowed:
+            # Закрытие до accept сервер превращает в отказ рукопожатия (403)
+            await send({"type": "websocket.close", "code": WS_RATE_LIMIT_CLOSE_CODE})
+            return
+
+        bucket = TokenBucket(self.ws_messages_per_minute / 60, self.ws_message_burst)
+        closed = False
+
+        async def limited_receive() -> Message:
+            nonlocal closed
+            if closed:
+                return {"type": "websocket.disconnect", "code": WS_RATE_LIMIT_CLOSE_CODE}
+            message = await receive()
+            if message["type"] == "websocket.receive" and not bucket.take():
+                closed = True
+                await send({
+                    "type": "websocket.close",
+                    "code": WS_RATE_LIMIT_CLOSE_CODE,
+                    "reason": "Message rate limit exceeded",
+                })
+                # Приложение видит обычный разрыв и убирает соединение
+                return {"type": "websocket.disconnect", "code": WS_RATE_LIMIT_CLOSE_CODE}
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            # После нашего close приложение ещё может что-то отправить
+            if not closed:
+                await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+
+def _token_subject(scope: Scope) -> Optional[str]:
+    # Токен из заголовка Authorization или, для WebSocket, из ?token=.
+    # Проверенные токены берутся из кэша verifier'а, так что это дёшево.
+    token = None
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, credentials = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and credentials:
+                token = credentials
+            break
+    if token is None and scope["type"] == "websocket":
+        token = parse_qs(scope.get("query_string", b"").decode()).get("token", [None])[0]
+    if not token:
+        return None
+    claims = verify_token(token)
+    return claims.get("sub") if claims else None
+
+def setup_middleware(app, limiter: Optional[RateLimiter] = None):
+    # Rate limiting добавляется первым, чтобы CORS оборачивал и ответы 429
+    if settings.RATE_LIMIT_ENABLED:
+        app.add_middleware(RateLimitMiddleware, limiter=limiter)
 
-def setup_middleware(app):
     # CORS middleware
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=settings.ALLOWED_ORIGINS.split(","),
+        allow_origins=settings.get_allowed_origins(),
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[
+            "X-Next-Cursor", "X-Prev-Cursor",
+            "Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining",
+        ],
     )
-
-    # Rate limiting middleware
-    app.add_middleware(
-        RateLimitMiddleware,
-        requests_per_minute=settings.RATE_LIMIT_PER_MINUTE
-    ) 
\ No newline at end of file
@@ -0,0 +1,284 @@
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+import asyncio
+import enum
+import logging
+import time
+import uuid
+
+from app.core.config import settings
+from app.core.events import EventType, event
+
+logger = logging.getLogger(__name__)
+
+# Рассылка готового события в чат: (chat_id, событие)
+Publish = Callable[[int, dict], Awaitable[None]]
+
+
+class UserStatus(str, enum.Enum):
+    ONLINE = "online"
+    OFFLINE = "offline"
+    AWAY = "away"
+    BUSY = "busy"
+
+
+class PresenceStore:
+    """
+    Which users are online anywhere. The tracker keeps the per-connection
+    details locally and only asks the store whether a user that left this
+    worker is still connected to another one.
+    """
+
+    async def add(self, user_id: int) -> None:
+        pass
+
+    async def remove(self, user_id: int) -> None:
+        pass
+
+    async def refresh(self, user_ids: Iterable[int]) -> None:
+        pass
+
+    async def online(self, user_ids: Iterable[int]) -> Set[int]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryPresenceStore(PresenceStore):
+    """Single-process store: online means connected to this worker."""
+
+    def __init__(self):
+        self._users: Set[int] = set()
+
+    async def add(self, user_id: int) -> None:
+        self._users.add(user_id)
+
+    async def remove(self, user_id: int) -> None:
+        self._users.discard(user_id)
+
+    async def online(self, user_ids: Iterable[int]) -> Set[int]:
+        return self._users.intersection(user_ids)
+
+
+class RedisPresenceStore(PresenceStore):
+    """
+    One hash per user, ``presence:{user_id}``, with a field per worker
+    holding the time until which that worker vouches for the user. Workers
+    refresh their fields periodically, so a crashed worker's users drop
+    out once `ttl` passes.
+    """
+
+    def __init__(self, url: str, ttl: float, key_prefix: str = "presence:"):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._ttl = ttl
+        self._prefix = key_prefix
+        self._worker = uuid.uuid4().hex
+
+    def _key(self, user_id: int) -> str:
+        return f"{self._prefix}{user_id}"
+
+    async def add(self, user_id: int) -> None:
+        await self.refresh([user_id])
+
+    async def remove(self, user_id: int) -> None:
+        await self._redis.hdel(self._key(user_id), self._worker)
+
+    async def refresh(self, user_ids: Iterable[int]) -> None:
+        expires_at = time.time() + self._ttl
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hset(self._key(user_id), self._worker, expires_at)
+                pipe.expire(self._key(user_id), int(self._ttl) + 1)
+            await pipe.execute()
+
+    async def online(self, user_ids: Iterable[int]) -> Set[int]:
+        user_ids = list(user_ids)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hvals(self._key(user_id))
+            results = await pipe.execute()
+        now = time.time()
+        return {
+            user_id for user_id, expiries in zip(user_ids, results)
+            if any(float(expiry) > now for expiry in expiries)
+        }
+
+    async def close(self) -> None:
+        await self._redis.close()
+
+
+def create_presence_store() -> PresenceStore:
+    if settings.PRESENCE_BACKEND == "redis":
+        return RedisPresenceStore(settings.REDIS_URL, ttl=settings.PRESENCE_HEARTBEAT_TTL)
+    return MemoryPresenceStore()
+
+
+class PresenceTracker:
+    """
+    Online status and typing indicators for the users connected to this
+    worker.
+
+    Nothing is sent per event: changes are collected per chat, with the
+    latest state winning, and flushed as one ``presence`` event per chat
+    every `flush_interval` seconds. Repeated typing notifications only push
+    the indicator's expiry forward, so a keystroke costs a dict update.
+    A user whose connections stay silent longer than `heartbeat_ttl`
+    turns "away" until the next frame arrives.
+    """
+
+    def __init__(
+        self,
+        store: Optional[PresenceStore] = None,
+        heartbeat_ttl: Optional[float] = None,
+        typing_ttl: Optional[float] = None,
+        flush_interval: Optional[float] = None,
+    ):
+        self.store = store or MemoryPresenceStore()
+        self.heartbeat_ttl = heartbeat_ttl or settings.PRESENCE_HEARTBEAT_TTL
+        self.typing_ttl = typing_ttl or settings.PRESENCE_TYPING_TTL
+        self.flush_interval = flush_interval or settings.PRESENCE_FLUSH_INTERVAL_MS / 1000
+        self._publish: Optional[Publish] = None
+        # Открытые соединения: user_id -> chat_id -> число соединений
+        self._connections: Dict[int, Dict[int, int]] = {}
+        self._last_seen: Dict[int, float] = {}
+        self._away: Set[int] = set()
+        # (chat_id, user_id) -> когда погасить индикатор набора
+        self._typing: Dict[Tuple[int, int], float] = {}
+        # Накопленные изменения: chat_id -> {"statuses": {...}, "typing": {...}}
+        self._pending: Dict[int, Dict[str, dict]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._last_refresh = 0.0
+
+    def bind(self, publish: Publish) -> None:
+        self._publish = publish
+
+    def _chats(self, user_id: int) -> Iterable[int]:
+        return self._connections.get(user_id, {}).keys()
+
+    def _queue(self, chat_ids: Iterable[int], kind: str, user_id: int, value) -> None:
+        for chat_id in chat_ids:
+            pending = self._pending.setdefault(chat_id, {"statuses": {}, "typing": {}})
+            pending[kind][user_id] = value
+
+    def _set_status(self, user_id: int, status: UserStatus, chat_ids: Iterable[int]) -> None:
+        self._queue(chat_ids, "statuses", user_id, status.value)
+
+    async def connect(self, user_id: int, chat_id: int) -> None:
+        chats = self._connections.setdefault(user_id, {})
+        first = not chats
+        if chat_id not in chats:
+            chats[chat_id] = 0
+            # В новом чате пользователь появляется сразу
+            self._set_status(user_id, self.status(user_id), [chat_id])
+        chats[chat_id] += 1
+        self.touch(user_id)
+        if first:
+            await self.store.add(user_id)
+            self._set_status(user_id, UserStatus.ONLINE, chats.keys())
+        self._ensure_flusher()
+
+    async def disconnect(self, user_id: int, chat_id: int) -> None:
+        chats = self._connections.get(user_id)
+        if not chats or chat_id not in chats:
+            return
+        chats[chat_id] -= 1
+        if chats[chat_id] > 0:
+            return
+        del chats[chat_id]
+        self._stop_typing(chat_id, user_id)
+        if chats:
+            # В других чатах этого воркера пользователь остаётся в сети
+            self._set_status(user_id, UserStatus.OFFLINE, [chat_id])
+            return
+        del self._connections[user_id]
+        self._last_seen.pop(user_id, None)
+        self._away.discard(user_id)
+        await self.store.remove(user_id)
+        still_online = user_id in await self.store.online([user_id])
+        if not still_online:
+            self._set_status(user_id, UserStatus.OFFLINE, [chat_id])
+
+    def touch(self, user_id: int) -> None:
+        """Any frame from the user counts as a heartbeat."""
+        self._last_seen[user_id] = time.monotonic()
+        if user_id in self._away:
+            self._away.discard(user_id)
+            self._set_status(user_id, UserStatus.ONLINE, self._chats(user_id))
+
+    def typing(self, user_id: int, chat_id: int, active: bool = True) -> None:
+        self.touch(user_id)
+        if not active:
+            self._stop_typing(chat_id, user_id)
+            return
+        key = (chat_id, user_id)
+        if key not in self._typing:
+            self._queue([chat_id], "typing", user_id, True)
+        self._typing[key] = time.monotonic() + self.typing_ttl
+
+    def _stop_typing(self, chat_id: int, user_id: int) -> None:
+        if self._typing.pop((chat_id, user_id), None) is not None:
+            self._queue([chat_id], "typing", user_id, False)
+
+    def status(self, user_id: int) -> UserStatus:
+        if user_id not in self._connections:
+            return UserStatus.OFFLINE
+        return UserStatus.AWAY if user_id in self._away else UserStatus.ONLINE
+
+    def snapshot(self, chat_id: int) -> dict:
+        """Full presence of a chat as seen by this worker, for new subscribers."""
+        return event(EventType.PRESENCE, chat_id, {
+            "statuses": {
+                user_id: self.status(user_id).value
+                for user_id, chats in self._connections.items() if chat_id in chats
+            },
+            "typing": {
+                user_id: True for (typing_chat, user_id) in self._typing if typing_chat == chat_id
+            },
+        })
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for (chat_id, user_id), expires_at in list(self._typing.items()):
+            if expires_at <= now:
+                self._stop_typing(chat_id, user_id)
+        idle_since = now - self.heartbeat_ttl
+        for user_id, last_seen in self._last_seen.items():
+            if last_seen < idle_since and user_id not in self._away:
+                self._away.add(user_id)
+                self._set_status(user_id, UserStatus.AWAY, self._chats(user_id))
+
+    async def flush(self) -> None:
+        self._expire()
+        now = time.monotonic()
+        if now - self._last_refresh > self.heartbeat_ttl / 3:
+            # Продлеваем присутствие своих пользователей в общем хранилище
+            self._last_refresh = now
+            await self.store.refresh(self._connections.keys())
+        pending, self._pending = self._pending, {}
+        for chat_id, changes in pending.items():
+            await self._publish(chat_id, event(EventType.PRESENCE, chat_id, changes))
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Presence flush failed: {str(e)}")
+            if not self._connections and not self._pending:
+                self._flusher = None
+                return
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.store.close()
@@ -0,0 +1,232 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    # Через сколько секунд запрос снова пройдёт (0, если разрешён)
+    retry_after: float
+
+
+def _window_state(now: float, window: float) -> Tuple[int, float]:
+    """Current fixed window index and the share of it that has elapsed."""
+    index = int(now // window)
+    return index, (now - index * window) / window
+
+
+def _decide(
+    limit: int, current: int, previous: int, elapsed: float, window: float
+) -> RateLimitResult:
+    """
+    Sliding-window counter: the previous window's count is weighted by the
+    part of it still covered by a window ending now.
+    """
+    estimated = previous * (1 - elapsed) + current
+    if estimated + 1 <= limit:
+        return RateLimitResult(True, limit, max(0, int(limit - estimated - 1)), 0.0)
+    if current + 1 > limit or previous == 0:
+        # Текущее окно уже исчерпано само по себе - ждём следующего
+        retry_after = (1 - elapsed) * window
+    else:
+        # Ждём, пока вес предыдущего окна упадёт достаточно
+        needed = 1 - (limit - current - 1) / previous
+        retry_after = (needed - elapsed) * window
+    return RateLimitResult(False, limit, 0, max(retry_after, 0.0))
+
+
+class TokenBucket:
+    """
+    Local token bucket: `rate` tokens per second up to `capacity`.
+
+    Used for per-connection limits where the state lives and dies with the
+    connection, so no shared backend is needed.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RateLimitBackend:
+    """
+    Storage for sliding-window counters.
+
+    Each key costs two integers (current and previous window count), so
+    work and memory per request are constant no matter the traffic.
+    """
+
+    async def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Per-process counters with lazy eviction of keys that went quiet."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # key -> [индекс окна, счётчик текущего окна, счётчик предыдущего];
+        # порядок - по последнему обращению, самые старые в начале
+        self._counters: "OrderedDict[str, list]" = OrderedDict()
+
+    async def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        index, elapsed = _window_state(time.time(), window)
+        entry = self._counters.get(key)
+        if entry is None:
+            entry = [index, 0, 0]
+            self._counters[key] = entry
+        elif entry[0] != index:
+            # Окно сменилось: текущий счётчик становится предыдущим
+            entry[2] = entry[1] if entry[0] == index - 1 else 0
+            entry[0], entry[1] = index, 0
+        self._counters.move_to_end(key)
+
+        result = _decide(limit, entry[1], entry[2], elapsed, window)
+        if result.allowed:
+            entry[1] += 1
+        self._evict(index)
+        return result
+
+    def _evict(self, index: int) -> None:
+        # Ключ, не обновлявшийся два окна, ничего не ограничивает.
+        # Смотрим только начало очереди, поэтому это O(1) в среднем.
+        while self._counters:
+            key, entry = next(iter(self._counters.items()))
+            if entry[0] >= index - 1 and len(self._counters) <= self.max_keys:
+                break
+            del self._counters[key]
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+
+# Атомарно читает оба окна и увеличивает текущее, только если запрос проходит
+_SLIDING_WINDOW_LUA = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local limit = tonumber(ARGV[1])
+if previous * tonumber(ARGV[2]) + current + 1 <= limit then
+    current = redis.call('INCR', KEYS[1])
+    if current == 1 then
+        redis.call('EXPIRE', KEYS[1], ARGV[3])
+    end
+    return {1, current - 1, previous}
+end
+return {0, current, previous}
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Counters in Redis, so limits hold across all worker processes."""
+
+    def __init__(self, url: str, key_prefix: str = "ratelimit:"):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._sha: Optional[str] = None
+        self._prefix = key_prefix
+
+    async def _eval(self, keys: list, args: list) -> list:
+        from redis.exceptions import NoScriptError
+
+        if self._sha is None:
+            self._sha = await self._redis.script_load(_SLIDING_WINDOW_LUA)
+        try:
+            return await self._redis.evalsha(self._sha, len(keys), *keys, *args)
+        except NoScriptError:
+            # Redis перезапустился и потерял кэш скриптов - загружаем заново
+            self._sha = await self._redis.script_load(_SLIDING_WINDOW_LUA)
+            return await self._redis.evalsha(self._sha, len(keys), *keys, *args)
+
+    async def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        index, elapsed = _window_state(time.time(), window)
+        allowed, current, previous = await self._eval(
+            [f"{self._prefix}{key}:{index}", f"{self._prefix}{key}:{index - 1}"],
+            [limit, repr(1 - elapsed), math.ceil(window * 2)],
+        )
+        result = _decide(limit, int(current), int(previous), elapsed, window)
+        if bool(allowed) != result.allowed:
+            # Расхождение возможно только на границе округления - верим скрипту
+            retry_after = 0.0 if allowed else (1 - elapsed) * window
+            result = RateLimitResult(bool(allowed), limit, 0, retry_after)
+        return result
+
+    async def close(self) -> None:
+        await self._redis.close()
+
+
+def create_rate_limit_backend() -> RateLimitBackend:
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitBackend(settings.REDIS_URL)
+    return MemoryRateLimitBackend(max_keys=settings.RATE_LIMIT_MAX_KEYS)
+
+
+class RateLimiter:
+    """
+    Picks the limit for a request and counts it against its key.
+
+    Routes listed in `route_limits` (matched by path prefix) get their own
+    budget; everything else shares the default one. Authenticated callers
+    are counted per user, anonymous ones per client address.
+    """
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        anonymous_limit: int,
+        user_limit: int,
+        route_limits: Optional[Dict[str, int]] = None,
+        window: float = 60.0,
+    ):
+        self.backend = backend
+        self.anonymous_limit = anonymous_limit
+        self.user_limit = user_limit
+        # Длинные префиксы проверяем первыми
+        self.route_limits = sorted(
+            (route_limits or {}).items(), key=lambda item: len(item[0]), reverse=True
+        )
+        self.window = window
+
+    def rule_for(self, path: str, user: Optional[str]) -> Tuple[str, int]:
+        for prefix, limit in self.route_limits:
+            if path.startswith(prefix):
+                return prefix, limit
+        return "*", self.user_limit if user else self.anonymous_limit
+
+    async def hit(self, path: str, client: str, user: Optional[str] = None) -> RateLimitResult:
+        scope, limit = self.rule_for(path, user)
+        identity = f"user:{user}" if user else f"ip:{client}"
+        return await self.backend.hit(f"{scope}|{identity}", limit, self.window)
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+def create_rate_limiter() -> RateLimiter:
+    return RateLimiter(
+        create_rate_limit_backend(),
+        anonymous_limit=settings.RATE_LIMIT_PER_MINUTE,
+        user_limit=settings.RATE_LIMIT_USER_PER_MINUTE,
+        route_limits=settings.RATE_LIMIT_ROUTES,
+    )
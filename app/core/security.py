@@ -1,10 +1,18 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Union, Any
-from jose import jwt
+from typing import Dict, Optional, Union, Any, Tuple
+from jose import JWTError, jwt
 from passlib.context import CryptContext
+from app.core.cache import TTLCache
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Хэши с другими параметрами (схема, rounds) помечаются как устаревшие и
+# пересчитываются при следующем входе
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -12,29 +20,127 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(
-            minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
+
+class PasswordHashingBusy(Exception):
+    """Raised when the password hashing queue is full; maps to HTTP 503."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated, size-limited thread pool so hashing never
+    blocks the event loop. At most `max_workers + max_queue` operations may
+    be in flight; beyond that callers get PasswordHashingBusy immediately
+    instead of queueing without bound.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="password-hash")
+        self._limit = max_workers + max_queue
+        # Меняется только из потока event loop, блокировка не нужна
+        self._in_flight = 0
+
+    async def _run(self, fn, *args):
+        if self._in_flight >= self._limit:
+            raise PasswordHashingBusy()
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(fn, *args)
+        self._in_flight += 1
+        # Место освобождается, когда работа закончилась в пуле, а не когда
+        # ожидающий запрос отменён: начатый bcrypt при отмене досчитывается
+        future.add_done_callback(lambda _: self._release(loop))
+        return await asyncio.wrap_future(future)
+
+    def _release(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Вызывается из потока пула; счётчик меняется только в потоке loop
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self._decrement)
+
+    def _decrement(self) -> None:
+        self._in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        """Verify a password; also returns a new hash if the old one is outdated."""
+        return await self._run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+class TokenVerifier:
+    """
+    Issues and verifies access tokens.
+
+    Tokens carry the id of their signing key in the `kid` header. Every key
+    in `keys` is accepted, new tokens are signed with `active_kid`, so a key
+    can be rotated in and the old one dropped once its tokens expire.
+    Verified claims are cached until the token's own `exp`, so repeated
+    requests with the same token skip signature checks entirely.
+    """
+
+    def __init__(
+        self,
+        keys: Dict[str, str],
+        active_kid: str,
+        algorithm: str,
+        cache_size: int,
+        default_expire_minutes: int,
+    ):
+        if active_kid not in keys:
+            raise ValueError(f"Active signing key {active_kid!r} is not configured")
+        self.keys = keys
+        self.active_kid = active_kid
+        self.algorithm = algorithm
+        self.default_expire = timedelta(minutes=default_expire_minutes)
+        self._claims: TTLCache[dict] = TTLCache(
+            ttl=self.default_expire.total_seconds(), max_size=cache_size
         )
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(
-        to_encode,
-        settings.SECRET_KEY,
-        algorithm=settings.ALGORITHM
-    )
-    return encoded_jwt
 
-def verify_token(token: str) -> Optional[dict]:
-    try:
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM]
+    def create(self, data: dict, expires_delta: Optional[timedelta] = None) -> str:
+        to_encode = data.copy()
+        to_encode["exp"] = datetime.utcnow() + (expires_delta or self.default_expire)
+        return jwt.encode(
+            to_encode,
+            self.keys[self.active_kid],
+            algorithm=self.algorithm,
+            headers={"kid": self.active_kid},
         )
-        return payload
-    except jwt.JWTError:
-        return None 
\ No newline at end of file
+
+    def verify(self, token: str) -> Optional[dict]:
+        """Return the token's claims, or None if it is malformed, forged or expired."""
+        claims = self._claims.get(token)
+        if claims is not None:
+            return claims
+        try:
+            # Токены без kid выпущены до ротации ключей - проверяем активным
+            kid = jwt.get_unverified_header(token).get("kid") or self.active_kid
+            key = self.keys.get(kid)
+            if key is None:
+                return None
+            claims = jwt.decode(token, key, algorithms=[self.algorithm])
+        except JWTError:
+            return None
+        exp = claims.get("exp")
+        self._claims.set(token, claims, ttl=exp - time.time() if exp is not None else None)
+        return claims
+
+
+token_verifier = TokenVerifier(
+    keys=settings.JWT_SIGNING_KEYS or {settings.JWT_ACTIVE_KID: settings.SECRET_KEY},
+    active_kid=settings.JWT_ACTIVE_KID,
+    algorithm=settings.ALGORITHM,
+    cache_size=settings.TOKEN_CACHE_MAX_SIZE,
+    default_expire_minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES,
+)
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    return token_verifier.create(data, expires_delta)
+
+def verify_token(token: str) -> Optional[dict]:
+    return token_verifier.verify(token)
@@ -0,0 +1,50 @@
+from functools import lru_cache
+from typing import Any, Optional, Type
+
+from fastapi import Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:  # orjson - необязательная зависимость
+    orjson = None
+
+
+@lru_cache(maxsize=None)
+def type_adapter(tp: Any) -> TypeAdapter:
+    """One TypeAdapter per response type, built on first use and reused."""
+    return TypeAdapter(tp)
+
+
+def default_response_class() -> Type[Response]:
+    """ORJSONResponse when FAST_JSON_RESPONSES is on and orjson is installed."""
+    if settings.FAST_JSON_RESPONSES and orjson is not None:
+        return ORJSONResponse
+    return JSONResponse
+
+
+def serialize(tp: Any, content: Any, response: Optional[Response] = None) -> Any:
+    """
+    Fast path for large responses: validate `content` (ORM objects or row
+    mappings) against `tp` once and write JSON bytes straight from
+    pydantic-core.
+
+    The result is a ready Response, so FastAPI skips its own
+    response_model validation and encoding - nothing is validated twice.
+    Headers and status set on the endpoint's injected `response` are
+    carried over. With FAST_JSON_RESPONSES off `content` is returned as
+    is and takes the regular route.
+    """
+    if not settings.FAST_JSON_RESPONSES:
+        return content
+    adapter = type_adapter(tp)
+    body = adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+    fast = Response(body, media_type="application/json")
+    if response is not None:
+        if response.status_code:
+            fast.status_code = response.status_code
+        fast.raw_headers.extend(response.headers.raw)
+    return fast
@@ -1,26 +1,450 @@
-from typing import Dict, List, Any
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple, Union
 from fastapi import WebSocket
+from pydantic import BaseModel
+import asyncio
 import json
+import logging
+
+from app.core.config import settings
+from app.core.events import Encoding, EventType, Frame, encode, encoding_for, event
+from app.core.presence import PresenceTracker, create_presence_store
+
+logger = logging.getLogger(__name__)
+
+# Колбэк локальной доставки: (chat_id, JSON-строка сообщения)
+Deliver = Callable[[int, str], Awaitable[None]]
+# Загрузка пропущенного из базы: (chat_id, после seq, не больше) -> конверты событий
+LoadMissed = Callable[[int, int, int], Awaitable[List[dict]]]
+# (seq, JSON-строка) события; у событий без номера seq = None
+SequencedEvent = Tuple[Optional[int], str]
+
+
+def _event_seq(data: str) -> Optional[int]:
+    # Номер есть только у новых сообщений; остальные события не разбираем
+    if '"seq"' not in data:
+        return None
+    try:
+        seq = json.loads(data).get("seq")
+    except (ValueError, AttributeError):
+        return None
+    return seq if isinstance(seq, int) else None
+
+
+def _removed_members(data: str) -> Set[int]:
+    # Исключённые из чата пользователи из события membership
+    if '"membership"' not in data:
+        return set()
+    try:
+        envelope = json.loads(data)
+        if envelope.get("type") != EventType.MEMBERSHIP.value:
+            return set()
+        return set(envelope["data"]["removed"])
+    except (ValueError, AttributeError, KeyError, TypeError):
+        return set()
+
+
+class BroadcastBackend:
+    """
+    Transport that carries chat broadcasts between worker processes.
+
+    The manager publishes every broadcast to the backend and only delivers
+    to its own sockets when the backend hands the message back, so a
+    message reaches each subscribed worker exactly once.
+    """
 
-class ConnectionManager:
     def __init__(self):
-        # Словарь для хранения соединений по чатам
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+        self._deliver: Optional[Deliver] = None
+
+    def bind(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def subscribe(self, chat_id: int) -> None:
+        pass
+
+    async def unsubscribe(self, chat_id: int) -> None:
+        pass
+
+    async def publish(self, chat_id: int, data: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBroadcastBackend(BroadcastBackend):
+    """Single-process backend: publishing is local delivery."""
+
+    async def publish(self, chat_id: int, data: str) -> None:
+        await self._deliver(chat_id, data)
+
+
+class RedisBroadcastBackend(BroadcastBackend):
+    """Redis pub/sub backend with one channel per chat."""
+
+    def __init__(self, url: str, channel_prefix: str = "chat:"):
+        super().__init__()
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._pubsub = self._redis.pubsub()
+        self._prefix = channel_prefix
+        self._listener: Optional[asyncio.Task] = None
+        # Ожидающие подтверждения SUBSCRIBE по каналам; их будит _listen
+        self._confirmations: Dict[str, List[asyncio.Future]] = {}
+
+    def _channel(self, chat_id: int) -> str:
+        return f"{self._prefix}{chat_id}"
+
+    async def subscribe(self, chat_id: int) -> None:
+        """
+        Subscribe to the chat's channel and return once Redis has confirmed
+        it, i.e. once messages published to the chat reach this process.
+        """
+        channel = self._channel(chat_id)
+        confirmed = asyncio.get_running_loop().create_future()
+        self._confirmations.setdefault(channel, []).append(confirmed)
+        try:
+            # Команда только отправлена: ответ на неё читает _listen
+            await self._pubsub.subscribe(channel)
+            if self._listener is None:
+                self._listener = asyncio.create_task(self._listen())
+            await asyncio.wait_for(confirmed, settings.BROADCAST_SUBSCRIBE_TIMEOUT)
+        finally:
+            waiters = self._confirmations.get(channel, [])
+            if confirmed in waiters:
+                waiters.remove(confirmed)
+            if not waiters:
+                self._confirmations.pop(channel, None)
+
+    async def unsubscribe(self, chat_id: int) -> None:
+        await self._pubsub.unsubscribe(self._channel(chat_id))
+
+    async def publish(self, chat_id: int, data: str) -> None:
+        await self._redis.publish(self._channel(chat_id), data)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                if message["type"] == "subscribe":
+                    for confirmed in self._confirmations.pop(message["channel"], []):
+                        if not confirmed.done():
+                            confirmed.set_result(None)
+                    continue
+                if message["type"] != "message":
+                    continue
+                chat_id = int(message["channel"][len(self._prefix):])
+                await self._deliver(chat_id, message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis broadcast listener error: {str(e)}")
+                await asyncio.sleep(1.0)
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        await self._pubsub.close()
+        await self._redis.close()
+
 
-    async def connect(self, websocket: WebSocket, chat_id: int):
-        await websocket.accept()
+def create_broadcast_backend() -> BroadcastBackend:
+    if settings.BROADCAST_BACKEND == "redis":
+        return RedisBroadcastBackend(settings.REDIS_URL)
+    return MemoryBroadcastBackend()
+
+
+class ClientConnection:
+    """A socket with its own bounded outbound queue and writer task."""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        chat_id: int,
+        queue_size: int,
+        user_id: Optional[int] = None,
+        encoding: Encoding = Encoding.JSON,
+    ):
+        self.websocket = websocket
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.encoding = encoding
+        # Кадры на отправку; None - закрыть сокет после них (см. _revoke)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+        # Пока идёт досылка, живые события копятся здесь, а не в очереди
+        self.held: Optional[List[SequencedEvent]] = None
+
+
+class ConnectionManager:
+    def __init__(
+        self,
+        backend: Optional[BroadcastBackend] = None,
+        queue_size: Optional[int] = None,
+        slow_consumer_policy: Optional[str] = None,
+        presence: Optional[PresenceTracker] = None,
+        replay_buffer_size: Optional[int] = None,
+        replay_limit: Optional[int] = None,
+    ):
+        # Соединения этого процесса по чатам
+        self.active_connections: Dict[int, Dict[WebSocket, ClientConnection]] = {}
+        self.backend = backend or MemoryBroadcastBackend()
+        self.backend.bind(self._deliver_local)
+        self.queue_size = queue_size or settings.WS_SEND_QUEUE_SIZE
+        # "drop" - пропускать сообщения медленному клиенту,
+        # "disconnect" - закрывать его соединение
+        self.slow_consumer_policy = slow_consumer_policy or settings.WS_SLOW_CONSUMER_POLICY
+        self._pending: Set[asyncio.Task] = set()
+        self.presence = presence
+        if presence is not None:
+            presence.bind(self.broadcast_to_chat)
+        # Последние события с номерами по чатам, на которые подписан процесс.
+        # Буфер живёт, пока есть подписка: только тогда в нём нет пропусков
+        self.replay_buffer_size = replay_buffer_size or settings.WS_REPLAY_BUFFER_SIZE
+        self.replay_limit = replay_limit or settings.WS_REPLAY_MAX_MESSAGES
+        self._recent: Dict[int, Deque[SequencedEvent]] = {}
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        chat_id: int,
+        user_id: Optional[int] = None,
+        last_seq: Optional[int] = None,
+        load_missed: Optional[LoadMissed] = None,
+        subprotocol: Optional[str] = None,
+    ):
+        """
+        Register a socket. The negotiated `subprotocol` picks the frame
+        encoding. With `last_seq` the client first receives every message
+        after it - from the in-memory buffer when it reaches back far
+        enough, otherwise from `load_missed` - then a ``replay`` event,
+        then live events.
+        """
+        await websocket.accept(subprotocol=subprotocol)
+        connection = ClientConnection(
+            websocket, chat_id, self.queue_size, user_id, encoding_for(subprotocol)
+        )
+        connection.writer = asyncio.create_task(self._write(connection))
         if chat_id not in self.active_connections:
-            self.active_connections[chat_id] = []
-        self.active_connections[chat_id].append(websocket)
-
-    def disconnect(self, websocket: WebSocket, chat_id: int):
-        if chat_id in self.active_connections:
-            self.active_connections[chat_id].remove(websocket)
-            if not self.active_connections[chat_id]:
-                del self.active_connections[chat_id]
-
-    async def broadcast_to_chat(self, chat_id: int, message: Any):
-        if chat_id in self.active_connections:
-            message_data = message if isinstance(message, dict) else message.__dict__
-            for connection in self.active_connections[chat_id]:
-                await connection.send_json(message_data) 
\ No newline at end of file
+            self.active_connections[chat_id] = {}
+            self._recent[chat_id] = deque(maxlen=self.replay_buffer_size)
+            await self.backend.subscribe(chat_id)
+        self.active_connections[chat_id][websocket] = connection
+        if last_seq is not None:
+            await self._replay(connection, last_seq, load_missed)
+        if self.presence is not None and user_id is not None:
+            await self.presence.connect(user_id, chat_id)
+            # Новому подписчику - текущее состояние, дальше только изменения
+            self._send(connection, self.presence.snapshot(chat_id))
+
+    def _buffered_since(self, chat_id: int, last_seq: int) -> Optional[List[SequencedEvent]]:
+        """Events after last_seq if the buffer holds all of them, else None."""
+        recent = self._recent.get(chat_id)
+        if not recent:
+            return None
+        missed = sorted(event for event in recent if event[0] > last_seq)
+        expected = last_seq + 1
+        for seq, _ in missed:
+            if seq != expected:
+                # Буфер начинается позже или в нём дыра - идём в базу
+                return None
+            expected += 1
+        return missed
+
+    async def _replay(
+        self, connection: ClientConnection, last_seq: int, load_missed: Optional[LoadMissed]
+    ):
+        connection.held = []
+        try:
+            missed = self._buffered_since(connection.chat_id, last_seq)
+            complete = True
+            if missed is None:
+                messages = []
+                if load_missed is not None:
+                    messages = await load_missed(connection.chat_id, last_seq, self.replay_limit)
+                missed = [(m["seq"], json.dumps(m, default=str)) for m in messages]
+                complete = len(missed) < self.replay_limit
+            replayed = missed[-1][0] if missed else last_seq
+            marker = event(
+                EventType.REPLAY, connection.chat_id, {"last_seq": replayed, "complete": complete}
+            )
+            for _, data in missed + [(None, json.dumps(marker))]:
+                # Досылка ждёт writer, а не переполняет очередь
+                await connection.queue.put(encode(data, connection.encoding))
+            # То, что пришло во время досылки, без повторов уже отправленного
+            while connection.held:
+                held, connection.held = connection.held, []
+                for seq, data in held:
+                    if seq is None or seq > replayed:
+                        await connection.queue.put(encode(data, connection.encoding))
+        finally:
+            connection.held = None
+
+    def _detach(self, websocket: WebSocket, chat_id: int) -> Optional[ClientConnection]:
+        connections = self.active_connections.get(chat_id)
+        if not connections or websocket not in connections:
+            return None
+        connection = connections.pop(websocket)
+        if not connections:
+            del self.active_connections[chat_id]
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        return connection
+
+    async def disconnect(self, websocket: WebSocket, chat_id: int):
+        connection = self._detach(websocket, chat_id)
+        if connection is None:
+            return
+        if chat_id not in self.active_connections:
+            await self._unsubscribe(chat_id)
+        await self._leave(connection)
+
+    async def _unsubscribe(self, chat_id: int):
+        # Без подписки буфер начнёт пропускать события - выбрасываем его
+        self._recent.pop(chat_id, None)
+        await self.backend.unsubscribe(chat_id)
+
+    async def _leave(self, connection: ClientConnection):
+        if self.presence is not None and connection.user_id is not None:
+            await self.presence.disconnect(connection.user_id, connection.chat_id)
+
+    def send_to(self, websocket: WebSocket, chat_id: int, message: dict) -> None:
+        """Queue an event for one socket only, in that socket's encoding."""
+        connection = self.active_connections.get(chat_id, {}).get(websocket)
+        if connection is not None:
+            self._send(connection, message)
+
+    def _send(self, connection: ClientConnection, message: dict) -> None:
+        try:
+            connection.queue.put_nowait(
+                encode(json.dumps(message, default=str), connection.encoding)
+            )
+        except asyncio.QueueFull:
+            self._on_overflow(connection)
+
+    async def broadcast_to_chat(self, chat_id: int, message: Union[BaseModel, dict]):
+        """Publish an event envelope - a Pydantic model or a JSON-ready dict."""
+        # Сериализуем один раз на всю рассылку; между воркерами ходит JSON
+        if isinstance(message, BaseModel):
+            data = message.model_dump_json()
+        else:
+            data = json.dumps(message, default=str)
+        await self.backend.publish(chat_id, data)
+
+    def publish_nowait(self, chat_id: int, message: Union[BaseModel, dict]) -> None:
+        """Schedule a broadcast without waiting for it, e.g. from an HTTP handler."""
+        task = asyncio.create_task(self.broadcast_to_chat(chat_id, message))
+        self._pending.add(task)
+        task.add_done_callback(self._published)
+
+    def _published(self, task: asyncio.Task) -> None:
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Broadcast failed: {str(task.exception())}")
+
+    async def _deliver_local(self, chat_id: int, data: str):
+        # Только кладём в очереди: отправкой занимаются writer-задачи,
+        # поэтому медленный клиент не задерживает остальных
+        seq = _event_seq(data)
+        if seq is not None and chat_id in self._recent:
+            self._recent[chat_id].append((seq, data))
+        removed = _removed_members(data)
+        # Каждая кодировка считается не больше одного раза на доставку
+        frames: Dict[Encoding, Frame] = {Encoding.JSON: data}
+        for connection in list(self.active_connections.get(chat_id, {}).values()):
+            if connection.held is not None:
+                connection.held.append((seq, data))
+            else:
+                frame = frames.get(connection.encoding)
+                if frame is None:
+                    frame = frames[connection.encoding] = encode(data, connection.encoding)
+                try:
+                    connection.queue.put_nowait(frame)
+                except asyncio.QueueFull:
+                    self._on_overflow(connection)
+            if connection.user_id in removed:
+                self._revoke(connection)
+
+    def _revoke(self, connection: ClientConnection):
+        """Close a socket whose user left the chat, after its queued frames."""
+        if connection.held is None:
+            try:
+                # writer закроет сокет, дойдя до None
+                connection.queue.put_nowait(None)
+                return
+            except asyncio.QueueFull:
+                pass
+        if self._detach(connection.websocket, connection.chat_id) is not None:
+            self._evict_later(connection, code=1008)
+
+    def _on_overflow(self, connection: ClientConnection):
+        connection.dropped += 1
+        if self.slow_consumer_policy == "drop":
+            return
+        logger.warning(f"Disconnecting slow WebSocket consumer in chat {connection.chat_id}")
+        self._detach(connection.websocket, connection.chat_id)
+        self._evict_later(connection)
+
+    def _evict_later(self, connection: ClientConnection, code: int = 1013) -> None:
+        # Ссылка в _pending: цикл событий держит задачи только слабо, а
+        # close() дождётся незавершённых
+        task = asyncio.create_task(self._evict(connection, code=code))
+        self._pending.add(task)
+        task.add_done_callback(self._evicted)
+
+    def _evicted(self, task: asyncio.Task) -> None:
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"WebSocket eviction failed: {str(task.exception())}")
+
+    async def _evict(self, connection: ClientConnection, code: int = 1013):
+        if connection.chat_id not in self.active_connections:
+            await self._unsubscribe(connection.chat_id)
+        await self._leave(connection)
+        try:
+            # 1013 - "Try Again Later", 1008 - больше не участник чата
+            await connection.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _write(self, connection: ClientConnection):
+        try:
+            while True:
+                frame = await connection.queue.get()
+                if frame is None:
+                    # Пользователя исключили из чата (см. _revoke)
+                    self._detach(connection.websocket, connection.chat_id)
+                    await self._evict(connection, code=1008)
+                    return
+                if isinstance(frame, bytes):
+                    await connection.websocket.send_bytes(frame)
+                else:
+                    await connection.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"WebSocket send failed in chat {connection.chat_id}: {str(e)}")
+            await self.disconnect(connection.websocket, connection.chat_id)
+
+    async def close(self):
+        # Рассылки и вытеснения могут породить новые вытеснения
+        while self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+        for connections in self.active_connections.values():
+            for connection in connections.values():
+                connection.writer.cancel()
+        self.active_connections.clear()
+        self._recent.clear()
+        if self.presence is not None:
+            await self.presence.close()
+        await self.backend.close()
+
+
+manager = ConnectionManager(
+    create_broadcast_backend(), presence=PresenceTracker(create_presence_store())
+)
@@ -1,14 +1,121 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
 from app.core.config import settings
 
-engine = create_engine(
-    settings.DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def _sqlite_pragmas() -> dict:
+    return {
+        # WAL: читатели не блокируют писателя и наоборот
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        # В WAL-режиме NORMAL не теряет целостность, только последние
+        # транзакции при падении ОС
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+        "temp_store": "MEMORY",
+    }
+
+
+def _install_sqlite_pragmas(sync_engine: Engine) -> None:
+    pragmas = _sqlite_pragmas()
+
+    @event.listens_for(sync_engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:")
+
+
+def async_database_url(url: str) -> str:
+    """Map a sync DATABASE_URL to its async driver (aiosqlite / asyncpg)."""
+    scheme, sep, rest = url.partition("://")
+    drivers = {
+        "sqlite": "sqlite+aiosqlite",
+        "postgresql": "postgresql+asyncpg",
+        "postgres": "postgresql+asyncpg",
+        "postgresql+psycopg2": "postgresql+asyncpg",
+    }
+    return drivers.get(scheme, scheme) + sep + rest
+
+
+def create_db_engine(url: str, tuned: bool = True) -> Engine:
+    """
+    Build an engine for `url`. SQLite engines get the tuning profile from
+    Settings (SQLITE_*), applied to every new connection, and a QueuePool
+    sized by DB_POOL_SIZE; other databases use SQLAlchemy defaults.
+    """
+    if not url.startswith("sqlite"):
+        return create_engine(
+            url,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+        )
+
+    connect_args = {"check_same_thread": False}
+    if _is_memory_sqlite(url):
+        # Память живёт, пока жив единственный коннект
+        return create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+    if not tuned:
+        return create_engine(url, connect_args=connect_args)
+
+    db_engine = create_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=QueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+    )
+    _install_sqlite_pragmas(db_engine)
+    return db_engine
+
+
+def create_async_db_engine(url: str, tuned: bool = True) -> AsyncEngine:
+    """Async counterpart of create_db_engine, with the same SQLite profile."""
+    async_url = async_database_url(url)
+    if not url.startswith("sqlite"):
+        return create_async_engine(
+            async_url,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+        )
+    if _is_memory_sqlite(url):
+        return create_async_engine(async_url, poolclass=StaticPool)
+
+    db_engine = create_async_engine(
+        async_url,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+    )
+    if tuned:
+        _install_sqlite_pragmas(db_engine.sync_engine)
+    return db_engine
+
+
+engine = create_db_engine(settings.DATABASE_URL, tuned=settings.SQLITE_TUNING)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_db_engine(settings.DATABASE_URL, tuned=settings.SQLITE_TUNING)
+
+# expire_on_commit=False: после commit атрибуты не должны подгружаться
+# лениво - в async-сессии это невозможно
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, expire_on_commit=False, autoflush=False
+)
+
 Base = declarative_base()
 
 # Dependency
@@ -17,4 +124,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
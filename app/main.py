@@ -1,9 +1,15 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 import logging
 from app.core.config import settings
+from app.core.middleware import setup_middleware
+from app.core.rate_limit import create_rate_limiter
+from app.core.security import PasswordHashingBusy
+from app.core.serialization import default_response_class
 from app.api.api import api_router
 from app.db.database import Base, engine
+from app.core.websocket import manager
+from app.services.ingest import message_buffer
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -22,21 +28,33 @@ app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
     description="API для чат-приложения",
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    default_response_class=default_response_class(),
 )
 
-# Настройка CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"]
-)
+# CORS и rate limiting (HTTP и WebSocket)
+rate_limiter = create_rate_limiter()
+setup_middleware(app, limiter=rate_limiter)
 
 # Подключаем основной роутер
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    # Очередь bcrypt переполнена - просим клиента повторить позже
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Сначала дописываем буфер сообщений, затем закрываем рассылку
+    await message_buffer.close()
+    await manager.close()
+    await rate_limiter.close()
+
 @app.get("/")
 async def root():
     return {"message": "Добро пожаловать в Pet Chat API"} 
\ No newline at end of file
@@ -1,14 +1,36 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey, Index, Table
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+import enum
 from app.db.database import Base
 
-# Таблица для связи many-to-many между пользователями и чатами
+class ChatRole(str, enum.Enum):
+    OWNER = "owner"
+    ADMIN = "admin"
+    MEMBER = "member"
+
+# Участие пользователя в чате: связь many-to-many и её метаданные.
+# Единственная таблица участников (бывшая chat_participants влита сюда
+# миграцией alembic/versions/3f1c2a9d7b10).
 user_chat = Table(
     'user_chat',
     Base.metadata,
+    # Ключ (user_id, chat_id) - "чаты пользователя"; в SQLite таблица
+    # WITHOUT ROWID хранится прямо в порядке ключа, так что сводка чатов
+    # читает last_read_message_id без перехода к строке
     Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
-    Column('chat_id', Integer, ForeignKey('chats.id'), primary_key=True)
+    Column('chat_id', Integer, ForeignKey('chats.id'), primary_key=True),
+    # Всё с id не больше этого прочитано; непрочитанные считаются по
+    # индексу messages (chat_id, id), отдельного счётчика нет
+    Column('last_read_message_id', Integer, nullable=False, default=0, server_default='0'),
+    Column('joined_at', DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Column(
+        'role', Enum(ChatRole), nullable=False,
+        default=ChatRole.MEMBER, server_default=ChatRole.MEMBER.name,
+    ),
+    # Обратное направление - "участники чата" и проверка участия
+    Index('ix_user_chat_chat_id_user_id', 'chat_id', 'user_id'),
+    sqlite_with_rowid=False,
 )
 
 class Chat(Base):
@@ -20,14 +42,14 @@ class Chat(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     creator_id = Column(Integer, ForeignKey("users.id"))
 
+    # Сводка для списка чатов, обновляется в MessageService
+    last_message_id = Column(Integer, nullable=True)
+    last_message_preview = Column(String, nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    # Последний выданный Message.seq в этом чате
+    last_seq = Column(Integer, nullable=False, default=0, server_default='0')
+
     # Отношения
     creator = relationship("User", back_populates="created_chats", foreign_keys=[creator_id])
     participants = relationship("User", secondary=user_chat, back_populates="chats")
     messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
-
-class ChatParticipant(Base):
-    __tablename__ = "chat_participants"
-
-    chat_id = Column(Integer, ForeignKey("chats.id"), primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
-    joined_at = Column(DateTime(timezone=True), server_default=func.now()) 
\ No newline at end of file
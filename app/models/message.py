@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Boolean
+from sqlalchemy import DDL, Column, Integer, String, DateTime, ForeignKey, Enum, Boolean, Index, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -11,6 +11,12 @@ class MessageType(str, enum.Enum):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Keyset-пагинация истории: WHERE chat_id = ? AND id < ? ORDER BY id DESC
+        Index("ix_messages_chat_id_id", "chat_id", "id"),
+        # Досылка пропущенного после переподключения: WHERE chat_id = ? AND seq > ?
+        Index("ix_messages_chat_id_seq", "chat_id", "seq", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(String, nullable=False)
@@ -21,8 +27,49 @@ class Message(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     is_edited = Column(Boolean, default=False)
+    # Возрастающий номер сообщения внутри чата, выдаётся через Chat.last_seq
+    seq = Column(Integer, nullable=True)
 
     # Отношения
     sender = relationship("User", back_populates="messages")
     chat = relationship("Chat", back_populates="messages")
-    reply_to = relationship("Message", remote_side=[id], backref="replies") 
\ No newline at end of file
+    reply_to = relationship("Message", remote_side=[id], backref="replies") 
+
+# Полнотекстовый поиск (только SQLite): FTS5-индекс с внешним содержимым
+# поверх messages. Триггеры обновляют его в той же транзакции, что и
+# саму таблицу, в том числе при пакетной вставке.
+MESSAGE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, content='messages', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+for _statement in MESSAGE_SEARCH_DDL:
+    event.listen(Message.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+# Триггеры удаляются вместе с messages, индекс - отдельно
+event.listen(
+    Message.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS messages_fts").execute_if(dialect="sqlite"),
+)
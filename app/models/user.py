@@ -11,6 +11,8 @@ class User(Base):
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
+    # "USER" или "ADMIN"
+    role = Column(String, nullable=False, default="USER", server_default="USER")
 
     # Отношения
     created_chats = relationship("Chat", back_populates="creator", foreign_keys="[Chat.creator_id]")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from typing import List, Optional
 from datetime import datetime
 from .user import User
@@ -6,8 +6,11 @@ from .user import User
 class ChatBase(BaseModel):
     name: str
 
+# Сколько участников можно добавить или исключить одним запросом
+MAX_PARTICIPANTS_PER_REQUEST = 10000
+
 class ChatCreate(ChatBase):
-    pass
+    participant_ids: List[int] = Field(default_factory=list, max_length=MAX_PARTICIPANTS_PER_REQUEST)
 
 class Chat(ChatBase):
     id: int
@@ -18,6 +21,34 @@ class Chat(ChatBase):
     class Config:
         from_attributes = True
 
+class ChatSummary(Chat):
+    """Chat list entry: last message and the caller's unread count."""
+    last_message_id: Optional[int] = None
+    last_message_preview: Optional[str] = None
+    last_message_at: Optional[datetime] = None
+    last_read_message_id: int = 0
+    unread_count: int = 0
+
+class ChatRead(BaseModel):
+    # Без message_id чат отмечается прочитанным целиком
+    message_id: Optional[int] = None
+
+class ParticipantsUpdate(BaseModel):
+    """Participants to add and to remove, applied in one transaction."""
+    add: List[int] = Field(default_factory=list, max_length=MAX_PARTICIPANTS_PER_REQUEST)
+    remove: List[int] = Field(default_factory=list, max_length=MAX_PARTICIPANTS_PER_REQUEST)
+
+    @model_validator(mode="after")
+    def check_disjoint(self) -> "ParticipantsUpdate":
+        if set(self.add) & set(self.remove):
+            raise ValueError("A user cannot be both added and removed")
+        return self
+
+class ParticipantsChanged(BaseModel):
+    # Только те, кого действительно добавили или исключили
+    added: List[int]
+    removed: List[int]
+
 class ChatUpdate(ChatBase):
     name: Optional[str] = None
 
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import Literal, Optional
+from .message import Message
+
+class MessageCreatedEvent(BaseModel):
+    """Envelope broadcast to a chat when a message is stored."""
+    type: Literal["message.created"] = "message.created"
+    chat_id: int
+    seq: Optional[int] = None
+    data: Message
+
+    @classmethod
+    def from_message(cls, message: Message) -> "MessageCreatedEvent":
+        return cls(chat_id=message.chat_id, seq=message.seq, data=message)
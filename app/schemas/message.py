@@ -22,13 +22,23 @@ class MessageInDBBase(MessageBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     is_edited: bool = False
+    seq: Optional[int] = None
 
     class Config:
         from_attributes = True
 
+class MessageReply(MessageInDBBase):
+    # Цитируемое сообщение отдаётся на один уровень; дальше по цепочке
+    # клиент идёт по reply_to_id
+    sender: User
+
 class Message(MessageInDBBase):
     sender: User
-    reply_to: Optional['Message'] = None
+    reply_to: Optional[MessageReply] = None
+
+class MessageSearchHit(Message):
+    # Фрагмент с совпадениями в <mark>, остальной текст экранирован
+    snippet: str = ""
 
 class MessageInDB(MessageInDBBase):
     pass 
\ No newline at end of file
@@ -20,7 +20,11 @@ class UserUpdate(BaseModel):
 
 class User(UserBase):
     id: int
-    created_at: datetime
+    # Адрес из базы уже проверен при записи; повторная проверка EmailStr
+    # занимала большую часть времени ответа со списком пользователей
+    email: str
+    # В модели User такой колонки нет
+    created_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
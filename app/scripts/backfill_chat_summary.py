@@ -0,0 +1,74 @@
+"""
+Заполняет сводки чатов (chats.last_message_*, user_chat.last_read_message_id)
+в существующей базе.
+
+    alembic upgrade head
+    python -m app.scripts.backfill_chat_summary
+
+Колонки создаёт миграция 2b8f4d6a0c31, скрипт только заполняет их данными.
+Повторный запуск безопасен. Все участники считаются прочитавшими чат до
+текущего последнего сообщения.
+"""
+import logging
+
+from sqlalchemy import func, inspect, select, update
+
+from app.db.database import engine
+from app.models.chat import Chat, user_chat
+from app.models.message import Message
+from app.services.message import PREVIEW_LENGTH
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = {
+    "chats": {"last_message_id", "last_message_preview", "last_message_at"},
+    "user_chat": {"last_read_message_id"},
+}
+
+
+def check_schema(connection) -> None:
+    inspector = inspect(connection)
+    for table, columns in REQUIRED_COLUMNS.items():
+        missing = columns - {column["name"] for column in inspector.get_columns(table)}
+        if missing:
+            raise SystemExit(
+                f"Нет колонок {table}: {', '.join(sorted(missing))}; сначала alembic upgrade head"
+            )
+
+
+def backfill(connection) -> None:
+    def latest(column):
+        return (
+            select(column)
+            .where(Message.chat_id == Chat.id)
+            .order_by(Message.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+
+    connection.execute(
+        update(Chat).values(
+            last_message_id=latest(Message.id),
+            last_message_preview=latest(func.substr(Message.content, 1, PREVIEW_LENGTH)),
+            last_message_at=latest(Message.created_at),
+        )
+    )
+    connection.execute(
+        update(user_chat).values(
+            last_read_message_id=select(func.coalesce(Chat.last_message_id, 0))
+            .where(Chat.id == user_chat.c.chat_id)
+            .scalar_subquery()
+        )
+    )
+
+
+def main() -> None:
+    with engine.begin() as connection:
+        check_schema(connection)
+        backfill(connection)
+    logger.info("Сводки чатов заполнены")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Нумерует старые сообщения (messages.seq) и выставляет счётчики чатов
+(chats.last_seq) в существующей базе.
+
+    alembic upgrade head
+    python -m app.scripts.backfill_message_seq
+
+Колонки и уникальный индекс (chat_id, seq) создаёт миграция 4c9a5e7b1d42,
+скрипт только заполняет их данными. Запускать сразу после миграции и до
+старта новой версии: сообщения без номера нумеруются по id внутри чата,
+счётчик чата ставится на максимальный номер. Повторный запуск ничего не
+меняет.
+"""
+import logging
+
+from sqlalchemy import func, inspect, select, update
+
+from app.db.database import engine
+from app.models.chat import Chat
+from app.models.message import Message
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = {
+    "chats": {"last_seq"},
+    "messages": {"seq"},
+}
+
+
+def check_schema(connection) -> None:
+    inspector = inspect(connection)
+    for table, columns in REQUIRED_COLUMNS.items():
+        missing = columns - {column["name"] for column in inspector.get_columns(table)}
+        if missing:
+            raise SystemExit(
+                f"Нет колонок {table}: {', '.join(sorted(missing))}; сначала alembic upgrade head"
+            )
+
+
+def backfill(connection) -> None:
+    # Один проход по индексу (chat_id, id); оконные функции - SQLite 3.25+,
+    # UPDATE ... FROM - 3.33+
+    numbered = select(
+        Message.id,
+        func.row_number().over(partition_by=Message.chat_id, order_by=Message.id).label("seq"),
+    ).subquery()
+    connection.execute(
+        update(Message)
+        .where(Message.id == numbered.c.id, Message.seq.is_(None))
+        .values(
+            seq=numbered.c.seq,
+            # Нумерация - не правка: onupdate не должен трогать updated_at
+            updated_at=Message.updated_at,
+        )
+    )
+    connection.execute(
+        update(Chat).values(
+            last_seq=select(func.coalesce(func.max(Message.seq), 0))
+            .where(Message.chat_id == Chat.id)
+            .scalar_subquery(),
+            updated_at=Chat.updated_at,
+        )
+    )
+
+
+def main() -> None:
+    with engine.begin() as connection:
+        check_schema(connection)
+        backfill(connection)
+    logger.info("Номера сообщений заполнены")
+
+
+if __name__ == "__main__":
+    main()
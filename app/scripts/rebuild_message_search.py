@@ -0,0 +1,41 @@
+"""
+Создаёт поисковый индекс сообщений (FTS5) и перестраивает его с нуля.
+
+    python -m app.scripts.rebuild_message_search
+
+Базам, созданным до появления поиска, индекс добавляет миграция
+5d0b6f8e2c53. Скрипт нужен, если индекс разошёлся с таблицей messages
+(например, после ручных правок в обход триггеров).
+"""
+import logging
+import time
+
+from sqlalchemy import text
+
+from app.db.database import engine
+from app.models.message import MESSAGE_SEARCH_DDL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def rebuild() -> None:
+    with engine.begin() as connection:
+        for statement in MESSAGE_SEARCH_DDL:
+            connection.execute(text(statement))
+        # 'rebuild' заново читает всё содержимое messages, 'optimize'
+        # сливает сегменты индекса в один
+        connection.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+        connection.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')"))
+
+
+def main() -> None:
+    if engine.dialect.name != "sqlite":
+        raise SystemExit("Поиск по сообщениям работает только на SQLite")
+    start = time.perf_counter()
+    rebuild()
+    logger.info(f"Индекс поиска перестроен за {time.perf_counter() - start:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
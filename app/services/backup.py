@@ -0,0 +1,247 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import zlib
+from typing import AsyncIterator, BinaryIO, Callable, Optional, Tuple
+from sqlalchemy import insert, select
+from sqlalchemy.engine import make_url
+from app.core.cache import membership_cache, principal_cache
+from app.core.config import settings
+from app.db.database import Base, async_engine
+from app.models.user import User
+
+# Кусок чтения/записи файла копии
+CHUNK_SIZE = 1024 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+# wbits 16 + MAX_WBITS - формат gzip (заголовок и CRC), а не zlib
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+Progress = Callable[[int, int, int], None]
+
+
+def _read_chunk(file: BinaryIO, compressor) -> Tuple[bytes, bool]:
+    data = file.read(CHUNK_SIZE)
+    if compressor is None:
+        return data, not data
+    if not data:
+        return compressor.flush(), True
+    return compressor.compress(data), False
+
+
+def _receive(upload: BinaryIO, target: BinaryIO) -> None:
+    # gzip распаковывается на лету; max_length не даёт одному куску
+    # развернуться в память целиком
+    data = upload.read(CHUNK_SIZE)
+    decompressor = zlib.decompressobj(wbits=GZIP_WBITS) if data.startswith(GZIP_MAGIC) else None
+    try:
+        while data:
+            if decompressor is None:
+                target.write(data)
+            else:
+                while data:
+                    target.write(decompressor.decompress(data, CHUNK_SIZE))
+                    data = decompressor.unconsumed_tail
+            data = upload.read(CHUNK_SIZE)
+    except zlib.error as e:
+        raise ValueError(f"Corrupt gzip backup: {e}") from e
+    if decompressor is not None and not decompressor.eof:
+        raise ValueError("Truncated gzip backup")
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class BackupService:
+    """
+    Hot backups of the SQLite database through the online backup API,
+    restore and reset. Only file-based SQLite databases are supported.
+    """
+
+    @staticmethod
+    def database_path() -> Optional[str]:
+        """Path of the database file, None if it is not a SQLite file."""
+        url = make_url(settings.DATABASE_URL)
+        if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+            return None
+        return os.path.abspath(url.database)
+
+    @staticmethod
+    def _temp_path(path: str, prefix: str) -> str:
+        # Рядом с базой: копия размером с базу, в /tmp (часто tmpfs) её не держим
+        fd, temp_path = tempfile.mkstemp(
+            prefix=f".{os.path.basename(path)}-{prefix}-", suffix=".db", dir=os.path.dirname(path)
+        )
+        os.close(fd)
+        return temp_path
+
+    @staticmethod
+    def snapshot(
+        path: str,
+        target: str,
+        pages: Optional[int] = None,
+        sleep_ms: Optional[int] = None,
+        progress: Optional[Progress] = None,
+    ) -> None:
+        """
+        Copy the database at `path` into the file `target`, `pages` pages
+        per step of the online backup API, pausing `sleep_ms` between
+        steps. Blocking; run it in a thread.
+
+        In WAL mode the source connection holds one read transaction for
+        the whole copy: every step reads the same snapshot, so the copy is
+        consistent and is not restarted by concurrent commits (without it
+        SQLite restarts the backup on every write from another connection
+        and a busy database is never copied). Writers are not blocked, the
+        WAL just cannot be checkpointed past the snapshot until the copy
+        is done. In other journal modes a read lock would stop writers,
+        so the steps run unpinned and the copy restarts on writes.
+        """
+        pages = pages or settings.BACKUP_PAGES_PER_STEP
+        pause = (settings.BACKUP_STEP_SLEEP_MS if sleep_ms is None else sleep_ms) / 1000
+
+        def on_step(status: int, remaining: int, total: int) -> None:
+            if progress is not None:
+                progress(status, remaining, total)
+            # sleep самого backup() срабатывает только на SQLITE_BUSY
+            if pause and remaining:
+                time.sleep(pause)
+
+        source = sqlite3.connect(
+            path, isolation_level=None, timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000
+        )
+        destination = sqlite3.connect(target)
+        try:
+            if source.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+                # Транзакция чтения открывается первым чтением, не BEGIN
+                source.execute("BEGIN")
+                source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+            source.backup(destination, pages=pages, progress=on_step)
+        finally:
+            destination.close()
+            source.close()
+
+    @staticmethod
+    async def create_snapshot() -> str:
+        """Back the live database up into a temp file next to it; returns its path."""
+        path = BackupService.database_path()
+        target = BackupService._temp_path(path, "backup")
+        try:
+            await asyncio.to_thread(BackupService.snapshot, path, target)
+        except BaseException:
+            _remove(target)
+            raise
+        return target
+
+    @staticmethod
+    def remove_snapshot(path: str) -> None:
+        """Delete a snapshot file; a file that is already gone is fine."""
+        _remove(path)
+
+    @staticmethod
+    async def iter_file(path: str, compress: bool = True) -> AsyncIterator[bytes]:
+        """
+        Yield the snapshot file in chunks, gzip-compressed when `compress`
+        is set, and delete it afterwards. Reading and compression run in a
+        thread, so a multi-GB copy does not stall the event loop.
+        """
+        compressor = (
+            zlib.compressobj(settings.BACKUP_COMPRESSION_LEVEL, wbits=GZIP_WBITS)
+            if compress else None
+        )
+        try:
+            with open(path, "rb") as file:
+                while True:
+                    chunk, done = await asyncio.to_thread(_read_chunk, file, compressor)
+                    if chunk:
+                        yield chunk
+                    if done:
+                        break
+        finally:
+            _remove(path)
+
+    @staticmethod
+    def replace(source_path: str, path: str) -> None:
+        """
+        Check that `source_path` is a sound database with the app's tables
+        and copy it over the database at `path`. Raises ValueError when
+        the file is rejected; the live database is then untouched.
+
+        The copy goes through the backup API in a single step, i.e. one
+        write transaction: other connections see either the old database
+        or the new one. Renaming a file over a live WAL database is not
+        safe - open connections keep the old file and its -wal would be
+        replayed onto the new one.
+        """
+        source = sqlite3.connect(source_path)
+        try:
+            try:
+                check = source.execute("PRAGMA quick_check").fetchone()[0]
+                tables = {row[0] for row in source.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                )}
+                page_size = source.execute("PRAGMA page_size").fetchone()[0]
+            except sqlite3.DatabaseError as e:
+                raise ValueError(f"Not a SQLite database: {e}") from e
+            if check != "ok":
+                raise ValueError(f"Backup failed the integrity check: {check}")
+            missing = set(Base.metadata.tables) - tables
+            if missing:
+                raise ValueError(f"Backup lacks tables: {', '.join(sorted(missing))}")
+
+            destination = sqlite3.connect(path, timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000)
+            try:
+                # В WAL-режиме SQLite не копирует базу с другим размером страницы
+                if destination.execute("PRAGMA page_size").fetchone()[0] != page_size:
+                    raise ValueError(f"Backup page size {page_size} differs from the database")
+                source.backup(destination)
+            finally:
+                destination.close()
+        finally:
+            source.close()
+
+    @staticmethod
+    def _forget_cached_state() -> None:
+        # Пользователи и участники могли смениться целиком
+        principal_cache.clear()
+        membership_cache.clear()
+
+    @staticmethod
+    async def restore(upload: BinaryIO) -> None:
+        """
+        Restore the database from an uploaded backup, plain or gzipped.
+        The upload is streamed into a temp file next to the database and
+        swapped in with `replace`.
+        """
+        path = BackupService.database_path()
+        incoming = BackupService._temp_path(path, "restore")
+        try:
+            with open(incoming, "wb") as file:
+                await asyncio.to_thread(_receive, upload, file)
+            await asyncio.to_thread(BackupService.replace, incoming, path)
+        finally:
+            _remove(incoming)
+        BackupService._forget_cached_state()
+
+    @staticmethod
+    async def reset(keep_user_id: Optional[int] = None) -> None:
+        """Drop and recreate every table; user `keep_user_id` is written back as is."""
+        async with async_engine.begin() as connection:
+            columns = None
+            if keep_user_id is not None:
+                # Строка читается заново: объект пользователя из запроса может
+                # быть собран из кэша без части колонок (хэш пароля)
+                row = (await connection.execute(
+                    select(User.__table__).where(User.id == keep_user_id)
+                )).mappings().one_or_none()
+                columns = dict(row) if row is not None else None
+            await connection.run_sync(Base.metadata.drop_all)
+            await connection.run_sync(Base.metadata.create_all)
+            if columns is not None:
+                await connection.execute(insert(User).values(**columns))
+        BackupService._forget_cached_state()
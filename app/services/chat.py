@@ -1,14 +1,59 @@
-from typing import Optional, List
-from sqlalchemy.orm import Session
-from app.models.chat import Chat
+from typing import Iterable, Optional, List, Tuple
+from sqlalchemy import RowMapping, case, delete, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from app.models.chat import Chat, ChatRole, user_chat
+from app.models.message import Message
 from app.models.user import User
 from app.schemas.chat import ChatCreate, ChatUpdate
+from app.services.membership import MembershipService
+from app.services.message import MessageService
 
 class ChatService:
     @staticmethod
     def get_by_id(db: Session, chat_id: int) -> Optional[Chat]:
         return db.query(Chat).filter(Chat.id == chat_id).first()
 
+    @staticmethod
+    def is_participant(db: Session, chat_id: int, user_id: int) -> bool:
+        return db.query(MembershipService.exists_clause(chat_id, user_id)).scalar()
+
+    @staticmethod
+    def summaries_statement(user_id: int, chat_id: Optional[int] = None):
+        """
+        The user's chats with their last message and unread count.
+
+        One query: user_chat is read through its (user_id, chat_id) key and
+        each unread count is a range scan over messages (chat_id, id) past
+        the user's last read message.
+        """
+        unread_count = (
+            select(func.count())
+            .select_from(Message)
+            .where(
+                Message.chat_id == Chat.id,
+                Message.id > user_chat.c.last_read_message_id,
+            )
+            .correlate(Chat, user_chat)
+            .scalar_subquery()
+        )
+        statement = (
+            select(
+                *Chat.__table__.c,
+                user_chat.c.last_read_message_id,
+                unread_count.label("unread_count"),
+            )
+            .join(user_chat, user_chat.c.chat_id == Chat.id)
+            .where(user_chat.c.user_id == user_id)
+            .order_by(func.coalesce(Chat.last_message_at, Chat.created_at).desc(), Chat.id.desc())
+        )
+        if chat_id is not None:
+            statement = statement.where(Chat.id == chat_id)
+        return statement
+
     @staticmethod
     def get_user_chats(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[Chat]:
         return (
@@ -21,24 +66,73 @@ class ChatService:
         )
 
     @staticmethod
-    def create(db: Session, chat_in: ChatCreate, creator_id: int) -> Chat:
-        db_chat = Chat(
-            name=chat_in.name,
-            description=chat_in.description,
-            is_group=chat_in.is_group,
-            created_by=creator_id
+    def add_participants_statement(dialect: str, chat_id: int, user_ids: Iterable[int]):
+        """
+        Add existing users among `user_ids` to the chat in one statement;
+        users already in it are skipped by the key. RETURNING gives only
+        the rows actually inserted. New members start with everything
+        already in the chat read.
+        """
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        last_message_id = (
+            select(func.coalesce(Chat.last_message_id, 0))
+            .where(Chat.id == chat_id)
+            .scalar_subquery()
         )
-        
-        # Добавляем создателя как участника
-        creator = db.query(User).filter(User.id == creator_id).first()
-        db_chat.participants.append(creator)
-        
-        # Добавляем других участников
-        if chat_in.participant_ids:
-            participants = db.query(User).filter(User.id.in_(chat_in.participant_ids)).all()
-            db_chat.participants.extend(participants)
-        
+        users = select(User.id, literal(chat_id), last_message_id).where(
+            User.id.in_(set(user_ids))
+        )
+        return (
+            insert(user_chat)
+            .from_select(["user_id", "chat_id", "last_read_message_id"], users)
+            .on_conflict_do_nothing()
+            .returning(user_chat.c.user_id)
+        )
+
+    @staticmethod
+    def remove_participants_statement(chat_id: int, user_ids: Iterable[int]):
+        """Remove `user_ids` from the chat; the owner is never removed."""
+        return (
+            delete(user_chat)
+            .where(
+                user_chat.c.chat_id == chat_id,
+                user_chat.c.user_id.in_(set(user_ids)),
+                user_chat.c.role != ChatRole.OWNER,
+            )
+            .returning(user_chat.c.user_id)
+        )
+
+    @staticmethod
+    def add_participants(db: Session, chat_id: int, user_ids: Iterable[int]) -> List[int]:
+        """Bulk add without committing; returns the ids that were added."""
+        added = db.execute(ChatService.add_participants_statement(
+            db.get_bind().dialect.name, chat_id, user_ids
+        )).scalars().all()
+        for user_id in added:
+            MembershipService.invalidate(chat_id, user_id, db)
+        return added
+
+    @staticmethod
+    def remove_participants(db: Session, chat_id: int, user_ids: Iterable[int]) -> List[int]:
+        """Bulk remove without committing; returns the ids that were removed."""
+        removed = db.execute(
+            ChatService.remove_participants_statement(chat_id, user_ids)
+        ).scalars().all()
+        for user_id in removed:
+            MembershipService.invalidate(chat_id, user_id, db)
+        return removed
+
+    @staticmethod
+    def create(db: Session, chat_in: ChatCreate, creator_id: int) -> Chat:
+        db_chat = Chat(name=chat_in.name, creator_id=creator_id)
         db.add(db_chat)
+        db.flush()
+        # Создатель - владелец, остальные добавляются одним INSERT
+        db.execute(insert(user_chat).values(
+            chat_id=db_chat.id, user_id=creator_id, role=ChatRole.OWNER
+        ))
+        if chat_in.participant_ids:
+            ChatService.add_participants(db, db_chat.id, chat_in.participant_ids)
         db.commit()
         db.refresh(db_chat)
         return db_chat
@@ -61,18 +155,124 @@ class ChatService:
 
     @staticmethod
     def add_participant(db: Session, chat: Chat, user_id: int) -> Chat:
-        user = db.query(User).filter(User.id == user_id).first()
-        if user and user not in chat.participants:
-            chat.participants.append(user)
+        if ChatService.add_participants(db, chat.id, [user_id]):
             db.commit()
-            db.refresh(chat)
+            db.expire(chat, ["participants"])
         return chat
 
     @staticmethod
     def remove_participant(db: Session, chat: Chat, user_id: int) -> Chat:
-        user = db.query(User).filter(User.id == user_id).first()
-        if user and user in chat.participants:
-            chat.participants.remove(user)
+        if ChatService.remove_participants(db, chat.id, [user_id]):
             db.commit()
-            db.refresh(chat)
-        return chat 
\ No newline at end of file
+            db.expire(chat, ["participants"])
+        return chat
+
+class AsyncChatService:
+    """ChatService for AsyncSession; relationships are loaded eagerly."""
+
+    @staticmethod
+    def with_participants_options() -> list:
+        return [selectinload(Chat.participants), joinedload(Chat.creator)]
+
+    @staticmethod
+    async def get_by_id(
+        db: AsyncSession, chat_id: int, with_participants: bool = False
+    ) -> Optional[Chat]:
+        statement = select(Chat).where(Chat.id == chat_id)
+        if with_participants:
+            statement = statement.options(*AsyncChatService.with_participants_options())
+        result = await db.execute(statement)
+        return result.scalars().first()
+
+    @staticmethod
+    async def is_participant(db: AsyncSession, chat_id: int, user_id: int) -> bool:
+        result = await db.execute(
+            select(MembershipService.exists_clause(chat_id, user_id))
+        )
+        return result.scalar()
+
+    @staticmethod
+    async def get_user_chats(db: AsyncSession, user_id: int) -> List[Chat]:
+        result = await db.execute(
+            select(Chat)
+            .join(Chat.participants)
+            .where(User.id == user_id)
+            .options(*AsyncChatService.with_participants_options())
+        )
+        return result.scalars().unique().all()
+
+    @staticmethod
+    async def get_user_summaries(db: AsyncSession, user_id: int) -> List[RowMapping]:
+        result = await db.execute(ChatService.summaries_statement(user_id))
+        return result.mappings().all()
+
+    @staticmethod
+    async def get_user_summary(
+        db: AsyncSession, user_id: int, chat_id: int
+    ) -> Optional[RowMapping]:
+        result = await db.execute(ChatService.summaries_statement(user_id, chat_id))
+        return result.mappings().first()
+
+    @staticmethod
+    async def mark_read(
+        db: AsyncSession, chat_id: int, user_id: int, message_id: Optional[int] = None
+    ) -> None:
+        """
+        Move the user's read marker forward; by default to the chat's last
+        message. The marker never goes past the last message, otherwise
+        messages arriving later would never count as unread.
+        """
+        last_id = func.coalesce(Chat.last_message_id, 0)
+        if message_id is not None:
+            last_id = case((last_id > message_id, message_id), else_=last_id)
+        message_id = select(last_id).where(Chat.id == chat_id).scalar_subquery()
+        await db.execute(MessageService.mark_read_statement(chat_id, user_id, message_id))
+        await db.commit()
+
+    @staticmethod
+    async def create(
+        db: AsyncSession, name: str, creator: User, participant_ids: Iterable[int] = ()
+    ) -> Chat:
+        db_chat = Chat(name=name, creator_id=creator.id)
+        db.add(db_chat)
+        await db.flush()
+        # Создатель - владелец; через коллекцию participants роль не задать
+        await db.execute(insert(user_chat).values(
+            chat_id=db_chat.id, user_id=creator.id, role=ChatRole.OWNER
+        ))
+        participant_ids = set(participant_ids) - {creator.id}
+        if participant_ids:
+            await AsyncChatService.update_participants(db, db_chat.id, add=participant_ids)
+        await db.commit()
+        await db.refresh(db_chat, ["created_at", "updated_at"])
+        if not participant_ids:
+            # Коллекция известна целиком - ленивой загрузки не будет
+            set_committed_value(db_chat, "participants", [creator])
+        return db_chat
+
+    @staticmethod
+    async def update_participants(
+        db: AsyncSession,
+        chat_id: int,
+        add: Iterable[int] = (),
+        remove: Iterable[int] = (),
+    ) -> Tuple[List[int], List[int]]:
+        """
+        Add and remove participants with one INSERT and one DELETE,
+        without committing. Unknown users and current members are skipped
+        on add, non-members and the owner on remove. Returns the ids
+        actually (added, removed).
+        """
+        added: List[int] = []
+        removed: List[int] = []
+        if remove:
+            result = await db.execute(ChatService.remove_participants_statement(chat_id, remove))
+            removed = result.scalars().all()
+        if add:
+            result = await db.execute(ChatService.add_participants_statement(
+                db.get_bind().dialect.name, chat_id, add
+            ))
+            added = result.scalars().all()
+        for user_id in added + removed:
+            MembershipService.invalidate(chat_id, user_id, db)
+        return added, removed
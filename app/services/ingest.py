@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from typing import List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.schemas.message import Message, MessageCreate
+from app.schemas.user import User
+from app.services.message import AsyncMessageService
+
+logger = logging.getLogger(__name__)
+
+Entry = Tuple[MessageCreate, User, asyncio.Future]
+
+
+def _fail(entries: List[Entry], error: Exception) -> None:
+    for *_, future in entries:
+        if not future.done():
+            future.set_exception(error)
+
+
+class MessageIngestBuffer:
+    """
+    Write-behind buffer for inbound messages.
+
+    Messages are collected for up to MESSAGE_BATCH_MAX_DELAY_MS or until
+    MESSAGE_BATCH_MAX_ROWS are pending, then inserted with one executemany
+    in a single transaction. If the batch fails, its rows are retried one
+    by one, so only the sender of a bad row gets the error.
+
+    Durability contract: submit() returns only after the batch containing
+    the message has been committed, so an acknowledged message is as durable
+    as with per-row commits. Messages still in the buffer when the process
+    dies were never acknowledged to their senders. close() flushes whatever
+    is pending and must be awaited on shutdown.
+    """
+
+    def __init__(
+        self,
+        max_rows: Optional[int] = None,
+        max_delay_ms: Optional[int] = None,
+        session_factory=AsyncSessionLocal,
+    ):
+        self.max_rows = max_rows or settings.MESSAGE_BATCH_MAX_ROWS
+        delay_ms = settings.MESSAGE_BATCH_MAX_DELAY_MS if max_delay_ms is None else max_delay_ms
+        self.max_delay = delay_ms / 1000
+        self._session_factory = session_factory
+        self._pending: List[Entry] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+
+    async def submit(self, message_in: MessageCreate, sender: User) -> Message:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((message_in, sender, future))
+        if len(self._pending) >= self.max_rows:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._start_flush)
+        return await future
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Entry]) -> None:
+        # Пачки пишутся по очереди, чтобы id шли в порядке поступления
+        async with self._lock:
+            try:
+                ids = await self._write(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    logger.error(f"Failed to write message: {str(e)}")
+                    _fail(batch, e)
+                    return
+                # Пачка откатилась целиком; по одному ошибку получит только
+                # отправитель плохой строки
+                logger.warning(
+                    f"Failed to write message batch of {len(batch)}, retrying one by one: {str(e)}"
+                )
+                ids = [await self._write_single(entry) for entry in batch]
+        await self._resolve(batch, ids)
+
+    async def _write_single(self, entry: Entry) -> Optional[int]:
+        try:
+            [message_id] = await self._write([entry])
+        except Exception as e:
+            logger.error(f"Failed to write message: {str(e)}")
+            _fail([entry], e)
+            return None
+        return message_id
+
+    async def _write(self, batch: List[Entry]) -> List[int]:
+        async with self._session_factory() as db:
+            rows = await AsyncMessageService.create_many(
+                db, [(message_in, sender.id) for message_in, sender, _ in batch]
+            )
+        return [message_id for message_id, _, _ in rows]
+
+    async def _resolve(self, batch: List[Entry], ids: List[Optional[int]]) -> None:
+        written = [
+            (entry, message_id) for entry, message_id in zip(batch, ids) if message_id is not None
+        ]
+        if not written:
+            return
+        try:
+            # С отправителем и цитатой - тот же ответ, что без буфера
+            async with self._session_factory() as db:
+                messages = await AsyncMessageService.get_many(
+                    db, [message_id for _, message_id in written]
+                )
+                results = [Message.model_validate(message) for message in messages]
+        except Exception as e:
+            # Уже записано: повторять нельзя, ошибка уходит отправителям
+            logger.error(f"Failed to load {len(written)} written messages: {str(e)}")
+            _fail([entry for entry, _ in written], e)
+            return
+        for ((_, _, future), _), message in zip(written, results):
+            if not future.done():
+                future.set_result(message)
+
+    async def flush(self) -> None:
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def close(self) -> None:
+        await self.flush()
+
+
+message_buffer = MessageIngestBuffer()
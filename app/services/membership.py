@@ -0,0 +1,69 @@
+from typing import Dict, Optional, Tuple, Union
+
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.cache import membership_cache
+from app.models.chat import ChatRole, user_chat
+
+# Ключ памятки в Session.info: сессия живёт ровно один запрос (см. get_db)
+_MEMO_KEY = "membership"
+
+
+def _memo(db) -> Dict[Tuple[int, int], bool]:
+    return db.info.setdefault(_MEMO_KEY, {})
+
+
+class MembershipService:
+    """
+    "Is this user in this chat" without loading the participant list.
+
+    The answer comes from, in order: a memo on the request's session, the
+    process-wide membership_cache (MEMBERSHIP_CACHE_TTL_SECONDS, off by
+    default) and an indexed EXISTS on user_chat(chat_id, user_id). Both
+    the memo and the cache are dropped by invalidate() whenever
+    membership changes in this process; other workers see the change
+    once their cached entry expires.
+    """
+
+    @staticmethod
+    def exists_clause(chat_id: int, user_id: int):
+        # Оба столбца ключа user_chat заданы равенством - поиск по индексу
+        return exists().where(
+            user_chat.c.chat_id == chat_id,
+            user_chat.c.user_id == user_id,
+        )
+
+    @staticmethod
+    async def is_member(db: AsyncSession, chat_id: int, user_id: int) -> bool:
+        key = (chat_id, user_id)
+        memo = _memo(db)
+        if key in memo:
+            return memo[key]
+        member = membership_cache.get(key)
+        if member is None:
+            result = await db.execute(select(MembershipService.exists_clause(chat_id, user_id)))
+            member = bool(result.scalar())
+            membership_cache.set(key, member)
+        memo[key] = member
+        return member
+
+    @staticmethod
+    async def role(db: AsyncSession, chat_id: int, user_id: int) -> Optional[ChatRole]:
+        """The user's role in the chat, None for non-members. Not cached."""
+        result = await db.execute(
+            select(user_chat.c.role).where(
+                user_chat.c.chat_id == chat_id,
+                user_chat.c.user_id == user_id,
+            )
+        )
+        return result.scalar()
+
+    @staticmethod
+    def invalidate(
+        chat_id: int, user_id: int, db: Optional[Union[Session, AsyncSession]] = None
+    ) -> None:
+        membership_cache.invalidate((chat_id, user_id))
+        if db is not None:
+            _memo(db).pop((chat_id, user_id), None)
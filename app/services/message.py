@@ -1,43 +1,330 @@
-from typing import Optional, List
-from sqlalchemy.orm import Session
+import base64
+import binascii
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Optional, List, Tuple
+from sqlalchemy import Select, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app.models.chat import Chat, user_chat
 from app.models.message import Message
 from app.schemas.message import MessageCreate, MessageUpdate
 
+# Сколько символов последнего сообщения хранится в сводке чата
+PREVIEW_LENGTH = 100
+
+# (id, chat_id, sender_id, content, created_at) только что вставленного сообщения
+NewMessageRow = Tuple[int, int, int, str, datetime]
+
+
+def encode_cursor(direction: str, message_id: int) -> str:
+    """Pack a keyset position into an opaque, URL-safe cursor."""
+    raw = f"{direction}:{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, _, message_id = base64.urlsafe_b64decode(padded).decode().partition(":")
+        if direction not in ("before", "after"):
+            raise ValueError(direction)
+        return direction, int(message_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
 class MessageService:
     @staticmethod
-    def get_by_id(db: Session, message_id: int) -> Optional[Message]:
-        return db.query(Message).filter(Message.id == message_id).first()
+    def loader_options() -> list:
+        """
+        Eager-load strategy matching the Message response schema.
+
+        The sender is joined into the main SELECT and the quoted message
+        (one level, see MessageReply) with its sender comes from a single
+        selectin query, so a page of N messages always takes two queries.
+        """
+        return [
+            joinedload(Message.sender),
+            selectinload(Message.reply_to).joinedload(Message.sender),
+        ]
 
     @staticmethod
-    def get_chat_messages(
-        db: Session, 
-        chat_id: int, 
-        skip: int = 0, 
+    def by_id_statement(message_id: int) -> Select:
+        return (
+            select(Message)
+            .options(*MessageService.loader_options())
+            .where(Message.id == message_id)
+        )
+
+    @staticmethod
+    def chat_messages_statement(
+        chat_id: int,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
         limit: int = 50
-    ) -> List[Message]:
+    ) -> Select:
+        """
+        Keyset-страница истории чата.
+
+        Страница выбирается по индексу (chat_id, id), поэтому её стоимость
+        не зависит от глубины прокрутки: before_id листает к старым
+        сообщениям, after_id - к новым. При after_id строки идут по
+        возрастанию id и должны быть перевёрнуты вызывающим.
+        """
+        statement = (
+            select(Message)
+            .options(*MessageService.loader_options())
+            .where(Message.chat_id == chat_id)
+        )
+        if after_id is not None:
+            return (
+                statement.where(Message.id > after_id)
+                .order_by(Message.id.asc())
+                .limit(limit)
+            )
+        if before_id is not None:
+            statement = statement.where(Message.id < before_id)
+        return statement.order_by(Message.id.desc()).limit(limit)
+
+    @staticmethod
+    def since_seq_statement(chat_id: int, after_seq: int, limit: int) -> Select:
+        """Messages a reconnecting client missed, oldest first, by (chat_id, seq)."""
         return (
-            db.query(Message)
-            .filter(Message.chat_id == chat_id)
-            .order_by(Message.created_at.desc())
-            .offset(skip)
+            select(Message)
+            .options(*MessageService.loader_options())
+            .where(Message.chat_id == chat_id, Message.seq > after_seq)
+            .order_by(Message.seq.asc())
             .limit(limit)
-            .all()
         )
 
     @staticmethod
-    def create(db: Session, message_in: MessageCreate, sender_id: int) -> Message:
-        db_message = Message(
+    def allocate_seq_statement(chat_id: int, count: int = 1):
+        """
+        Reserve `count` sequence numbers in a chat; returns the last one.
+
+        The UPDATE takes the write lock on the chat row, so concurrent
+        writers get disjoint ranges and seq grows in commit order.
+        """
+        return (
+            update(Chat)
+            .where(Chat.id == chat_id)
+            .values(last_seq=Chat.last_seq + count)
+            .returning(Chat.last_seq)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def assign_seqs(
+        messages_in: List[Tuple[MessageCreate, int]], last_seqs: Dict[int, Optional[int]]
+    ) -> List[Optional[int]]:
+        """Spread the reserved ranges over messages_in, keeping input order per chat."""
+        counts = Counter(message_in.chat_id for message_in, _ in messages_in)
+        next_seq = {
+            chat_id: last - counts[chat_id] + 1
+            for chat_id, last in last_seqs.items() if last is not None
+        }
+        seqs = []
+        for message_in, _ in messages_in:
+            seq = next_seq.get(message_in.chat_id)
+            if seq is not None:
+                next_seq[message_in.chat_id] = seq + 1
+            seqs.append(seq)
+        return seqs
+
+    @staticmethod
+    def new_message(message_in: MessageCreate, sender_id: int) -> Message:
+        return Message(
             content=message_in.content,
             message_type=message_in.message_type,
             chat_id=message_in.chat_id,
             sender_id=sender_id,
             reply_to_id=message_in.reply_to_id
         )
+
+    @staticmethod
+    def create_many_statement(
+        messages_in: List[Tuple[MessageCreate, int]], seqs: List[Optional[int]]
+    ):
+        # sort_by_parameter_order заставил бы SQLite вставлять по строке;
+        # вместо этого вызывающие сортируют RETURNING по id: внутри одной
+        # пишущей транзакции id назначаются в порядке VALUES
+        return (
+            insert(Message).returning(Message.id, Message.created_at, Message.seq),
+            [
+                {
+                    "content": message_in.content,
+                    "message_type": message_in.message_type,
+                    "chat_id": message_in.chat_id,
+                    "sender_id": sender_id,
+                    "reply_to_id": message_in.reply_to_id,
+                    "seq": seq,
+                }
+                for (message_in, sender_id), seq in zip(messages_in, seqs)
+            ],
+        )
+
+    @staticmethod
+    def summary_statements(rows: Iterable[NewMessageRow]) -> list:
+        """
+        Keep chat summaries in step with newly inserted messages.
+
+        For every chat the newest message becomes its last message, and
+        each sender has read the chat up to their own newest message. Both
+        updates only move forward, so batches may arrive in any order.
+        """
+        newest_in_chat = {}
+        newest_by_sender = {}
+        for message_id, chat_id, sender_id, content, created_at in rows:
+            if message_id > newest_in_chat.get(chat_id, (0,))[0]:
+                newest_in_chat[chat_id] = (message_id, content, created_at)
+            key = (chat_id, sender_id)
+            newest_by_sender[key] = max(message_id, newest_by_sender.get(key, 0))
+
+        statements = [
+            update(Chat)
+            .where(
+                Chat.id == chat_id,
+                or_(Chat.last_message_id.is_(None), Chat.last_message_id < message_id),
+            )
+            .values(
+                last_message_id=message_id,
+                last_message_preview=content[:PREVIEW_LENGTH],
+                last_message_at=created_at,
+            )
+            .execution_options(synchronize_session=False)
+            for chat_id, (message_id, content, created_at) in newest_in_chat.items()
+        ]
+        statements.extend(
+            MessageService.mark_read_statement(chat_id, sender_id, message_id)
+            for (chat_id, sender_id), message_id in newest_by_sender.items()
+        )
+        return statements
+
+    @staticmethod
+    def mark_read_statement(chat_id: int, user_id: int, message_id):
+        return (
+            update(user_chat)
+            .where(
+                user_chat.c.chat_id == chat_id,
+                user_chat.c.user_id == user_id,
+                user_chat.c.last_read_message_id < message_id,
+            )
+            .values(last_read_message_id=message_id)
+        )
+
+    @staticmethod
+    def edited_summary_statement(db_message: Message):
+        return (
+            update(Chat)
+            .where(Chat.id == db_message.chat_id, Chat.last_message_id == db_message.id)
+            .values(last_message_preview=db_message.content[:PREVIEW_LENGTH])
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def deleted_summary_statement(chat_id: int, message_id: int):
+        """After deleting the chat's last message, fall back to the previous one."""
+        def latest(column):
+            # Каждый подзапрос - один шаг по индексу (chat_id, id) с конца
+            return (
+                select(column)
+                .where(Message.chat_id == chat_id)
+                .order_by(Message.id.desc())
+                .limit(1)
+                .scalar_subquery()
+            )
+
+        return (
+            update(Chat)
+            .where(Chat.id == chat_id, Chat.last_message_id == message_id)
+            .values(
+                last_message_id=latest(Message.id),
+                last_message_preview=latest(Message.content),
+                last_message_at=latest(Message.created_at),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def new_row(db_message: Message) -> NewMessageRow:
+        return (
+            db_message.id,
+            db_message.chat_id,
+            db_message.sender_id,
+            db_message.content,
+            db_message.created_at,
+        )
+
+    @staticmethod
+    def inserted_rows(
+        messages_in: List[Tuple[MessageCreate, int]], returned: List[Tuple[int, datetime, int]]
+    ) -> List[NewMessageRow]:
+        return [
+            (message_id, message_in.chat_id, sender_id, message_in.content, created_at)
+            for (message_in, sender_id), (message_id, created_at, _) in zip(messages_in, returned)
+        ]
+
+    @staticmethod
+    def get_by_id(db: Session, message_id: int) -> Optional[Message]:
+        return db.execute(MessageService.by_id_statement(message_id)).scalars().first()
+
+    @staticmethod
+    def get_chat_messages(
+        db: Session,
+        chat_id: int,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        limit: int = 50
+    ) -> List[Message]:
+        """Keyset page of chat history, newest first."""
+        messages = db.execute(
+            MessageService.chat_messages_statement(chat_id, before_id, after_id, limit)
+        ).scalars().all()
+        if after_id is not None:
+            messages.reverse()
+        return messages
+
+    @staticmethod
+    def create(db: Session, message_in: MessageCreate, sender_id: int) -> Message:
+        db_message = MessageService.new_message(message_in, sender_id)
+        db_message.seq = db.execute(
+            MessageService.allocate_seq_statement(message_in.chat_id)
+        ).scalar()
         db.add(db_message)
+        # created_at приходит через RETURNING вместе с id
+        db.flush()
+        for statement in MessageService.summary_statements([MessageService.new_row(db_message)]):
+            db.execute(statement)
         db.commit()
         db.refresh(db_message)
         return db_message
 
+    @staticmethod
+    def create_many(
+        db: Session, messages_in: List[Tuple[MessageCreate, int]]
+    ) -> List[Tuple[int, datetime, int]]:
+        """
+        Insert (message_in, sender_id) pairs in one transaction with a single
+        executemany and return (id, created_at, seq) in input order.
+        """
+        if not messages_in:
+            return []
+        counts = Counter(message_in.chat_id for message_in, _ in messages_in)
+        seqs = MessageService.assign_seqs(messages_in, {
+            chat_id: db.execute(MessageService.allocate_seq_statement(chat_id, count)).scalar()
+            for chat_id, count in counts.items()
+        })
+        result = db.execute(*MessageService.create_many_statement(messages_in, seqs))
+        rows = sorted((row.id, row.created_at, row.seq) for row in result)
+        for statement in MessageService.summary_statements(
+            MessageService.inserted_rows(messages_in, rows)
+        ):
+            db.execute(statement)
+        db.commit()
+        return rows
+
     @staticmethod
     def update(db: Session, db_message: Message, message_in: MessageUpdate) -> Message:
         update_data = message_in.dict(exclude_unset=True)
@@ -46,13 +333,17 @@ class MessageService:
         
         db_message.is_edited = True
         db.add(db_message)
+        db.execute(MessageService.edited_summary_statement(db_message))
         db.commit()
         db.refresh(db_message)
         return db_message
 
     @staticmethod
     def delete(db: Session, db_message: Message) -> None:
+        chat_id, message_id = db_message.chat_id, db_message.id
         db.delete(db_message)
+        db.flush()
+        db.execute(MessageService.deleted_summary_statement(chat_id, message_id))
         db.commit()
 
     @staticmethod
@@ -69,4 +360,98 @@ class MessageService:
             .offset(skip)
             .limit(limit)
             .all()
-        ) 
\ No newline at end of file
+        )
+
+
+class AsyncMessageService:
+    """MessageService for AsyncSession; returns fully loaded messages."""
+
+    @staticmethod
+    async def get_by_id(db: AsyncSession, message_id: int) -> Optional[Message]:
+        result = await db.execute(MessageService.by_id_statement(message_id))
+        return result.scalars().first()
+
+    @staticmethod
+    async def get_many(db: AsyncSession, message_ids: Iterable[int]) -> List[Message]:
+        """Messages by id in id order, loaded like get_by_id."""
+        result = await db.execute(
+            select(Message)
+            .options(*MessageService.loader_options())
+            .where(Message.id.in_(list(message_ids)))
+            .order_by(Message.id)
+        )
+        return result.scalars().all()
+
+    @staticmethod
+    async def get_chat_messages(
+        db: AsyncSession,
+        chat_id: int,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        limit: int = 50
+    ) -> List[Message]:
+        result = await db.execute(
+            MessageService.chat_messages_statement(chat_id, before_id, after_id, limit)
+        )
+        messages = result.scalars().all()
+        if after_id is not None:
+            messages.reverse()
+        return messages
+
+    @staticmethod
+    async def get_since_seq(
+        db: AsyncSession, chat_id: int, after_seq: int, limit: int
+    ) -> List[Message]:
+        result = await db.execute(MessageService.since_seq_statement(chat_id, after_seq, limit))
+        return result.scalars().all()
+
+    @staticmethod
+    async def create(db: AsyncSession, message_in: MessageCreate, sender_id: int) -> Message:
+        db_message = MessageService.new_message(message_in, sender_id)
+        result = await db.execute(MessageService.allocate_seq_statement(message_in.chat_id))
+        db_message.seq = result.scalar()
+        db.add(db_message)
+        await db.flush()
+        for statement in MessageService.summary_statements([MessageService.new_row(db_message)]):
+            await db.execute(statement)
+        await db.commit()
+        # Перечитываем с отправителем и цитатой для сериализации
+        return await AsyncMessageService.get_by_id(db, db_message.id)
+
+    @staticmethod
+    async def create_many(
+        db: AsyncSession, messages_in: List[Tuple[MessageCreate, int]]
+    ) -> List[Tuple[int, datetime, int]]:
+        if not messages_in:
+            return []
+        last_seqs = {}
+        for chat_id, count in Counter(message_in.chat_id for message_in, _ in messages_in).items():
+            result = await db.execute(MessageService.allocate_seq_statement(chat_id, count))
+            last_seqs[chat_id] = result.scalar()
+        seqs = MessageService.assign_seqs(messages_in, last_seqs)
+        result = await db.execute(*MessageService.create_many_statement(messages_in, seqs))
+        rows = sorted((row.id, row.created_at, row.seq) for row in result)
+        for statement in MessageService.summary_statements(
+            MessageService.inserted_rows(messages_in, rows)
+        ):
+            await db.execute(statement)
+        await db.commit()
+        return rows
+
+    @staticmethod
+    async def update(db: AsyncSession, db_message: Message, message_in: MessageUpdate) -> Message:
+        for field, value in message_in.model_dump(exclude_unset=True).items():
+            setattr(db_message, field, value)
+        db_message.is_edited = True
+        await db.execute(MessageService.edited_summary_statement(db_message))
+        await db.commit()
+        await db.refresh(db_message, ["content", "is_edited", "updated_at"])
+        return db_message
+
+    @staticmethod
+    async def delete(db: AsyncSession, db_message: Message) -> None:
+        chat_id, message_id = db_message.chat_id, db_message.id
+        await db.delete(db_message)
+        await db.flush()
+        await db.execute(MessageService.deleted_summary_statement(chat_id, message_id))
+        await db.commit()
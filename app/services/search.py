@@ -0,0 +1,142 @@
+import base64
+import binascii
+import html
+import re
+from typing import List, Optional, Tuple
+from sqlalchemy import and_, column, func, literal_column, or_, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.chat import user_chat
+from app.models.message import Message
+from app.services.message import MessageService
+
+messages_fts = table("messages_fts", column("rowid"), column("rank"))
+
+# Границы подсветки во время запроса; после экранирования HTML они
+# заменяются на <mark>, так что в сниппет не попадает разметка из сообщений
+_HIGHLIGHT_START, _HIGHLIGHT_END = "\x02", "\x03"
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+class MessageSearchService:
+    """Full-text search over messages via the SQLite FTS5 index (messages_fts)."""
+
+    @staticmethod
+    def match_query(text: str) -> Optional[str]:
+        """
+        Turn user input into an FTS5 query: every word must match, the last
+        one as a prefix (search as you type). Operators in the input are not
+        interpreted, so any text is a valid query.
+        """
+        terms = _TERM.findall(text)
+        if not terms:
+            return None
+        return " ".join(f'"{term}"' for term in terms) + "*"
+
+    @staticmethod
+    def encode_cursor(rank: float, message_id: int) -> str:
+        raw = f"{rank!r}:{message_id}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[float, int]:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            rank, _, message_id = base64.urlsafe_b64decode(padded).decode().partition(":")
+            return float(rank), int(message_id)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValueError("Invalid cursor")
+
+    @staticmethod
+    def search_statement(
+        user_id: int,
+        match: str,
+        chat_id: Optional[int] = None,
+        after: Optional[Tuple[float, int]] = None,
+        limit: int = 20,
+        order: str = "rank",
+    ):
+        """
+        Only chats the user participates in are searched. With order="rank"
+        best matches come first (bm25 via the hidden rank column, ties by
+        id) and pages continue after the previous page's last (rank, id).
+        bm25 depends on the whole index, so ranks move as messages are
+        written and such pages may overlap or miss hits; order="recent" is a
+        keyset over rowid and pages exactly. bm25 also has to score every
+        match, so for very common words
+        order="recent" is much cheaper: FTS5 walks the index newest first
+        and stops after `limit` hits.
+        """
+        rank = messages_fts.c.rank
+        statement = (
+            select(
+                Message.id,
+                rank,
+                func.snippet(
+                    literal_column("messages_fts"), 0,
+                    _HIGHLIGHT_START, _HIGHLIGHT_END, "…", 16,
+                ).label("snippet"),
+            )
+            .select_from(messages_fts.join(Message, Message.id == messages_fts.c.rowid))
+            .where(
+                literal_column("messages_fts").op("MATCH")(match),
+                Message.chat_id.in_(
+                    select(user_chat.c.chat_id).where(user_chat.c.user_id == user_id)
+                ),
+            )
+            .limit(limit)
+        )
+        if chat_id is not None:
+            statement = statement.where(Message.chat_id == chat_id)
+        if order == "recent":
+            statement = statement.order_by(messages_fts.c.rowid.desc())
+            if after is not None:
+                statement = statement.where(messages_fts.c.rowid < after[1])
+            return statement
+        statement = statement.order_by(rank, Message.id)
+        if after is not None:
+            after_rank, after_id = after
+            statement = statement.where(
+                or_(rank > after_rank, and_(rank == after_rank, Message.id > after_id))
+            )
+        return statement
+
+    @staticmethod
+    def highlight(snippet: str) -> str:
+        return (
+            html.escape(snippet)
+            .replace(_HIGHLIGHT_START, "<mark>")
+            .replace(_HIGHLIGHT_END, "</mark>")
+        )
+
+    @staticmethod
+    async def search(
+        db: AsyncSession,
+        user_id: int,
+        match: str,
+        chat_id: Optional[int] = None,
+        after: Optional[Tuple[float, int]] = None,
+        limit: int = 20,
+        order: str = "rank",
+    ) -> Tuple[List[Tuple[Message, str]], Optional[Tuple[float, int]]]:
+        """
+        Return (message, highlighted snippet) pairs in rank order and the
+        position to continue from, or None on the last page.
+        """
+        hits = (await db.execute(
+            MessageSearchService.search_statement(user_id, match, chat_id, after, limit, order)
+        )).all()
+        if not hits:
+            return [], None
+        result = await db.execute(
+            select(Message)
+            .options(*MessageService.loader_options())
+            .where(Message.id.in_([hit.id for hit in hits]))
+        )
+        messages = {message.id: message for message in result.scalars()}
+        found = [
+            (messages[hit.id], MessageSearchService.highlight(hit.snippet))
+            for hit in hits
+            if hit.id in messages
+        ]
+        last = hits[-1]
+        return found, (last.rank, last.id) if len(hits) == limit else None
@@ -1,10 +1,12 @@
 from typing import Optional, List
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import datetime, timedelta
-from jose import jwt
 
-from app.core.security import get_password_hash, verify_password
+from app.core.cache import principal_cache
+from app.core.security import create_access_token, get_password_hash, verify_password, password_hasher
 from app.core.config import settings
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
@@ -38,6 +40,7 @@ class UserService:
 
     @staticmethod
     def update(db: Session, db_user: User, user_in: UserUpdate) -> User:
+        principal_cache.invalidate(db_user.username)
         update_data = user_in.dict(exclude_unset=True)
         if "password" in update_data:
             update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
@@ -48,6 +51,7 @@ class UserService:
         db.add(db_user)
         db.commit()
         db.refresh(db_user)
+        principal_cache.invalidate(db_user.username)
         return db_user
 
     @staticmethod
@@ -61,11 +65,47 @@ class UserService:
 
     @staticmethod
     def create_access_token(user_id: int, expires_delta: Optional[timedelta] = None) -> str:
-        if expires_delta:
-            expire = datetime.utcnow() + expires_delta
-        else:
-            expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-        
-        to_encode = {"exp": expire, "sub": str(user_id)}
-        encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-        return encoded_jwt 
\ No newline at end of file
+        return create_access_token(data={"sub": str(user_id)}, expires_delta=expires_delta)
+
+class AsyncUserService:
+    """UserService for AsyncSession."""
+
+    @staticmethod
+    async def get_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
+        return await db.get(User, user_id)
+
+    @staticmethod
+    async def get_by_email(db: AsyncSession, email: str) -> Optional[User]:
+        result = await db.execute(select(User).where(User.email == email))
+        return result.scalars().first()
+
+    @staticmethod
+    async def get_by_username(db: AsyncSession, username: str) -> Optional[User]:
+        result = await db.execute(select(User).where(User.username == username))
+        return result.scalars().first()
+
+    @staticmethod
+    async def get_by_login(db: AsyncSession, login: str) -> Optional[User]:
+        """Find a user by username or, failing that, by email."""
+        result = await db.execute(
+            select(User).where(or_(User.username == login, User.email == login))
+        )
+        users = result.scalars().all()
+        return next((u for u in users if u.username == login), users[0] if users else None)
+
+    @staticmethod
+    async def get_all(db: AsyncSession) -> List[User]:
+        result = await db.execute(select(User))
+        return result.scalars().all()
+
+    @staticmethod
+    async def update(db: AsyncSession, db_user: User, user_in: UserUpdate) -> User:
+        principal_cache.invalidate(db_user.username)
+        update_data = user_in.model_dump(exclude_unset=True)
+        if "password" in update_data:
+            update_data["hashed_password"] = await password_hasher.hash(update_data.pop("password"))
+        for field, value in update_data.items():
+            setattr(db_user, field, value)
+        await db.commit()
+        principal_cache.invalidate(db_user.username)
+        return db_user
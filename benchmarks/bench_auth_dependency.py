@@ -0,0 +1,63 @@
+"""
+Cost of resolving the caller in deps.get_current_user.
+
+    python -m benchmarks.bench_auth_dependency --requests 2000
+
+Each sample opens a request-scoped AsyncSession and resolves a bearer
+token, with the principal cache disabled (one SELECT per request) and
+enabled (the user is attached to the session without touching SQLite).
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.common import use_temp_database, report
+
+use_temp_database()
+
+from app.api import deps  # noqa: E402
+from app.core.cache import principal_cache  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+from app.db.database import AsyncSessionLocal, Base, SessionLocal, engine  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+
+async def sample(token: str, requests: int) -> list:
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            await deps.get_current_user(token=token, db=db)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def main_async(args) -> None:
+    token = create_access_token(data={"sub": "bench"})
+    ttl = principal_cache.ttl
+
+    principal_cache.ttl = 0
+    report("get_current_user, no cache", await sample(token, args.requests))
+
+    principal_cache.ttl = ttl
+    principal_cache.clear()
+    report("get_current_user, principal cache", await sample(token, args.requests))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    # Лог на каждый декодированный токен искажает замеры
+    logging.getLogger("app.api.deps").setLevel(logging.WARNING)
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add(User(email="bench@example.com", username="bench", hashed_password="x"))
+        db.commit()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
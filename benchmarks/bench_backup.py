@@ -0,0 +1,196 @@
+"""
+Writer stall while the database is being backed up.
+
+    python -m benchmarks.bench_backup --size-mb 2048
+
+Fills a database to --size-mb with messages, then keeps one writer
+committing a message every --interval-ms on its own connection and
+records each commit's latency: first idle, then during each backup:
+
+* paged, pinned   - BackupService.snapshot: --pages per step, one read
+                    transaction held across the steps (WAL only)
+* one step        - sqlite3 backup of the whole file in a single step
+* paged, unpinned - --pages per step without holding a snapshot, as in
+                    the SQLite docs example: every commit of the writer
+                    restarts the copy, given up after --give-up-seconds
+
+Run with --journal-mode DELETE to see the same with a rollback journal,
+where a reader does block writers. Commit latency max / p99 is the
+writer stall; the size of the WAL at the end shows what the pinned
+snapshot costs.
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import threading
+import time
+
+from benchmarks.common import percentile, use_temp_database
+
+DATABASE = use_temp_database()
+
+from app.db.database import Base, engine  # noqa: E402
+from app.models import chat, message, user  # noqa: E402,F401 - таблицы для create_all
+from app.services.backup import BackupService  # noqa: E402
+
+ROWS_PER_BATCH = 100_000
+
+
+def seed(size_mb: int, journal_mode: str) -> None:
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    connection = sqlite3.connect(DATABASE, isolation_level=None)
+    connection.execute(f"PRAGMA journal_mode={journal_mode}")
+    # Без FTS-триггера заполнение в разы быстрее
+    connection.execute("DROP TRIGGER messages_fts_insert")
+    connection.execute("INSERT INTO users (email, username, hashed_password, is_active, role) "
+                       "VALUES ('a@example.com', 'a', 'x', 1, 'USER')")
+    connection.execute("INSERT INTO chats (name, creator_id) VALUES ('bench', 1)")
+    seq = 0
+    while os.path.getsize(DATABASE) < size_mb * 1024 * 1024:
+        connection.execute(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?) "
+            "INSERT INTO messages (content, message_type, chat_id, sender_id, is_edited, seq) "
+            "SELECT hex(randomblob(200)), 'TEXT', 1, 1, 0, ? + i FROM n",
+            (ROWS_PER_BATCH, seq),
+        )
+        seq += ROWS_PER_BATCH
+    if journal_mode.upper() == "WAL":
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    connection.close()
+
+
+class Writer(threading.Thread):
+    """Commit one message every `interval` seconds, recording latency in ms."""
+
+    def __init__(self, interval: float):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        connection = sqlite3.connect(DATABASE, isolation_level=None, timeout=600)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        seq = connection.execute("SELECT max(seq) FROM messages").fetchone()[0]
+        while not self.stopped.is_set():
+            seq += 1
+            start = time.perf_counter()
+            connection.execute(
+                "INSERT INTO messages (content, message_type, chat_id, sender_id, is_edited, seq) "
+                "VALUES ('live', 'TEXT', 1, 1, 0, ?)", (seq,)
+            )
+            self.samples.append((time.perf_counter() - start) * 1000)
+            time.sleep(self.interval)
+        connection.close()
+
+    def take(self):
+        samples, self.samples = self.samples, []
+        return samples
+
+
+class GaveUp(Exception):
+    pass
+
+
+def one_step(target: str, pages: int, give_up: float) -> int:
+    source = sqlite3.connect(DATABASE, isolation_level=None)
+    destination = sqlite3.connect(target)
+    try:
+        source.backup(destination)
+    finally:
+        destination.close()
+        source.close()
+    return 0
+
+
+def paged_unpinned(target: str, pages: int, give_up: float) -> int:
+    deadline = time.monotonic() + give_up
+    restarts = 0
+    last = [None]
+
+    def progress(status, remaining, total):
+        nonlocal restarts
+        if last[0] is not None and remaining > last[0]:
+            restarts += 1
+        last[0] = remaining
+        if time.monotonic() > deadline:
+            raise GaveUp(restarts)
+
+    source = sqlite3.connect(DATABASE, isolation_level=None)
+    destination = sqlite3.connect(target)
+    try:
+        source.backup(destination, pages=pages, progress=progress)
+    finally:
+        destination.close()
+        source.close()
+    return restarts
+
+
+def paged_pinned(target: str, pages: int, give_up: float) -> int:
+    BackupService.snapshot(DATABASE, target, pages=pages, sleep_ms=0)
+    return 0
+
+
+def wal_mb() -> float:
+    path = DATABASE + "-wal"
+    return os.path.getsize(path) / 1024 / 1024 if os.path.exists(path) else 0.0
+
+
+def line(label: str, samples, extra: str = "") -> None:
+    print(
+        f"  {label:<18} commits {len(samples):6}   median {statistics.median(samples):7.2f} ms"
+        f"   p99 {percentile(samples, 99):8.2f} ms   max {max(samples):9.2f} ms  {extra}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--pages", type=int, default=1024)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    parser.add_argument("--give-up-seconds", type=float, default=60)
+    parser.add_argument("--journal-mode", default="WAL")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    seed(args.size_mb, args.journal_mode)
+    size = os.path.getsize(DATABASE) / 1024 / 1024
+    print(f"database {size:.0f} MiB, journal {args.journal_mode}, "
+          f"seeded in {time.perf_counter() - start:.1f} s")
+
+    writer = Writer(args.interval_ms / 1000)
+    writer.start()
+    time.sleep(2)
+    line("idle", writer.take())
+
+    modes = [("paged, pinned", paged_pinned), ("one step", one_step),
+             ("paged, unpinned", paged_unpinned)]
+    if args.journal_mode.upper() != "WAL":
+        # Без WAL снимок не закрепить - удерживаемое чтение остановило бы запись
+        modes = modes[1:]
+    for label, backup in modes:
+        target = DATABASE + ".backup"
+        writer.take()
+        start = time.perf_counter()
+        try:
+            restarts = backup(target, args.pages, args.give_up_seconds)
+            outcome = f"done in {time.perf_counter() - start:6.1f} s"
+        except GaveUp as e:
+            restarts = e.args[0]
+            outcome = f"gave up after {time.perf_counter() - start:6.1f} s"
+        if restarts:
+            outcome += f", {restarts} restarts"
+        line(label, writer.take(), f"{outcome}, WAL {wal_mb():.0f} MiB")
+        os.remove(target)
+    writer.stopped.set()
+    writer.join()
+    # База на гигабайты - во временном каталоге её не оставляем
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(DATABASE + suffix):
+            os.remove(DATABASE + suffix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Broadcast fan-out to many sockets with a few deliberately slow consumers.
+
+    python -m benchmarks.bench_broadcast --sockets 5000 --slow 5
+
+Compares the old sequential loop (send_json per socket, awaited in turn)
+with ConnectionManager's per-connection queues and writer tasks. Reported
+time is until every fast client has received every message.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.core.websocket import ConnectionManager
+
+
+class BenchWebSocket:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.received = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data):
+        await asyncio.sleep(self.delay)
+        self.received += 1
+
+    async def send_json(self, data):
+        await self.send_text(json.dumps(data))
+
+    async def close(self, code=1000):
+        pass
+
+
+async def sequential(sockets, messages):
+    # Прежняя реализация broadcast_to_chat
+    for i in range(messages):
+        payload = {"id": i, "content": "x" * 200}
+        for websocket in sockets:
+            await websocket.send_json(payload)
+
+
+async def queued(sockets, fast, messages, policy):
+    manager = ConnectionManager(queue_size=64, slow_consumer_policy=policy)
+    for websocket in sockets:
+        await manager.connect(websocket, 1)
+    for i in range(messages):
+        await manager.broadcast_to_chat(1, {"id": i, "content": "x" * 200})
+        await asyncio.sleep(0)
+    while any(websocket.received < messages for websocket in fast):
+        await asyncio.sleep(0.001)
+    await manager.close()
+
+
+async def run(args):
+    def make():
+        fast = [BenchWebSocket() for _ in range(args.sockets - args.slow)]
+        slow = [BenchWebSocket(delay=args.slow_delay) for _ in range(args.slow)]
+        return fast, fast[: len(fast) // 2] + slow + fast[len(fast) // 2:]
+
+    fast, sockets = make()
+    start = time.perf_counter()
+    await sequential(sockets, args.messages)
+    print(f"sequential send_json        {time.perf_counter() - start:8.3f} s")
+
+    for policy in ("drop", "disconnect"):
+        fast, sockets = make()
+        start = time.perf_counter()
+        await queued(sockets, fast, args.messages, policy)
+        print(f"queued writers ({policy:<10}) {time.perf_counter() - start:8.3f} s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, default=5000)
+    parser.add_argument("--slow", type=int, default=5)
+    parser.add_argument("--slow-delay", type=float, default=0.05)
+    parser.add_argument("--messages", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
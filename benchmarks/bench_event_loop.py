@@ -0,0 +1,133 @@
+"""
+Event-loop responsiveness under concurrent HTTP + WebSocket load.
+
+    python -m benchmarks.bench_event_loop --clients 32 --seconds 5
+
+Runs uvicorn in-process with a probe coroutine that measures how late the
+loop wakes it up. HTTP clients hammer either GET /api/v1/chats/ (async
+session) or a benchmark-only route written the old way (sync Session used
+inside an ``async def``), while a WebSocket client measures send->echo
+round trips in the same chat.
+"""
+import argparse
+import asyncio
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from benchmarks.common import use_temp_database, percentile, ws_rtt
+
+use_temp_database()
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from app.core.security import create_access_token  # noqa: E402
+from app.db.database import Base, SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.chat import Chat  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+
+async def blocking_chats():
+    # Так были написаны обработчики до перехода на AsyncSession
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == "bench").first()
+        return [{"id": chat.id, "participants": len(chat.participants)} for chat in user.chats]
+    finally:
+        db.close()
+
+
+app.add_api_route("/bench/blocking-chats", blocking_chats)
+
+
+def seed(chats: int) -> int:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        user = User(email="bench@example.com", username="bench", hashed_password="x")
+        db.add(user)
+        for i in range(chats):
+            chat = Chat(name=f"chat {i}", creator=user)
+            chat.participants.append(user)
+            db.add(chat)
+        db.commit()
+        return db.query(Chat.id).first()[0]
+
+
+def http_load(url: str, token: str, clients: int, seconds: float) -> int:
+    deadline = time.monotonic() + seconds
+
+    def worker():
+        done = 0
+        with httpx.Client(headers={"Authorization": f"Bearer {token}"}) as client:
+            while time.monotonic() < deadline:
+                client.get(url)
+                done += 1
+        return done
+
+    with ThreadPoolExecutor(clients) as pool:
+        return sum(f.result() for f in [pool.submit(worker) for _ in range(clients)])
+
+
+async def measure(base: str, route: str, token: str, chat_id: int, args) -> None:
+    lag = []
+    stop = asyncio.Event()
+
+    async def probe():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag.append((time.perf_counter() - start - 0.005) * 1000)
+
+    probe_task = asyncio.create_task(probe())
+    ws_url = base.replace("http", "ws") + f"/api/v1/messages/ws/{chat_id}?token={token}"
+    # Нагрузка из отдельных процессов, чтобы клиенты не делили GIL с сервером
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(2) as pool:
+        http = loop.run_in_executor(
+            pool, http_load, base + route, token, args.clients, args.seconds
+        )
+        ws = loop.run_in_executor(pool, ws_rtt, ws_url, args.seconds)
+        requests, rtt = await asyncio.gather(http, ws)
+    stop.set()
+    await probe_task
+    print(
+        f"{route:<24} {requests / args.seconds:7.0f} req/s"
+        f"   loop lag p99 {percentile(lag, 99):7.1f} ms"
+        f"   ws rtt p99 {percentile(rtt, 99):7.1f} ms ({len(rtt)} round trips)"
+    )
+
+
+async def main_async(args) -> None:
+    chat_id = seed(args.chats)
+    token = create_access_token(data={"sub": "bench"})
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    base = f"http://127.0.0.1:{port}"
+    for route in args.routes:
+        await measure(base, route, token, chat_id, args)
+
+    server.should_exit = True
+    await serving
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument(
+        "--routes", nargs="+", default=["/bench/blocking-chats", "/api/v1/chats/"]
+    )
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Per-row commits vs the write-behind ingestion buffer.
+
+    python -m benchmarks.bench_ingest --producers 200 --messages 5000
+
+Each producer is a coroutine standing in for a WebSocket connection that
+sends messages one after another and waits for each to be stored.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import use_temp_database
+
+use_temp_database()
+
+from app.db.database import AsyncSessionLocal, Base, SessionLocal, engine  # noqa: E402
+from app.models.chat import Chat  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.schemas.message import MessageCreate  # noqa: E402
+from app.schemas.user import User as UserSchema  # noqa: E402
+from app.services.ingest import MessageIngestBuffer  # noqa: E402
+from app.services.message import AsyncMessageService  # noqa: E402
+
+
+def seed():
+    with SessionLocal() as db:
+        user = User(email="bench@example.com", username="bench", hashed_password="x")
+        chat = Chat(name="bench", creator=user)
+        db.add_all([user, chat])
+        db.commit()
+        return chat.id, UserSchema.model_validate(user)
+
+
+async def create_one(message_in, sender_id):
+    async with AsyncSessionLocal() as db:
+        return (await AsyncMessageService.create(db=db, message_in=message_in, sender_id=sender_id)).id
+
+
+async def run(store, producers: int, total: int) -> float:
+    per_producer = total // producers
+
+    async def producer(n):
+        for i in range(per_producer):
+            await store(f"producer {n} message {i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(producer(n) for n in range(producers)))
+    return producers * per_producer / (time.perf_counter() - start)
+
+
+async def main_async(args):
+    Base.metadata.create_all(bind=engine)
+    chat_id, sender = seed()
+
+    async def per_row(content):
+        await create_one(MessageCreate(content=content, chat_id=chat_id), sender.id)
+
+    buffer = MessageIngestBuffer(max_rows=args.batch, max_delay_ms=args.delay_ms)
+
+    async def batched(content):
+        await buffer.submit(MessageCreate(content=content, chat_id=chat_id), sender)
+
+    print(f"per-row commit   {await run(per_row, args.producers, args.messages):10.0f} msg/s")
+    print(f"write-behind     {await run(batched, args.producers, args.messages):10.0f} msg/s")
+    await buffer.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--producers", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--delay-ms", type=int, default=5)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
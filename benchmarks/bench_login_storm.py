@@ -0,0 +1,131 @@
+"""
+WebSocket latency while many clients log in at once.
+
+    python -m benchmarks.bench_login_storm --clients 16 --seconds 5
+
+Runs uvicorn in-process. HTTP clients post to either a benchmark-only
+login route that checks bcrypt inline (how /auth/login used to work) or
+the real /api/v1/auth/login, which verifies in the password hashing pool.
+A WebSocket client measures send->echo round trips meanwhile. 503s from
+the real route are counted separately: that is the pool pushing back.
+"""
+import argparse
+import asyncio
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from benchmarks.common import use_temp_database, percentile, ws_rtt
+
+use_temp_database()
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import Depends, HTTPException  # noqa: E402
+from fastapi.security import OAuth2PasswordRequestForm  # noqa: E402
+
+from app.core.security import create_access_token, get_password_hash, verify_password  # noqa: E402
+from app.db.database import Base, SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.chat import Chat  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+PASSWORD = "bench-password"
+
+
+async def blocking_login(form_data: OAuth2PasswordRequestForm = Depends()):
+    # bcrypt прямо в event loop, как до выноса в пул
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == form_data.username).first()
+        if not user or not verify_password(form_data.password, user.hashed_password):
+            raise HTTPException(status_code=401)
+        return {"access_token": create_access_token(data={"sub": user.username})}
+    finally:
+        db.close()
+
+
+app.add_api_route("/bench/blocking-login", blocking_login, methods=["POST"])
+
+
+def seed() -> int:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        user = User(
+            email="bench@example.com",
+            username="bench",
+            hashed_password=get_password_hash(PASSWORD),
+        )
+        chat = Chat(name="bench", creator=user)
+        chat.participants.append(user)
+        db.add(chat)
+        db.commit()
+        return chat.id
+
+
+def login_load(url: str, clients: int, seconds: float) -> dict:
+    deadline = time.monotonic() + seconds
+
+    def worker():
+        counts = {}
+        with httpx.Client(timeout=30) as client:
+            while time.monotonic() < deadline:
+                response = client.post(url, data={"username": "bench", "password": PASSWORD})
+                counts[response.status_code] = counts.get(response.status_code, 0) + 1
+        return counts
+
+    total = {}
+    with ThreadPoolExecutor(clients) as pool:
+        for future in [pool.submit(worker) for _ in range(clients)]:
+            for status, count in future.result().items():
+                total[status] = total.get(status, 0) + count
+    return total
+
+
+async def measure(base: str, route: str, token: str, chat_id: int, args) -> None:
+    ws_url = base.replace("http", "ws") + f"/api/v1/messages/ws/{chat_id}?token={token}"
+    # Клиенты в отдельных процессах, чтобы не делить GIL с сервером
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(2) as pool:
+        logins = loop.run_in_executor(pool, login_load, base + route, args.clients, args.seconds)
+        ws = loop.run_in_executor(pool, ws_rtt, ws_url, args.seconds)
+        statuses, rtt = await asyncio.gather(logins, ws)
+    print(
+        f"{route:<22} {statuses.get(200, 0) / args.seconds:6.1f} logins/s"
+        f"   503 {statuses.get(503, 0):5d}"
+        f"   ws rtt p50 {percentile(rtt, 50):7.1f} ms"
+        f"   p99 {percentile(rtt, 99):7.1f} ms ({len(rtt)} round trips)"
+    )
+
+
+async def main_async(args) -> None:
+    chat_id = seed()
+    token = create_access_token(data={"sub": "bench"})
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    base = f"http://127.0.0.1:{port}"
+    for route in args.routes:
+        await measure(base, route, token, chat_id, args)
+
+    server.should_exit = True
+    await serving
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument(
+        "--routes", nargs="+", default=["/bench/blocking-login", "/api/v1/auth/login"]
+    )
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Chat membership check in a large group chat.
+
+    python -m benchmarks.bench_membership --members 10000
+
+Compares the old check - load chat.participants and scan it in Python -
+with MembershipService: an indexed EXISTS on user_chat, the per-session
+memo and the optional TTL cache. Also prints SQLite's plan for the
+EXISTS query.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.common import use_temp_database
+
+use_temp_database()
+
+from sqlalchemy import insert, select, text  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+from app.core.cache import membership_cache  # noqa: E402
+from app.db.database import AsyncSessionLocal, Base, SessionLocal, engine  # noqa: E402
+from app.models.chat import Chat, user_chat  # noqa: E402
+from app.models.message import Message  # noqa: E402,F401 - для mapper Chat.messages
+from app.models.user import User  # noqa: E402
+from app.services.membership import MembershipService  # noqa: E402
+
+
+def seed(members: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(insert(User), [
+            {"email": f"user{i}@example.com", "username": f"user{i}", "hashed_password": "x"}
+            for i in range(members + 1)
+        ])
+        db.execute(insert(Chat), [{"name": "everyone", "creator_id": 1}])
+        db.execute(insert(user_chat), [
+            {"user_id": user_id, "chat_id": 1} for user_id in range(1, members + 1)
+        ])
+        db.commit()
+
+
+async def median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def run(args) -> None:
+    member_id, outsider_id = args.members, args.members + 1
+
+    async def load_participants(user_id):
+        # Прежняя проверка: весь список участников и поиск в нём
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Chat).where(Chat.id == 1).options(selectinload(Chat.participants))
+            )
+            chat = result.scalars().first()
+            user = await db.get(User, user_id)
+            return user in chat.participants
+
+    async def exists(user_id):
+        membership_cache.clear()
+        async with AsyncSessionLocal() as db:
+            return await MembershipService.is_member(db, 1, user_id)
+
+    async def memo(user_id):
+        # Несколько проверок в одной сессии запроса - один EXISTS
+        membership_cache.clear()
+        async with AsyncSessionLocal() as db:
+            for _ in range(3):
+                member = await MembershipService.is_member(db, 1, user_id)
+            return member
+
+    async def cached(user_id):
+        async with AsyncSessionLocal() as db:
+            return await MembershipService.is_member(db, 1, user_id)
+
+    async with AsyncSessionLocal() as db:
+        plan = await db.execute(
+            text("EXPLAIN QUERY PLAN SELECT EXISTS (SELECT * FROM user_chat "
+                 "WHERE chat_id = 1 AND user_id = :user_id)"),
+            {"user_id": member_id},
+        )
+        print("EXISTS plan:", "; ".join(row[-1] for row in plan))
+
+    print(f"{args.members} members, median of {args.repeat} checks")
+    for label, check in (
+        ("load participants + scan", load_participants),
+        ("EXISTS", exists),
+        ("EXISTS, memo x3", memo),
+    ):
+        for who, user_id in (("member", member_id), ("outsider", outsider_id)):
+            ms = await median_ms(lambda: check(user_id), args.repeat)
+            print(f"  {label:<26} {who:<9} {ms:9.3f} ms")
+
+    membership_cache.ttl = 30
+    await cached(member_id)
+    ms = await median_ms(lambda: cached(member_id), args.repeat)
+    print(f"  {'TTL cache hit':<26} {'member':<9} {ms:9.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    seed(args.members)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Offset vs keyset pagination of chat history.
+
+    python -m benchmarks.bench_pagination --messages 500000
+
+Keyset latency should stay flat between page 1 and page 10,000, while
+OFFSET grows linearly with the page number.
+"""
+import argparse
+
+from benchmarks.common import use_temp_database, timeit, report
+
+use_temp_database()
+
+from sqlalchemy import insert  # noqa: E402
+
+from app.db.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.chat import Chat  # noqa: E402
+from app.models.message import Message  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services.message import MessageService  # noqa: E402
+
+
+def seed(db, count: int) -> int:
+    user = User(email="bench@example.com", username="bench", hashed_password="x")
+    chat = Chat(name="bench", creator=user)
+    db.add_all([user, chat])
+    db.commit()
+    batch = 50_000
+    for start in range(0, count, batch):
+        db.execute(
+            insert(Message),
+            [
+                {"content": f"message {i}", "chat_id": chat.id, "sender_id": user.id}
+                for i in range(start, min(start + batch, count))
+            ],
+        )
+    db.commit()
+    return chat.id
+
+
+def offset_page(db, chat_id: int, page: int, limit: int):
+    return (
+        db.query(Message)
+        .filter(Message.chat_id == chat_id)
+        .order_by(Message.created_at.desc())
+        .offset(page * limit)
+        .limit(limit)
+        .all()
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    chat_id = seed(db, args.messages)
+    last_page = args.messages // args.limit - 1
+    max_id = db.query(Message.id).order_by(Message.id.desc()).first()[0]
+
+    for page in (0, last_page):
+        before_id = None if page == 0 else max_id - page * args.limit + 1
+        report(
+            f"offset  page {page + 1}",
+            timeit(lambda: offset_page(db, chat_id, page, args.limit), args.repeat),
+        )
+        report(
+            f"keyset  page {page + 1}",
+            timeit(
+                lambda: MessageService.get_chat_messages(
+                    db, chat_id=chat_id, before_id=before_id, limit=args.limit
+                ),
+                args.repeat,
+            ),
+        )
+        db.expunge_all()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Adding and removing thousands of chat participants at once.
+
+    python -m benchmarks.bench_participants --members 5000
+
+Times, on a fresh chat each:
+
+* one by one     - the previous add_participant: load the user, scan
+                   chat.participants, append, commit and refresh per user
+                   (run on --legacy-members users, it is quadratic)
+* ORM collection - load all users, extend chat.participants, one commit
+* bulk           - AsyncChatService.update_participants: one
+                   INSERT ... SELECT ... ON CONFLICT DO NOTHING, one commit
+
+and then removing everyone with a single DELETE ... WHERE user_id IN.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import use_temp_database
+
+use_temp_database()
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from app.db.database import AsyncSessionLocal, Base, SessionLocal, engine  # noqa: E402
+from app.models.chat import Chat, user_chat  # noqa: E402
+from app.models.message import Message  # noqa: E402,F401 - для mapper Chat.messages
+from app.models.user import User  # noqa: E402
+from app.services.chat import AsyncChatService  # noqa: E402
+
+
+def seed(members: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(insert(User), [
+            {"email": f"user{i}@example.com", "username": f"user{i}", "hashed_password": "x"}
+            for i in range(members)
+        ])
+        db.commit()
+
+
+def new_chat(db) -> Chat:
+    chat = Chat(name="bench", creator_id=1)
+    db.add(chat)
+    db.commit()
+    return chat
+
+
+def one_by_one(user_ids) -> None:
+    with SessionLocal() as db:
+        chat = new_chat(db)
+        for user_id in user_ids:
+            user = db.query(User).filter(User.id == user_id).first()
+            if user and user not in chat.participants:
+                chat.participants.append(user)
+                db.commit()
+                db.refresh(chat)
+
+
+def orm_collection(user_ids) -> None:
+    with SessionLocal() as db:
+        chat = new_chat(db)
+        chat.participants.extend(db.query(User).filter(User.id.in_(user_ids)).all())
+        db.commit()
+
+
+async def bulk(user_ids) -> int:
+    async with AsyncSessionLocal() as db:
+        chat = Chat(name="bench", creator_id=1)
+        db.add(chat)
+        await db.commit()
+        start = time.perf_counter()
+        added, _ = await AsyncChatService.update_participants(db, chat.id, add=user_ids)
+        await db.commit()
+        print(f"  {'bulk add':<16} {len(added):6} users {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+        start = time.perf_counter()
+        _, removed = await AsyncChatService.update_participants(db, chat.id, remove=user_ids)
+        await db.commit()
+        print(f"  {'bulk remove':<16} {len(removed):6} users {(time.perf_counter() - start) * 1000:9.1f} ms")
+        return chat.id
+
+
+def timed(label: str, fn, user_ids) -> None:
+    start = time.perf_counter()
+    fn(user_ids)
+    print(f"  {label:<16} {len(user_ids):6} users {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--legacy-members", type=int, default=1000)
+    args = parser.parse_args()
+    seed(args.members)
+    user_ids = list(range(1, args.members + 1))
+
+    timed("one by one", one_by_one, user_ids[:args.legacy_members])
+    timed("ORM collection", orm_collection, user_ids)
+    chat_id = asyncio.run(bulk(user_ids))
+    with SessionLocal() as db:
+        left = db.scalar(select(func.count()).where(user_chat.c.chat_id == chat_id))
+    print(f"  members left after bulk remove: {left}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Thousands of users typing at once.
+
+    python -m benchmarks.bench_presence --users 3000 --chat-size 50
+
+Every user sits in one chat and sends a typing notification per keystroke
+for `--seconds`. Compares broadcasting each keystroke as its own event
+with PresenceTracker, which folds them into one diff per chat per flush
+interval. Reports frames delivered to sockets and CPU time per keystroke.
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.presence import MemoryPresenceStore, PresenceTracker
+from app.core.websocket import ConnectionManager
+
+
+class CountingWebSocket:
+    def __init__(self):
+        self.received = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data):
+        self.received += 1
+
+    async def close(self, code=1000):
+        pass
+
+
+async def drive(args, on_keystroke) -> int:
+    """Type for `args.seconds`, one keystroke per user per tick; returns keystrokes."""
+    keystrokes = 0
+    tick = 1 / args.keystrokes_per_second
+    deadline = time.monotonic() + args.seconds
+    while time.monotonic() < deadline:
+        for user_id in range(args.users):
+            await on_keystroke(user_id, user_id // args.chat_size)
+        keystrokes += args.users
+        await asyncio.sleep(tick)
+    return keystrokes
+
+
+async def connect_all(manager, args, sockets, user_ids: bool):
+    for user_id in range(args.users):
+        websocket = CountingWebSocket()
+        sockets.append(websocket)
+        await manager.connect(
+            websocket, user_id // args.chat_size, user_id=user_id if user_ids else None
+        )
+
+
+async def per_keystroke(args):
+    manager = ConnectionManager(queue_size=1024, slow_consumer_policy="drop")
+    sockets = []
+    await connect_all(manager, args, sockets, user_ids=False)
+
+    async def on_keystroke(user_id, chat_id):
+        await manager.broadcast_to_chat(
+            chat_id, {"type": "typing", "user_id": user_id, "active": True}
+        )
+
+    return manager, sockets, on_keystroke
+
+
+async def coalesced(args):
+    tracker = PresenceTracker(
+        MemoryPresenceStore(), flush_interval=args.flush_ms / 1000
+    )
+    manager = ConnectionManager(
+        queue_size=1024, slow_consumer_policy="drop", presence=tracker
+    )
+    sockets = []
+    await connect_all(manager, args, sockets, user_ids=True)
+
+    async def on_keystroke(user_id, chat_id):
+        tracker.typing(user_id, chat_id)
+
+    return manager, sockets, on_keystroke
+
+
+async def run(args):
+    for label, setup in (("per-keystroke broadcast", per_keystroke), ("coalesced presence", coalesced)):
+        manager, sockets, on_keystroke = await setup(args)
+        await asyncio.sleep(0.1)
+        before = sum(websocket.received for websocket in sockets)
+        cpu = time.process_time()
+        keystrokes = await drive(args, on_keystroke)
+        await asyncio.sleep(args.flush_ms / 1000 * 2)
+        cpu = time.process_time() - cpu
+        frames = sum(websocket.received for websocket in sockets) - before
+        await manager.close()
+        print(
+            f"{label:<24} keystrokes {keystrokes:>8}  frames sent {frames:>10}  "
+            f"CPU {cpu * 1e6 / keystrokes:7.1f} us/keystroke"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=3000)
+    parser.add_argument("--chat-size", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--keystrokes-per-second", type=float, default=5.0)
+    parser.add_argument("--flush-ms", type=int, default=500)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
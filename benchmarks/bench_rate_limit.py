@@ -0,0 +1,115 @@
+"""
+Per-request overhead of the rate limiting middleware.
+
+    python -m benchmarks.bench_rate_limit --requests 5000
+
+Drives a trivial FastAPI app in-process through httpx's ASGI transport:
+without a limiter, with the old per-IP timestamp list, with the
+sliding-window counter behind BaseHTTPMiddleware, and with the pure ASGI
+middleware. Limits are set high enough that nothing is rejected, so the
+numbers are pure bookkeeping cost. The old limiter gets slower as its
+list for the client grows within the minute.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.middleware import RateLimitMiddleware
+from app.core.rate_limit import MemoryRateLimitBackend, RateLimiter
+from benchmarks.common import report
+
+
+class ListRateLimitMiddleware(BaseHTTPMiddleware):
+    """The limiter as it was: a list of timestamps per IP."""
+
+    def __init__(self, app, requests_per_minute: int):
+        super().__init__(app)
+        self.requests_per_minute = requests_per_minute
+        self.requests: Dict[str, List[datetime]] = {}
+
+    async def dispatch(self, request: Request, call_next):
+        client_ip = request.client.host
+        now = datetime.now()
+        if client_ip in self.requests:
+            self.requests[client_ip] = [
+                t for t in self.requests[client_ip] if now - t < timedelta(minutes=1)
+            ]
+        if client_ip in self.requests and len(self.requests[client_ip]) >= self.requests_per_minute:
+            raise HTTPException(status_code=429)
+        self.requests.setdefault(client_ip, []).append(now)
+        return await call_next(request)
+
+
+class BaseHTTPRateLimitMiddleware(BaseHTTPMiddleware):
+    """The sliding-window limiter wrapped in BaseHTTPMiddleware."""
+
+    def __init__(self, app, limiter: RateLimiter):
+        super().__init__(app)
+        self.limiter = limiter
+
+    async def dispatch(self, request: Request, call_next):
+        result = await self.limiter.hit(request.url.path, request.client.host)
+        if not result.allowed:
+            raise HTTPException(status_code=429)
+        return await call_next(request)
+
+
+def make_app(middleware=None, **options) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    if middleware is not None:
+        app.add_middleware(middleware, **options)
+    return app
+
+
+async def sample(app: FastAPI, requests: int) -> list:
+    samples = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(requests):
+            start = time.perf_counter()
+            await client.get("/ping")
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def main_async(args) -> None:
+    limit = args.requests * 10
+    report("no rate limiting", await sample(make_app(), args.requests))
+    report(
+        "list of timestamps per IP",
+        await sample(
+            make_app(ListRateLimitMiddleware, requests_per_minute=limit), args.requests
+        ),
+    )
+    def limiter():
+        return RateLimiter(MemoryRateLimitBackend(), anonymous_limit=limit, user_limit=limit)
+
+    report(
+        "sliding window, BaseHTTPMiddleware",
+        await sample(make_app(BaseHTTPRateLimitMiddleware, limiter=limiter()), args.requests),
+    )
+    report(
+        "sliding window, pure ASGI",
+        await sample(make_app(RateLimitMiddleware, limiter=limiter()), args.requests),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Catching up after a WebSocket reconnect.
+
+    python -m benchmarks.bench_replay --messages 200000 --gap 50
+
+Seeds one busy chat, then times how a client that missed the last `--gap`
+messages gets them back: from ConnectionManager's in-memory buffer, from
+the (chat_id, seq) range query, and the old way - re-reading history with
+offset paging until the last message it had shows up.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import use_temp_database, report
+
+use_temp_database()
+
+from app.db.database import AsyncSessionLocal, Base, SessionLocal, engine  # noqa: E402
+from app.models.chat import Chat  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.schemas.message import Message as MessageSchema, MessageCreate  # noqa: E402
+from app.services.message import AsyncMessageService, MessageService  # noqa: E402
+from app.core.websocket import ConnectionManager  # noqa: E402
+
+
+class SinkWebSocket:
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data):
+        pass
+
+    async def close(self, code=1000):
+        pass
+
+
+def seed(count: int) -> int:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        user = User(email="bench@example.com", username="bench", hashed_password="x")
+        db.add(user)
+        chat = Chat(name="busy", creator=user)
+        db.add(chat)
+        db.commit()
+        batch = 20_000
+        for offset in range(0, count, batch):
+            MessageService.create_many(db, [
+                (MessageCreate(content=f"message {i}", chat_id=chat.id), user.id)
+                for i in range(offset, min(offset + batch, count))
+            ])
+        return chat.id
+
+
+async def load_missed(chat_id: int, after_seq: int, limit: int) -> list:
+    async with AsyncSessionLocal() as db:
+        messages = await AsyncMessageService.get_since_seq(db, chat_id, after_seq, limit)
+        return [MessageSchema.model_validate(m).model_dump(mode="json") for m in messages]
+
+
+async def offset_refetch(chat_id: int, last_seen_id: int, page: int = 50) -> None:
+    # Прежний клиент: листает историю со skip, пока не встретит своё сообщение
+    skip = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            result = await db.execute(
+                MessageService.chat_messages_statement(chat_id, limit=page).offset(skip)
+            )
+            rows = result.scalars().all()
+            skip += page
+            if not rows or any(m.id <= last_seen_id for m in rows):
+                return
+
+
+async def sample(fn, repeat: int = 30) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def run(args, chat_id: int) -> None:
+    last_seq = args.messages - args.gap
+    live = await load_missed(chat_id, last_seq - 200, args.gap + 200)
+
+    manager = ConnectionManager(replay_buffer_size=256)
+    await manager.connect(SinkWebSocket(), chat_id)
+    for message in live:
+        await manager.broadcast_to_chat(chat_id, message)
+
+    async def from_buffer():
+        websocket = SinkWebSocket()
+        await manager.connect(websocket, chat_id, last_seq=last_seq, load_missed=load_missed)
+        await manager.disconnect(websocket, chat_id)
+
+    cold = ConnectionManager()
+
+    async def from_database():
+        websocket = SinkWebSocket()
+        await cold.connect(websocket, chat_id, last_seq=last_seq, load_missed=load_missed)
+        await cold.disconnect(websocket, chat_id)
+
+    last_seen_id = live[199]["id"]
+    report(f"ring buffer replay ({args.gap} msgs)", await sample(from_buffer))
+    report(f"seq range query ({args.gap} msgs)", await sample(from_database))
+    report(f"offset refetch ({args.gap} msgs)", await sample(
+        lambda: offset_refetch(chat_id, last_seen_id), repeat=10
+    ))
+    await manager.close()
+    await cold.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--gap", type=int, default=50)
+    args = parser.parse_args()
+    chat_id = seed(args.messages)
+    asyncio.run(run(args, chat_id))
+
+
+if __name__ == "__main__":
+    main()
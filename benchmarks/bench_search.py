@@ -0,0 +1,122 @@
+"""
+Message search over a large history: FTS5 index vs LIKE scan.
+
+    python -m benchmarks.bench_search --messages 1000000
+
+Seeds the messages table (the FTS triggers index every row as it is
+inserted), then times a rare term, a common term and a prefix query for
+one user across 20 chats, ranked and newest first, plus the old
+alternative - LIKE '%term%' over the same chats. Also reports how long a
+full index rebuild takes.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import use_temp_database, report
+
+use_temp_database()
+
+from sqlalchemy import insert, select  # noqa: E402
+
+from app.db.database import AsyncSessionLocal, Base, SessionLocal, engine  # noqa: E402
+from app.models.chat import Chat, user_chat  # noqa: E402
+from app.models.message import Message  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.scripts.rebuild_message_search import rebuild  # noqa: E402
+from app.services.search import MessageSearchService  # noqa: E402
+
+WORDS = (
+    "привет как дела сегодня завтра встреча проект релиз деплой сервер "
+    "база ошибка тест review merge branch lunch coffee ticket sprint"
+).split()
+
+
+def seed(count: int, chats: int) -> int:
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(1)
+    with SessionLocal() as db:
+        user = User(email="bench@example.com", username="bench", hashed_password="x")
+        db.add(user)
+        chat_objects = [Chat(name=f"chat {i}", creator=user) for i in range(chats)]
+        for chat in chat_objects[: chats // 2]:
+            chat.participants.append(user)
+        db.add_all(chat_objects)
+        db.commit()
+        chat_ids = [chat.id for chat in chat_objects]
+
+        start = time.perf_counter()
+        batch = 50_000
+        for offset in range(0, count, batch):
+            rows = []
+            for i in range(offset, min(offset + batch, count)):
+                words = rng.choices(WORDS, k=8)
+                if i % 100_000 == 0:
+                    words.append("квазар")  # редкое слово
+                rows.append({
+                    "content": " ".join(words),
+                    "chat_id": chat_ids[i % chats],
+                    "sender_id": user.id,
+                })
+            db.execute(insert(Message), rows)
+            db.commit()
+        elapsed = time.perf_counter() - start
+        print(f"seeded {count} messages with FTS triggers in {elapsed:.1f} s "
+              f"({count / elapsed:,.0f} rows/s)")
+        return user.id
+
+
+async def fts(user_id: int, text: str, order: str) -> None:
+    async with AsyncSessionLocal() as db:
+        await MessageSearchService.search(
+            db, user_id, MessageSearchService.match_query(text), limit=20, order=order
+        )
+
+
+async def like(user_id: int, text: str) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            select(Message.id)
+            .where(
+                Message.content.like(f"%{text}%"),
+                Message.chat_id.in_(
+                    select(user_chat.c.chat_id).where(user_chat.c.user_id == user_id)
+                ),
+            )
+            .order_by(Message.id.desc())
+            .limit(20)
+        )
+
+
+async def sample(fn, *args, repeat: int = 20) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def main_async(args, user_id: int) -> None:
+    for label, text in (("rare term", "квазар"), ("common term", "деплой"), ("prefix", "рел")):
+        report(f"fts5 rank    {label} ({text})", await sample(fts, user_id, text, "rank"))
+        report(f"fts5 recent  {label} ({text})", await sample(fts, user_id, text, "recent"))
+        report(f"LIKE recent  {label} ({text})", await sample(like, user_id, text, repeat=3))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=40)
+    args = parser.parse_args()
+    user_id = seed(args.messages, args.chats)
+    asyncio.run(main_async(args, user_id))
+
+    start = time.perf_counter()
+    rebuild()
+    print(f"full index rebuild: {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
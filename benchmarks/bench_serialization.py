@@ -0,0 +1,139 @@
+"""
+Response serialization share on 1k-row list responses.
+
+    python -m benchmarks.bench_serialization --rows 1000
+
+For messages (with sender and quoted reply), chat summaries and users,
+times the database fetch and then each way of turning the rows into a
+response body:
+
+* fastapi   - response_model validation, jsonable dump, stdlib json
+* orjson    - the same validation and dump, rendered by ORJSONResponse
+* fast path - app.core.serialization.serialize: one validation through a
+              cached TypeAdapter, JSON bytes straight from pydantic-core
+
+and prints what share of fetch + serialization the serialization takes.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from benchmarks.common import use_temp_database
+
+use_temp_database()
+
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.serialization import serialize  # noqa: E402
+from app.db.database import AsyncSessionLocal, Base, SessionLocal, engine  # noqa: E402
+from app.models.chat import Chat, user_chat  # noqa: E402
+from app.models.message import Message  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.schemas import schemas  # noqa: E402
+from app.schemas.chat import ChatSummary  # noqa: E402
+from app.schemas.message import Message as MessageSchema  # noqa: E402
+from app.services.chat import AsyncChatService  # noqa: E402
+from app.services.message import AsyncMessageService  # noqa: E402
+from app.services.user import AsyncUserService  # noqa: E402
+
+
+def seed(rows: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(insert(User), [
+            {"email": f"user{i}@example.com", "username": f"user{i}", "hashed_password": "x"}
+            for i in range(rows)
+        ])
+        db.execute(insert(Chat), [
+            {"name": f"chat {i}", "creator_id": 1, "last_message_preview": "hello"}
+            for i in range(rows)
+        ])
+        db.execute(insert(user_chat), [
+            {"user_id": 1, "chat_id": chat_id} for chat_id in range(1, rows + 1)
+        ])
+        db.execute(insert(Message), [
+            {
+                "content": f"message number {i} with some ordinary chat text",
+                "chat_id": 1,
+                "sender_id": 1 + i % 50,
+                "reply_to_id": i if i % 5 == 0 and i else None,
+            }
+            for i in range(rows)
+        ])
+        db.commit()
+
+
+async def fetch_messages(rows: int):
+    async with AsyncSessionLocal() as db:
+        return await AsyncMessageService.get_chat_messages(db, chat_id=1, limit=rows)
+
+
+async def fetch_summaries(rows: int):
+    async with AsyncSessionLocal() as db:
+        return await AsyncChatService.get_user_summaries(db, user_id=1)
+
+
+async def fetch_users(rows: int):
+    async with AsyncSessionLocal() as db:
+        return await AsyncUserService.get_all(db)
+
+
+async def median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def run(args) -> None:
+    cases = (
+        ("messages", List[MessageSchema], fetch_messages),
+        ("chat summaries", List[ChatSummary], fetch_summaries),
+        ("users", List[schemas.User], fetch_users),
+    )
+    for label, tp, fetch in cases:
+        content = await fetch(args.rows)
+        fetched = await median_ms(lambda: fetch(args.rows), args.repeat)
+        field = create_response_field(name=f"Response_{label}", type_=tp)
+
+        async def through_fastapi(response_class):
+            body = await serialize_response(
+                field=field, response_content=content, is_coroutine=True
+            )
+            return response_class(body).body
+
+        async def fastapi_json():
+            return await through_fastapi(JSONResponse)
+
+        async def fastapi_orjson():
+            return await through_fastapi(ORJSONResponse)
+
+        async def fast_path():
+            return serialize(tp, content).body
+
+        print(f"{label}: {len(content)} rows, fetch {fetched:.2f} ms")
+        settings.FAST_JSON_RESPONSES = True
+        for name, fn in (("fastapi", fastapi_json), ("orjson", fastapi_orjson), ("fast path", fast_path)):
+            ms = await median_ms(fn, args.repeat)
+            print(f"  {name:<10} {ms:8.2f} ms   serialization share {ms / (ms + fetched):6.1%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    seed(args.rows)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
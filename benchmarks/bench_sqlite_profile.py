@@ -0,0 +1,97 @@
+"""
+Mixed read/write concurrency on SQLite: default engine vs tuned profile.
+
+    python -m benchmarks.bench_sqlite_profile --writers 4 --readers 16 --seconds 5
+
+Writers insert one message per transaction, readers page through history
+with the keyset query. Reports completed operations per second and the
+number of "database is locked" errors.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base, create_db_engine
+from app.models.chat import Chat
+from app.models.user import User
+from app.schemas.message import MessageCreate
+from app.services.message import MessageService
+
+
+def run(tuned: bool, args) -> None:
+    path = os.path.join(tempfile.mkdtemp(prefix="pet_chat_bench_"), "bench.db")
+    engine = create_db_engine(f"sqlite:///{path}", tuned=tuned)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        user = User(email="bench@example.com", username="bench", hashed_password="x")
+        chat = Chat(name="bench", creator=user)
+        db.add_all([user, chat])
+        db.commit()
+        chat_id, user_id = chat.id, user.id
+        MessageService.create_many(
+            db, [(MessageCreate(content=f"seed {i}", chat_id=chat_id), user_id) for i in range(10_000)]
+        )
+
+    stop = threading.Event()
+    counts = {"write": 0, "read": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def writer():
+        while not stop.is_set():
+            with Session() as db:
+                try:
+                    MessageService.create(
+                        db, MessageCreate(content="hello", chat_id=chat_id), user_id
+                    )
+                    bump("write")
+                except OperationalError:
+                    bump("locked")
+
+    def reader():
+        while not stop.is_set():
+            with Session() as db:
+                try:
+                    MessageService.get_chat_messages(db, chat_id=chat_id, limit=50)
+                    bump("read")
+                except OperationalError:
+                    bump("locked")
+
+    threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    label = "tuned (WAL, NORMAL)" if tuned else "default (rollback journal)"
+    print(
+        f"{label:<28} writes {counts['write'] / args.seconds:8.0f}/s"
+        f"   reads {counts['read'] / args.seconds:8.0f}/s   locked errors {counts['locked']}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+    run(False, args)
+    run(True, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+WebSocket wire encodings: bytes per message and CPU per broadcast.
+
+    python -m benchmarks.bench_ws_encoding --sockets 1000 --messages 200
+
+Builds realistic ``message.created`` envelopes from the Pydantic schema
+and reports their size as JSON and msgpack, raw and after
+permessage-deflate (zlib raw deflate with a sync flush per message, with
+and without context takeover). Then times fan-out through
+ConnectionManager to all-JSON, all-msgpack and mixed sockets against the
+old per-socket send_json.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import zlib
+from datetime import datetime, timezone
+
+from app.core.events import encode, Encoding
+from app.core.websocket import ConnectionManager
+from app.schemas.event import MessageCreatedEvent
+from app.schemas.message import Message
+from app.schemas.user import User
+
+WORDS = "привет как дела сегодня встреча проект релиз деплой сервер review merge lunch".split()
+
+
+class SinkWebSocket:
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data):
+        pass
+
+    async def send_bytes(self, data):
+        pass
+
+    async def send_json(self, data):
+        await self.send_text(json.dumps(data))
+
+    async def close(self, code=1000):
+        pass
+
+
+def make_events(count: int) -> list:
+    rng = random.Random(1)
+    sender = User(id=7, email="alice@example.com", username="alice", is_active=True)
+    return [
+        MessageCreatedEvent.from_message(Message(
+            id=1000 + i, chat_id=1, sender_id=7, seq=1000 + i,
+            content=" ".join(rng.choices(WORDS, k=rng.randint(3, 20))),
+            created_at=datetime.now(timezone.utc), sender=sender,
+        ))
+        for i in range(count)
+    ]
+
+
+def deflate_sizes(frames: list, takeover: bool) -> list:
+    compressor = zlib.compressobj(wbits=-15)
+    sizes = []
+    for frame in frames:
+        if not takeover:
+            compressor = zlib.compressobj(wbits=-15)
+        data = frame.encode() if isinstance(frame, str) else frame
+        # RFC 7692: хвост 00 00 ff ff после sync flush не передаётся
+        sizes.append(len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4)
+    return sizes
+
+
+def sizes_report(events: list) -> None:
+    as_json = [event.model_dump_json() for event in events]
+    as_msgpack = [encode(data, Encoding.MSGPACK) for data in as_json]
+    for label, frames in (("json", as_json), ("msgpack", as_msgpack)):
+        raw = [len(f.encode() if isinstance(f, str) else f) for f in frames]
+        print(
+            f"{label:<8} raw {statistics.mean(raw):7.1f} B"
+            f"   deflate {statistics.mean(deflate_sizes(frames, False)):7.1f} B"
+            f"   deflate+takeover {statistics.mean(deflate_sizes(frames, True)):7.1f} B"
+        )
+
+
+async def per_socket_send_json(sockets: list, events: list) -> None:
+    # Прежняя рассылка: send_json на каждый сокет, сериализация каждый раз
+    for event in events:
+        payload = event.model_dump(mode="json")
+        for websocket in sockets:
+            await websocket.send_json(payload)
+
+
+async def through_manager(sockets: list, events: list, subprotocols: list) -> None:
+    manager = ConnectionManager(queue_size=len(events) + 1, slow_consumer_policy="drop")
+    for websocket, subprotocol in zip(sockets, subprotocols):
+        await manager.connect(websocket, 1, subprotocol=subprotocol)
+    for event in events:
+        await manager.broadcast_to_chat(1, event)
+    while any(
+        not connection.queue.empty() for connection in manager.active_connections[1].values()
+    ):
+        await asyncio.sleep(0)
+    await manager.close()
+
+
+async def run(args) -> None:
+    events = make_events(args.messages)
+    sizes_report(events)
+
+    sockets = [SinkWebSocket() for _ in range(args.sockets)]
+    half = args.sockets // 2
+    cases = (
+        ("per-socket send_json", lambda: per_socket_send_json(sockets, events)),
+        ("manager, all json", lambda: through_manager(sockets, events, [None] * args.sockets)),
+        ("manager, all msgpack", lambda: through_manager(
+            sockets, events, ["pet-chat.msgpack"] * args.sockets
+        )),
+        ("manager, half/half", lambda: through_manager(
+            sockets, events, [None] * half + ["pet-chat.msgpack"] * (args.sockets - half)
+        )),
+    )
+    for label, case in cases:
+        cpu = time.process_time()
+        await case()
+        cpu = time.process_time() - cpu
+        print(
+            f"{label:<22} {cpu * 1000 / len(events):8.3f} ms CPU per broadcast "
+            f"to {args.sockets} sockets"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Общие помощники для бенчмарков.
+
+Каждый бенчмарк запускается как скрипт из корня репозитория
+(``python -m benchmarks.bench_pagination``) и работает с собственной
+временной SQLite-базой, не трогая рабочую.
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable, List
+
+
+def use_temp_database(name: str = "bench.db") -> str:
+    """Point the app at a throwaway database; call before importing app.*"""
+    path = os.path.join(tempfile.mkdtemp(prefix="pet_chat_bench_"), name)
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    return path
+
+
+def timeit(fn: Callable[[], object], repeat: int = 20) -> List[float]:
+    """Run fn `repeat` times and return per-call wall times in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(label: str, samples: List[float]) -> None:
+    print(
+        f"{label:<40} median {statistics.median(samples):8.3f} ms"
+        f"   p99 {percentile(samples, 99):8.3f} ms"
+    )
+
+
+def ws_rtt(url: str, seconds: float) -> List[float]:
+    """Ping a chat WebSocket for `seconds` and return send->echo times in ms."""
+    import websockets
+
+    deadline = time.monotonic() + seconds
+
+    async def run():
+        samples = []
+        async with websockets.connect(url) as ws:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                await ws.send("ping")
+                # Ждём само сообщение, события присутствия пропускаем
+                while '"message.created"' not in await ws.recv():
+                    pass
+                samples.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+        return samples
+
+    return asyncio.run(run())
@@ -0,0 +1,149 @@
+import os
+import socket
+import tempfile
+import threading
+
+import pytest
+from sqlalchemy import event, insert
+
+# Тесты работают с отдельной временной базой, а не с pet_chat.db
+_test_dir = tempfile.mkdtemp(prefix="pet_chat_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_test_dir, 'test.db')}"
+
+from app.db.database import Base, SessionLocal, async_engine, engine  # noqa: E402
+from app.models.chat import Chat, ChatRole, user_chat  # noqa: E402
+from app.models.message import Message  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    from app.core.cache import membership_cache, principal_cache
+
+    # Пользователи пересоздаются в каждом тесте - кэш прошлого теста не годится
+    principal_cache.clear()
+    membership_cache.clear()
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    db_user = User(email="alice@example.com", username="alice", hashed_password="x")
+    db.add(db_user)
+    db.commit()
+    return db_user
+
+
+@pytest.fixture
+def chat(db, user):
+    db_chat = Chat(name="general", creator_id=user.id)
+    db.add(db_chat)
+    db.flush()
+    # Создатель - владелец чата, как в AsyncChatService.create
+    db.execute(insert(user_chat).values(
+        chat_id=db_chat.id, user_id=user.id, role=ChatRole.OWNER
+    ))
+    db.commit()
+    return db_chat
+
+
+@pytest.fixture
+def make_messages(db, chat, user):
+    def _make(count: int):
+        db.add_all(
+            Message(content=f"message {i}", chat_id=chat.id, sender_id=user.id)
+            for i in range(count)
+        )
+        db.commit()
+        return (
+            db.query(Message)
+            .filter(Message.chat_id == chat.id)
+            .order_by(Message.id.desc())
+            .all()
+        )
+    return _make
+
+
+@pytest.fixture
+def count_queries():
+    """Count SQL statements executed against the sync and async engines."""
+    class _Counter:
+        def __init__(self):
+            self.statements = []
+
+        @property
+        def count(self):
+            return len(self.statements)
+
+        def _on_execute(self, conn, cursor, statement, *args):
+            self.statements.append(statement)
+
+        def __enter__(self):
+            for target in (engine, async_engine.sync_engine):
+                event.listen(target, "before_cursor_execute", self._on_execute)
+            return self
+
+        def __exit__(self, *exc):
+            for target in (engine, async_engine.sync_engine):
+                event.remove(target, "before_cursor_execute", self._on_execute)
+
+    return _Counter
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+    from app.core.rate_limit import MemoryRateLimitBackend
+    from app.main import app, rate_limiter
+
+    # Счётчики rate limiting не должны переходить из теста в тест
+    rate_limiter.backend = MemoryRateLimitBackend()
+
+    # Контекст нужен, чтобы HTTP и WebSocket работали в одном event loop
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers(user):
+    from app.core.security import create_access_token
+
+    token = create_access_token(data={"sub": user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _redis_reachable(url):
+    import redis
+
+    try:
+        return redis.Redis.from_url(url, socket_connect_timeout=0.5).ping()
+    except Exception:
+        return False
+
+
+@pytest.fixture(scope="session")
+def redis_url():
+    url = os.environ.get("TEST_REDIS_URL", "redis://localhost:6379/15")
+    if _redis_reachable(url):
+        yield url
+        return
+    fakeredis = pytest.importorskip("fakeredis")
+    port = _free_port()
+    server = fakeredis.TcpFakeServer(("127.0.0.1", port))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"redis://127.0.0.1:{port}"
+    server.shutdown()
+    server.server_close()
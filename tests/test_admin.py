@@ -0,0 +1,189 @@
+import gzip
+import os
+import sqlite3
+
+import pytest
+
+from app.api.endpoints.admin import backup_database
+from app.core.cache import principal_cache
+from app.db.database import AsyncSessionLocal
+from app.models.chat import Chat
+from app.models.message import Message
+from app.models.user import User
+from app.services.backup import BackupService
+
+
+@pytest.fixture
+def admin_headers(db, user, auth_headers):
+    user.role = "ADMIN"
+    db.commit()
+    return auth_headers
+
+
+def _count(path, table):
+    with sqlite3.connect(path) as connection:
+        return connection.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+
+def test_admin_endpoints_require_admin(client, auth_headers):
+    for action in ("backup", "restore", "reset"):
+        response = client.post(f"/api/v1/admin/{action}", headers=auth_headers)
+        assert response.status_code == 403
+    assert client.post("/api/v1/admin/backup").status_code == 401
+
+
+def test_backup_streams_a_consistent_database(client, make_messages, admin_headers, tmp_path):
+    make_messages(3)
+
+    response = client.post("/api/v1/admin/backup", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    assert ".db.gz" in response.headers["content-disposition"]
+    path = tmp_path / "backup.db"
+    path.write_bytes(gzip.decompress(response.content))
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert _count(path, "messages") == 3
+
+    plain = client.post("/api/v1/admin/backup", params={"compress": False}, headers=admin_headers)
+    assert plain.content.startswith(b"SQLite format 3\x00")
+    # Временные файлы снимков удалены
+    directory = os.path.dirname(BackupService.database_path())
+    assert not [name for name in os.listdir(directory) if "-backup-" in name]
+
+
+@pytest.mark.parametrize("send_fails", [False, True])
+async def test_backup_file_is_removed_when_the_client_leaves_before_the_stream(
+    db, user, make_messages, send_fails
+):
+    make_messages(3)
+    async with AsyncSessionLocal() as session:
+        response = await backup_database(compress=False, db=session, current_user=user)
+    directory = os.path.dirname(BackupService.database_path())
+    assert [name for name in os.listdir(directory) if "-backup-" in name]
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # Клиент ушёл: либо отключение приходит раньше тела, либо отправка падает
+        if send_fails:
+            raise OSError("client is gone")
+
+    if send_fails:
+        with pytest.raises(OSError):
+            await response({"type": "http"}, receive, send)
+    else:
+        await response({"type": "http"}, receive, send)
+    assert not [name for name in os.listdir(directory) if "-backup-" in name]
+
+
+def test_snapshot_is_not_restarted_by_concurrent_writes(db, chat, user, make_messages, tmp_path):
+    make_messages(200)
+    writer = sqlite3.connect(BackupService.database_path(), isolation_level=None)
+    steps = []
+
+    def write_between_steps(status, remaining, total):
+        steps.append(remaining)
+        if len(steps) > 1000:
+            raise AssertionError("the backup keeps restarting")
+        writer.execute(
+            "INSERT INTO messages (content, message_type, chat_id, sender_id, is_edited, seq) "
+            "VALUES ('late', 'TEXT', ?, ?, 0, (SELECT max(seq) + 1 FROM messages))",
+            (chat.id, user.id),
+        )
+
+    target = tmp_path / "snapshot.db"
+    try:
+        BackupService.snapshot(BackupService.database_path(), str(target), pages=1,
+                               progress=write_between_steps)
+    finally:
+        writer.close()
+
+    # Каждый шаг - коммит другого соединения, а копия всё равно дошла до
+    # конца и содержит ровно снимок на момент начала
+    assert len(steps) > 10
+    assert _count(target, "messages") == 200
+    assert db.query(Message).count() == 200 + len(steps)
+
+
+def test_restore_swaps_the_backup_in(client, db, chat, make_messages, admin_headers):
+    make_messages(3)
+    backup = client.post("/api/v1/admin/backup", headers=admin_headers).content
+    make_messages(2)
+    db.add(Chat(name="later", creator_id=chat.creator_id))
+    db.commit()
+
+    response = client.post(
+        "/api/v1/admin/restore", files={"backup": ("pet_chat.db.gz", backup)},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+    db.expire_all()
+    assert db.query(Message).count() == 3
+    assert [c.name for c in db.query(Chat)] == ["general"]
+    # Поиск тоже откатился вместе с базой
+    found = client.get("/api/v1/messages/search", params={"q": "message"}, headers=admin_headers)
+    assert len(found.json()) == 3
+
+    # Несжатая копия тоже принимается
+    plain = client.post("/api/v1/admin/backup", params={"compress": False}, headers=admin_headers)
+    response = client.post(
+        "/api/v1/admin/restore", files={"backup": ("pet_chat.db", plain.content)},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("payload", [
+    b"not a database" * 100,
+    gzip.compress(b"not a database"),
+    gzip.compress(b"SQLite format 3\x00" + b"\x00" * 5000)[:-20],
+])
+def test_restore_rejects_broken_uploads(client, db, make_messages, admin_headers, payload):
+    make_messages(3)
+    response = client.post(
+        "/api/v1/admin/restore", files={"backup": ("backup.db", payload)}, headers=admin_headers
+    )
+    assert response.status_code == 400
+    assert db.query(Message).count() == 3
+
+
+def test_restore_rejects_a_foreign_database(client, db, make_messages, admin_headers, tmp_path):
+    make_messages(3)
+    other = tmp_path / "other.db"
+    with sqlite3.connect(other) as connection:
+        connection.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+    response = client.post(
+        "/api/v1/admin/restore", files={"backup": ("other.db", other.read_bytes())},
+        headers=admin_headers,
+    )
+    assert response.status_code == 400
+    assert "lacks tables" in response.json()["detail"]
+    assert db.query(Message).count() == 3
+
+
+def test_reset_keeps_only_the_admin(client, db, user, make_messages, admin_headers):
+    make_messages(3)
+    db.add(User(email="bob@example.com", username="bob", hashed_password="x"))
+    db.commit()
+
+    assert client.post("/api/v1/admin/reset", headers=admin_headers).status_code == 200
+    db.expire_all()
+    assert db.query(Message).count() == 0
+    assert db.query(Chat).count() == 0
+    assert [(u.username, u.role) for u in db.query(User)] == [("alice", "ADMIN")]
+    # Токен администратора по-прежнему действует
+    assert client.get("/api/v1/chats/", headers=admin_headers).status_code == 200
+
+
+def test_reset_works_with_a_cached_principal(client, db, user, make_messages, admin_headers):
+    make_messages(3)
+    # Любой предыдущий запрос кладёт администратора в кэш без хэша пароля
+    assert client.get("/api/v1/users/me", headers=admin_headers).status_code == 200
+    assert principal_cache.get("alice") is not None
+
+    assert client.post("/api/v1/admin/reset", headers=admin_headers).status_code == 200
+    db.expire_all()
+    assert db.query(Message).count() == 0
+    assert [(u.username, u.hashed_password) for u in db.query(User)] == [("alice", "x")]
@@ -0,0 +1,290 @@
+from app.core.security import create_access_token
+from app.models.user import User
+
+
+def test_create_and_list_chats(client, user, auth_headers):
+    response = client.post("/api/v1/chats/", json={"name": " team "}, headers=auth_headers)
+    assert response.status_code == 200
+    created = response.json()
+    assert created["name"] == "team"
+    assert created["creator_id"] == user.id
+
+    chats = client.get("/api/v1/chats/", headers=auth_headers).json()
+    assert [c["id"] for c in chats] == [created["id"]]
+    assert chats[0]["unread_count"] == 0
+    assert chats[0]["last_message_id"] is None
+
+    chat = client.get(f"/api/v1/chats/{created['id']}", headers=auth_headers).json()
+    assert [p["username"] for p in chat["participants"]] == ["alice"]
+    assert chat["creator"]["username"] == "alice"
+
+
+def test_get_chat_requires_participation(client, db, chat, auth_headers):
+    assert client.get(f"/api/v1/chats/{chat.id}", headers=auth_headers).status_code == 200
+
+    db.add(User(email="eve@example.com", username="eve", hashed_password="x"))
+    db.commit()
+    eve = {"Authorization": f"Bearer {create_access_token(data={'sub': 'eve'})}"}
+    assert client.get(f"/api/v1/chats/{chat.id}", headers=eve).status_code == 403
+    assert client.get("/api/v1/chats/999", headers=eve).status_code == 404
+
+
+def _join(db, chat, username):
+    member = User(email=f"{username}@example.com", username=username, hashed_password="x")
+    chat.participants.append(member)
+    db.commit()
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': username})}"}
+
+
+def _send(client, headers, chat_id, content):
+    response = client.post(
+        "/api/v1/messages/", json={"content": content, "chat_id": chat_id}, headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_chat_list_tracks_last_message_and_unread(client, db, chat, auth_headers):
+    bob = _join(db, chat, "bob")
+    first = _send(client, auth_headers, chat.id, "hello")
+    second = _send(client, auth_headers, chat.id, "x" * 300)
+
+    [mine] = client.get("/api/v1/chats/", headers=auth_headers).json()
+    [theirs] = client.get("/api/v1/chats/", headers=bob).json()
+    assert mine["last_message_id"] == theirs["last_message_id"] == second
+    assert mine["last_message_preview"] == "x" * 100
+    assert mine["last_message_at"] is not None
+    # Свои сообщения не считаются непрочитанными
+    assert mine["unread_count"] == 0
+    assert theirs["unread_count"] == 2
+
+    read = client.post(f"/api/v1/chats/{chat.id}/read", json={"message_id": first}, headers=bob)
+    assert read.status_code == 200
+    assert read.json()["unread_count"] == 1
+
+    # Удаление последнего сообщения возвращает в сводку предыдущее
+    assert client.delete(f"/api/v1/messages/{second}", headers=auth_headers).status_code == 200
+    [theirs] = client.get("/api/v1/chats/", headers=bob).json()
+    assert (theirs["last_message_id"], theirs["last_message_preview"]) == (first, "hello")
+    assert theirs["unread_count"] == 0
+
+
+def test_mark_read_whole_chat_and_permissions(client, db, chat, auth_headers):
+    bob = _join(db, chat, "bob")
+    for i in range(3):
+        _send(client, auth_headers, chat.id, f"m{i}")
+
+    read = client.post(f"/api/v1/chats/{chat.id}/read", json={}, headers=bob)
+    assert read.json()["unread_count"] == 0
+    # Маркер не двигается назад
+    read = client.post(f"/api/v1/chats/{chat.id}/read", json={"message_id": 1}, headers=bob)
+    assert read.json()["unread_count"] == 0
+
+    db.add(User(email="eve@example.com", username="eve", hashed_password="x"))
+    db.commit()
+    eve = {"Authorization": f"Bearer {create_access_token(data={'sub': 'eve'})}"}
+    assert client.post(f"/api/v1/chats/{chat.id}/read", json={}, headers=eve).status_code == 403
+    assert client.post("/api/v1/chats/999/read", json={}, headers=eve).status_code == 404
+
+
+def test_read_marker_stops_at_the_last_message(client, db, chat, auth_headers):
+    bob = _join(db, chat, "bob")
+    _send(client, auth_headers, chat.id, "hello")
+
+    read = client.post(f"/api/v1/chats/{chat.id}/read", json={"message_id": 10**9}, headers=bob)
+    assert read.json()["unread_count"] == 0
+    # Метка встала на последнее сообщение, новые снова непрочитаны
+    _send(client, auth_headers, chat.id, "later")
+    [theirs] = client.get("/api/v1/chats/", headers=bob).json()
+    assert theirs["unread_count"] == 1
+
+
+def test_chat_list_is_one_query(client, db, user, auth_headers, count_queries):
+    from app.models.chat import Chat
+
+    for i in range(5):
+        extra = Chat(name=f"chat {i}", creator_id=user.id)
+        extra.participants.append(user)
+        db.add(extra)
+    db.commit()
+    client.get("/api/v1/chats/", headers=auth_headers)
+
+    with count_queries() as counter:
+        chats = client.get("/api/v1/chats/", headers=auth_headers).json()
+    assert len(chats) == 5
+    assert counter.count == 1
+
+
+def test_create_many_updates_every_chat_summary(db, user, chat):
+    from app.models.chat import Chat
+    from app.schemas.message import MessageCreate
+    from app.services.message import MessageService
+
+    other = Chat(name="other", creator_id=user.id)
+    other.participants.append(user)
+    db.add(other)
+    db.commit()
+
+    rows = MessageService.create_many(db, [
+        (MessageCreate(content="a1", chat_id=chat.id), user.id),
+        (MessageCreate(content="b1", chat_id=other.id), user.id),
+        (MessageCreate(content="a2", chat_id=chat.id), user.id),
+    ])
+    db.expire_all()
+    assert (chat.last_message_id, chat.last_message_preview) == (rows[2][0], "a2")
+    assert (other.last_message_id, other.last_message_preview) == (rows[1][0], "b1")
+
+
+def _plan(db, statement):
+    sql = str(statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def test_user_chat_is_read_through_indexes_in_both_directions(db, user, chat):
+    from sqlalchemy import select
+    from app.models.chat import user_chat
+    from app.services.chat import ChatService
+    from app.services.membership import MembershipService
+
+    # Чаты пользователя: ключ таблицы WITHOUT ROWID, без перехода к строке
+    summaries = _plan(db, ChatService.summaries_statement(user.id))
+    assert "SEARCH user_chat USING PRIMARY KEY (user_id=?)" in summaries
+
+    # Участники чата (selectinload Chat.participants): обратный индекс
+    participants = _plan(db, select(User).join(user_chat).where(user_chat.c.chat_id == chat.id))
+    assert any(
+        "COVERING INDEX ix_user_chat_chat_id_user_id (chat_id=?)" in step
+        for step in participants
+    )
+
+    membership = _plan(db, select(MembershipService.exists_clause(chat.id, user.id)))
+    assert "SEARCH user_chat USING PRIMARY KEY (user_id=? AND chat_id=?)" in membership
+
+    for plan in (summaries, participants, membership):
+        assert not any(step.startswith("SCAN user_chat") for step in plan)
+
+
+def test_creator_joins_as_owner(client, db, user, auth_headers):
+    from sqlalchemy import select
+    from app.models.chat import Chat, ChatRole, user_chat
+
+    created = client.post("/api/v1/chats/", json={"name": "team"}, headers=auth_headers).json()
+    _join(db, db.get(Chat, created["id"]), "bob")
+
+    rows = db.execute(
+        select(user_chat.c.user_id, user_chat.c.role, user_chat.c.joined_at)
+        .where(user_chat.c.chat_id == created["id"])
+        .order_by(user_chat.c.user_id)
+    ).all()
+    assert [(row.user_id, row.role) for row in rows] == [
+        (user.id, ChatRole.OWNER), (user.id + 1, ChatRole.MEMBER)
+    ]
+    assert all(row.joined_at is not None for row in rows)
+
+
+def _participants(client, headers, chat_id, add=(), remove=()):
+    return client.post(
+        f"/api/v1/chats/{chat_id}/participants",
+        json={"add": list(add), "remove": list(remove)},
+        headers=headers,
+    )
+
+
+def _make_users(db, names):
+    users = [User(email=f"{n}@example.com", username=n, hashed_password="x") for n in names]
+    db.add_all(users)
+    db.commit()
+    return [u.id for u in users]
+
+
+def test_bulk_participants_add_and_remove(client, db, chat, user, auth_headers):
+    bob, carol = _make_users(db, ["bob", "carol"])
+
+    # Неизвестные пользователи и уже участники пропускаются
+    response = _participants(client, auth_headers, chat.id, add=[bob, carol, user.id, 999])
+    assert response.status_code == 200
+    assert sorted(response.json()["added"]) == [bob, carol]
+    assert _participants(client, auth_headers, chat.id, add=[bob]).json()["added"] == []
+
+    response = _participants(client, auth_headers, chat.id, remove=[bob, 999])
+    assert response.json() == {"added": [], "removed": [bob]}
+    members = client.get(f"/api/v1/chats/{chat.id}", headers=auth_headers).json()["participants"]
+    assert sorted(p["id"] for p in members) == [user.id, carol]
+
+
+def test_added_member_starts_with_history_read(client, db, chat, auth_headers):
+    [bob] = _make_users(db, ["bob"])
+    for i in range(3):
+        _send(client, auth_headers, chat.id, f"m{i}")
+
+    assert _participants(client, auth_headers, chat.id, add=[bob]).json()["added"] == [bob]
+    as_bob = {"Authorization": f"Bearer {create_access_token(data={'sub': 'bob'})}"}
+    [theirs] = client.get("/api/v1/chats/", headers=as_bob).json()
+    assert theirs["unread_count"] == 0
+    # Новые сообщения после вступления считаются как обычно
+    _send(client, auth_headers, chat.id, "welcome")
+    [theirs] = client.get("/api/v1/chats/", headers=as_bob).json()
+    assert theirs["unread_count"] == 1
+
+
+def test_bulk_participants_cost_does_not_grow_with_the_list(
+    client, db, chat, auth_headers, count_queries
+):
+    few = _make_users(db, [f"few{i}" for i in range(2)])
+    many = _make_users(db, [f"many{i}" for i in range(200)])
+    _participants(client, auth_headers, chat.id, add=[])
+
+    with count_queries() as small:
+        _participants(client, auth_headers, chat.id, add=few)
+    with count_queries() as large:
+        _participants(client, auth_headers, chat.id, add=many, remove=few)
+    assert large.count == small.count + 1
+
+
+def test_bulk_participants_permissions(client, db, chat, user, auth_headers):
+    bob, carol = _make_users(db, ["bob", "carol"])
+    _participants(client, auth_headers, chat.id, add=[bob, carol])
+    as_carol = {"Authorization": f"Bearer {create_access_token(data={'sub': 'carol'})}"}
+
+    # Участник может добавлять и уйти сам, но не исключать других
+    assert _participants(client, as_carol, chat.id, remove=[bob]).status_code == 403
+    assert _participants(client, as_carol, chat.id, remove=[carol]).json()["removed"] == [carol]
+    assert _participants(client, as_carol, chat.id, add=[carol]).status_code == 403
+    assert _participants(client, as_carol, 999, add=[carol]).status_code == 404
+
+    # Владельца не исключить, пересечение списков - ошибка запроса
+    assert _participants(client, auth_headers, chat.id, remove=[user.id]).json()["removed"] == []
+    assert _participants(client, auth_headers, chat.id, add=[bob], remove=[bob]).status_code == 422
+
+
+def test_bulk_participants_emit_one_event_and_disconnect_removed(
+    client, db, chat, user, auth_headers
+):
+    import pytest
+    from starlette.websockets import WebSocketDisconnect
+
+    bob_headers = _join(db, chat, "bob")
+    bob = db.query(User).filter(User.username == "bob").one().id
+    carol, dave = _make_users(db, ["carol", "dave"])
+
+    def receive_membership(websocket):
+        while True:
+            frame = websocket.receive_json()
+            if frame["type"] == "membership":
+                return frame
+
+    with client.websocket_connect(
+        f"/api/v1/messages/ws/{chat.id}", headers=auth_headers
+    ) as owner_ws, client.websocket_connect(
+        f"/api/v1/messages/ws/{chat.id}", headers=bob_headers
+    ) as bob_ws:
+        _participants(client, auth_headers, chat.id, add=[carol, dave], remove=[bob])
+
+        frame = receive_membership(owner_ws)
+        assert sorted(frame["data"]["added"]) == [carol, dave]
+        assert frame["data"]["removed"] == [bob]
+        # Исключённый получает событие, затем сервер закрывает сокет
+        assert receive_membership(bob_ws)["data"]["removed"] == [bob]
+        with pytest.raises(WebSocketDisconnect) as exc:
+            receive_membership(bob_ws)
+        assert exc.value.code == 1008
@@ -0,0 +1,38 @@
+from app.db.database import create_db_engine, engine
+
+
+def test_app_engine_applies_sqlite_profile(db):
+    with engine.connect() as conn:
+        pragma = lambda name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+        assert pragma("journal_mode") == "wal"
+        # 1 == NORMAL
+        assert pragma("synchronous") == 1
+        assert pragma("busy_timeout") == 5000
+
+
+def test_untuned_engine_keeps_sqlite_defaults(tmp_path):
+    untuned = create_db_engine(f"sqlite:///{tmp_path / 'plain.db'}", tuned=False)
+    with untuned.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+    untuned.dispose()
+
+
+def test_every_endpoint_takes_its_session_from_deps_get_db(client, user, auth_headers):
+    from app.api.deps import get_db
+    from app.db.database import AsyncSessionLocal
+    from app.main import app
+
+    calls = []
+
+    async def override():
+        calls.append(1)
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override
+    try:
+        client.post("/api/v1/auth/login", data={"username": "nobody", "password": "wrong"})
+        client.get("/api/v1/chats/", headers=auth_headers)
+    finally:
+        app.dependency_overrides.pop(get_db)
+    assert len(calls) == 2
@@ -0,0 +1,92 @@
+import pytest
+
+from app.core.cache import membership_cache
+from app.db.database import AsyncSessionLocal
+from app.models.user import User
+from app.services.chat import ChatService
+from app.services.membership import MembershipService
+
+
+def _membership_queries(counter):
+    # Отправка сообщения ещё сдвигает отметку прочтения (UPDATE user_chat)
+    return [s for s in counter.statements if s.startswith("SELECT") and "user_chat" in s]
+
+
+@pytest.fixture
+def crowd(db, chat):
+    chat.participants.extend(
+        User(email=f"member{i}@example.com", username=f"member{i}", hashed_password="x")
+        for i in range(50)
+    )
+    db.commit()
+    return chat
+
+
+def test_message_endpoints_do_not_load_participants(
+    client, crowd, auth_headers, count_queries
+):
+    with count_queries() as counter:
+        assert client.get(
+            f"/api/v1/messages/chat/{crowd.id}", headers=auth_headers
+        ).status_code == 200
+        assert client.post(
+            "/api/v1/messages/", json={"content": "hi", "chat_id": crowd.id},
+            headers=auth_headers,
+        ).status_code == 200
+
+    queries = _membership_queries(counter)
+    assert len(queries) == 2
+    assert all("EXISTS" in q for q in queries)
+    assert not any("FROM users" in s and "user_chat" in s for s in counter.statements)
+
+
+def test_get_chat_checks_membership_before_loading_participants(
+    client, db, crowd, count_queries
+):
+    from app.core.security import create_access_token
+
+    db.add(User(email="eve@example.com", username="eve", hashed_password="x"))
+    db.commit()
+    eve = {"Authorization": f"Bearer {create_access_token(data={'sub': 'eve'})}"}
+
+    with count_queries() as counter:
+        assert client.get(f"/api/v1/chats/{crowd.id}", headers=eve).status_code == 403
+    assert not any("FROM users" in s and "user_chat" in s for s in counter.statements)
+
+
+async def test_membership_is_memoized_per_session(db, chat, user, count_queries):
+    async with AsyncSessionLocal() as session:
+        with count_queries() as counter:
+            assert await MembershipService.is_member(session, chat.id, user.id)
+            assert await MembershipService.is_member(session, chat.id, user.id)
+            assert not await MembershipService.is_member(session, chat.id, user.id + 1)
+    assert len(_membership_queries(counter)) == 2
+
+    # Новая сессия - новый запрос: памятка не переживает сессию
+    async with AsyncSessionLocal() as session:
+        with count_queries() as counter:
+            assert await MembershipService.is_member(session, chat.id, user.id)
+    assert len(_membership_queries(counter)) == 1
+
+
+def test_membership_cache_is_invalidated_on_removal(
+    client, db, chat, count_queries, monkeypatch
+):
+    from app.core.security import create_access_token
+
+    monkeypatch.setattr(membership_cache, "ttl", 30)
+    bob = User(email="bob@example.com", username="bob", hashed_password="x")
+    db.add(bob)
+    db.commit()
+    ChatService.add_participant(db, chat, bob.id)
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'bob'})}"}
+    url = f"/api/v1/messages/chat/{chat.id}"
+
+    assert client.get(url, headers=headers).status_code == 200
+    with count_queries() as counter:
+        assert client.get(url, headers=headers).status_code == 200
+    assert _membership_queries(counter) == []
+
+    ChatService.remove_participant(db, chat, bob.id)
+    assert membership_cache.get((chat.id, bob.id)) is None
+    assert client.get(url, headers=headers).status_code == 403
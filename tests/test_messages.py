@@ -0,0 +1,335 @@
+import asyncio
+import time
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.core.security import create_access_token
+from app.models.user import User
+from app.schemas.message import Message as MessageSchema, MessageCreate
+from app.schemas.user import User as UserSchema
+from app.services.ingest import MessageIngestBuffer
+from app.services.message import MessageService, encode_cursor, decode_cursor
+
+
+def test_first_page_is_newest_first(db, chat, make_messages):
+    messages = make_messages(10)
+    page = MessageService.get_chat_messages(db, chat_id=chat.id, limit=4)
+    assert [m.id for m in page] == [m.id for m in messages[:4]]
+
+
+def test_before_id_walks_to_older_messages(db, chat, make_messages):
+    messages = make_messages(10)
+    seen = []
+    before_id = None
+    while True:
+        page = MessageService.get_chat_messages(
+            db, chat_id=chat.id, before_id=before_id, limit=3
+        )
+        if not page:
+            break
+        seen.extend(m.id for m in page)
+        before_id = page[-1].id
+    assert seen == [m.id for m in messages]
+
+
+def test_after_id_returns_newer_messages_in_same_order(db, chat, make_messages):
+    messages = make_messages(10)
+    anchor = messages[6]
+    page = MessageService.get_chat_messages(
+        db, chat_id=chat.id, after_id=anchor.id, limit=3
+    )
+    assert [m.id for m in page] == [m.id for m in messages[3:6]]
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("before", 42)) == ("before", 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_pagination_uses_chat_id_id_index(db, chat, make_messages):
+    make_messages(3)
+    plan = db.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN SELECT * FROM messages "
+        "WHERE chat_id = 1 AND id < 100 ORDER BY id DESC LIMIT 50"
+    ).all()
+    assert any("ix_messages_chat_id_id" in row[-1] for row in plan)
+
+
+def test_serializing_a_page_takes_fixed_number_of_queries(
+    db, chat, user, make_messages, count_queries
+):
+    other = User(email="bob@example.com", username="bob", hashed_password="x")
+    db.add(other)
+    db.commit()
+    messages = make_messages(30)
+    # Длинная цепочка ответов и сообщения от разных отправителей
+    for older, newer in zip(messages[1:], messages):
+        newer.reply_to_id = older.id
+    for message in messages[::2]:
+        message.sender_id = other.id
+    db.commit()
+    chat_id, reply_id = chat.id, messages[1].id
+    db.expunge_all()
+
+    with count_queries() as counter:
+        page = MessageService.get_chat_messages(db, chat_id=chat_id, limit=20)
+        payload = [MessageSchema.model_validate(m) for m in page]
+
+    assert len(payload) == 20
+    assert counter.count == 2
+    assert payload[0].reply_to.id == reply_id
+    assert payload[0].reply_to.sender.username == "alice"
+    assert not hasattr(payload[0].reply_to, "reply_to")
+
+
+def _receive_message(websocket, types=("message.created",)):
+    # События присутствия идут в том же потоке - пропускаем их
+    while True:
+        frame = websocket.receive_json()
+        if frame["type"] in types:
+            return frame if frame["type"] != "message.created" else frame["data"]
+
+
+def test_rest_message_is_pushed_to_websocket_subscribers(client, chat, auth_headers):
+    with client.websocket_connect(
+        f"/api/v1/messages/ws/{chat.id}", headers=auth_headers
+    ) as websocket:
+        response = client.post(
+            "/api/v1/messages/",
+            json={"content": "hello", "chat_id": chat.id},
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        pushed = _receive_message(websocket)
+
+    assert pushed["id"] == response.json()["id"]
+    assert pushed["content"] == "hello"
+    assert pushed["sender"]["username"] == "alice"
+
+
+def test_post_does_not_wait_for_delivery(client, chat, auth_headers, monkeypatch):
+    from app.core.websocket import manager
+
+    async def slow_publish(chat_id, data):
+        await asyncio.sleep(1.0)
+
+    monkeypatch.setattr(manager.backend, "publish", slow_publish)
+    start = time.perf_counter()
+    response = client.post(
+        "/api/v1/messages/",
+        json={"content": "hello", "chat_id": chat.id},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    assert time.perf_counter() - start < 0.5
+
+
+def test_websocket_rejects_missing_token(client, chat):
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with client.websocket_connect(f"/api/v1/messages/ws/{chat.id}"):
+            pass
+    assert exc.value.code == 1008
+
+
+def test_websocket_rejects_non_participant(client, db, chat):
+    db.add(User(email="eve@example.com", username="eve", hashed_password="x"))
+    db.commit()
+    token = create_access_token(data={"sub": "eve"})
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(f"/api/v1/messages/ws/{chat.id}?token={token}"):
+            pass
+
+
+def test_websocket_frames_are_persisted_and_broadcast(client, db, chat, user):
+    token = create_access_token(data={"sub": user.username})
+    with client.websocket_connect(f"/api/v1/messages/ws/{chat.id}?token={token}") as websocket:
+        websocket.send_text("plain text")
+        websocket.send_json({"content": "as json"})
+        pushed = [_receive_message(websocket), _receive_message(websocket)]
+
+    assert [m["content"] for m in pushed] == ["plain text", "as json"]
+    assert all(m["sender_id"] == user.id for m in pushed)
+    stored = MessageService.get_chat_messages(db, chat_id=chat.id)
+    assert [m.id for m in stored] == [pushed[1]["id"], pushed[0]["id"]]
+
+
+async def test_ingest_buffer_commits_in_batches(db, chat, user, count_queries):
+    buffer = MessageIngestBuffer(max_rows=4, max_delay_ms=50)
+    sender = UserSchema.model_validate(user)
+
+    with count_queries() as counter:
+        stored = await asyncio.gather(*(
+            buffer.submit(MessageCreate(content=f"m{i}", chat_id=chat.id), sender)
+            for i in range(10)
+        ))
+
+    inserts = [s for s in counter.statements if s.startswith("INSERT")]
+    # Две полные пачки по 4 и остаток по таймеру
+    assert len(inserts) == 3
+    assert [m.content for m in stored] == [f"m{i}" for i in range(10)]
+    assert [m.id for m in stored] == sorted(m.id for m in stored)
+    assert all(m.sender.username == "alice" for m in stored)
+    db.expire_all()
+    assert len(MessageService.get_chat_messages(db, chat_id=chat.id)) == 10
+
+
+async def test_ingest_buffer_flush_writes_pending_messages(db, chat, user):
+    buffer = MessageIngestBuffer(max_rows=100, max_delay_ms=60_000)
+    pending = asyncio.create_task(buffer.submit(
+        MessageCreate(content="late", chat_id=chat.id), UserSchema.model_validate(user)
+    ))
+    await asyncio.sleep(0)
+    await buffer.close()
+    assert (await pending).content == "late"
+
+
+async def test_ingest_buffer_fails_only_the_bad_row(db, chat, user, monkeypatch):
+    from app.services.message import AsyncMessageService
+
+    create_many = AsyncMessageService.create_many
+
+    async def reject_bad(session, messages_in):
+        if any(message_in.content == "bad" for message_in, _ in messages_in):
+            raise ValueError("bad row")
+        return await create_many(session, messages_in)
+
+    monkeypatch.setattr(AsyncMessageService, "create_many", staticmethod(reject_bad))
+    buffer = MessageIngestBuffer(max_rows=3, max_delay_ms=50)
+    sender = UserSchema.model_validate(user)
+    results = await asyncio.gather(*(
+        buffer.submit(MessageCreate(content=content, chat_id=chat.id), sender)
+        for content in ("good 1", "bad", "good 2")
+    ), return_exceptions=True)
+
+    assert [r.content for r in (results[0], results[2])] == ["good 1", "good 2"]
+    assert isinstance(results[1], ValueError)
+    db.expire_all()
+    assert [m.content for m in MessageService.get_chat_messages(db, chat_id=chat.id)] == [
+        "good 2", "good 1"
+    ]
+
+
+async def test_ingest_buffer_returns_the_same_shape_as_direct_writes(db, chat, user, make_messages):
+    from app.db.database import AsyncSessionLocal
+    from app.services.message import AsyncMessageService
+
+    [quoted] = make_messages(1)
+    message_in = MessageCreate(content="reply", chat_id=chat.id, reply_to_id=quoted.id)
+    async with AsyncSessionLocal() as session:
+        direct = MessageSchema.model_validate(
+            await AsyncMessageService.create(session, message_in, user.id)
+        )
+    buffered = await MessageIngestBuffer(max_rows=1).submit(
+        message_in, UserSchema.model_validate(user)
+    )
+
+    assert buffered.reply_to.id == quoted.id
+    assert buffered.reply_to.sender.username == "alice"
+    exclude = {"id", "seq", "created_at"}
+    assert buffered.model_dump(exclude=exclude) == direct.model_dump(exclude=exclude)
+
+
+def test_seq_is_allocated_per_chat(db, user, chat):
+    from app.models.chat import Chat
+
+    other = Chat(name="other", creator_id=user.id)
+    db.add(other)
+    db.commit()
+    first = MessageService.create(db, MessageCreate(content="a", chat_id=chat.id), user.id)
+    rows = MessageService.create_many(db, [
+        (MessageCreate(content="b", chat_id=chat.id), user.id),
+        (MessageCreate(content="c", chat_id=other.id), user.id),
+        (MessageCreate(content="d", chat_id=chat.id), user.id),
+    ])
+
+    assert first.seq == 1
+    assert [seq for _, _, seq in rows] == [2, 1, 3]
+    db.expire_all()
+    assert (chat.last_seq, other.last_seq) == (3, 1)
+
+
+def test_websocket_reconnect_receives_missed_messages(client, db, chat, user, auth_headers):
+    url = f"/api/v1/messages/ws/{chat.id}"
+    with client.websocket_connect(url, headers=auth_headers) as websocket:
+        websocket.send_text("seen")
+        seen = _receive_message(websocket)
+    # Пока клиент отключён, сообщения приходят через REST
+    for content in ("missed 1", "missed 2"):
+        client.post(
+            "/api/v1/messages/",
+            json={"content": content, "chat_id": chat.id},
+            headers=auth_headers,
+        )
+
+    with client.websocket_connect(
+        f"{url}?last_seq={seen['seq']}", headers=auth_headers
+    ) as websocket:
+        replayed = [
+            _receive_message(websocket, types=("message.created", "replay")) for _ in range(3)
+        ]
+
+    assert [m.get("content") for m in replayed[:2]] == ["missed 1", "missed 2"]
+    assert [m["seq"] for m in replayed[:2]] == [seen["seq"] + 1, seen["seq"] + 2]
+    assert replayed[2] == {
+        "type": "replay",
+        "chat_id": chat.id,
+        "data": {"last_seq": seen["seq"] + 2, "complete": True},
+    }
+
+
+def test_websocket_msgpack_subprotocol(client, chat, user, auth_headers):
+    import msgpack
+
+    with client.websocket_connect(
+        f"/api/v1/messages/ws/{chat.id}",
+        headers=auth_headers,
+        subprotocols=["pet-chat.msgpack"],
+    ) as websocket:
+        websocket.send_bytes(msgpack.packb({"content": "packed"}))
+        while True:
+            frame = msgpack.unpackb(websocket.receive_bytes())
+            if frame["type"] == "message.created":
+                break
+
+    assert frame["chat_id"] == chat.id
+    assert frame["data"]["content"] == "packed"
+    assert frame["data"]["sender"]["username"] == "alice"
+
+
+@pytest.mark.parametrize("payload", [{b"content": "bin key"}, {1: "int key"}])
+def test_websocket_msgpack_map_with_bad_keys_gets_error_event(
+    client, chat, auth_headers, payload
+):
+    import msgpack
+
+    with client.websocket_connect(
+        f"/api/v1/messages/ws/{chat.id}",
+        headers=auth_headers,
+        subprotocols=["pet-chat.msgpack"],
+    ) as websocket:
+        websocket.send_bytes(msgpack.packb(payload))
+        while True:
+            frame = msgpack.unpackb(websocket.receive_bytes())
+            if frame["type"] == "error":
+                break
+        # Сокет жив: следующий кадр обрабатывается как обычно
+        websocket.send_bytes(msgpack.packb({"content": "still here"}))
+        while True:
+            created = msgpack.unpackb(websocket.receive_bytes())
+            if created["type"] == "message.created":
+                break
+
+    assert frame["chat_id"] == chat.id
+    assert created["data"]["content"] == "still here"
+
+
+def test_websocket_invalid_frame_gets_error_event(client, chat, auth_headers):
+    with client.websocket_connect(
+        f"/api/v1/messages/ws/{chat.id}", headers=auth_headers
+    ) as websocket:
+        websocket.send_json({"content": ""})
+        error = _receive_message(websocket, types=("error",))
+    assert error["chat_id"] == chat.id
+    assert error["data"][0]["loc"] == ["content"]
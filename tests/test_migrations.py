@@ -0,0 +1,176 @@
+import os
+import sqlite3
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine
+
+from app.core.config import settings
+from app.db.database import Base
+from app.scripts import backfill_message_seq
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Схема до миграции 3f1c2a9d7b10: две таблицы участников
+OLD_SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR);
+CREATE TABLE chats (
+    id INTEGER PRIMARY KEY, name VARCHAR NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), updated_at DATETIME, creator_id INTEGER
+);
+CREATE TABLE user_chat (
+    user_id INTEGER NOT NULL, chat_id INTEGER NOT NULL,
+    last_read_message_id INTEGER DEFAULT '0' NOT NULL,
+    PRIMARY KEY (user_id, chat_id)
+);
+CREATE TABLE messages (
+    id INTEGER PRIMARY KEY, content VARCHAR NOT NULL, chat_id INTEGER, sender_id INTEGER,
+    updated_at DATETIME
+);
+CREATE TABLE chat_participants (
+    chat_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+    joined_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+    PRIMARY KEY (chat_id, user_id)
+);
+INSERT INTO users (id, username) VALUES (1, 'alice'), (2, 'bob'), (3, 'carol');
+INSERT INTO chats (id, name, created_at, creator_id) VALUES (1, 'general', '2024-01-01 00:00:00', 1);
+INSERT INTO user_chat VALUES (1, 1, 5), (2, 1, 0);
+INSERT INTO messages (id, content, chat_id, sender_id) VALUES (4, 'hi', 1, 1), (5, 'hey', 1, 2);
+INSERT INTO chat_participants VALUES (1, 2, '2024-02-02 00:00:00'), (1, 3, '2024-03-03 00:00:00');
+"""
+
+# Схема, которую create_all строил до всех миграций (без данных сводок,
+# номеров, поиска и ролей)
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER NOT NULL, email VARCHAR, username VARCHAR, hashed_password VARCHAR,
+    is_active BOOLEAN, PRIMARY KEY (id)
+);
+CREATE INDEX ix_users_id ON users (id);
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE TABLE chats (
+    id INTEGER NOT NULL, name VARCHAR NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), updated_at DATETIME, creator_id INTEGER,
+    PRIMARY KEY (id), FOREIGN KEY(creator_id) REFERENCES users (id)
+);
+CREATE INDEX ix_chats_id ON chats (id);
+CREATE TABLE user_chat (
+    user_id INTEGER NOT NULL, chat_id INTEGER NOT NULL, PRIMARY KEY (user_id, chat_id),
+    FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(chat_id) REFERENCES chats (id)
+);
+CREATE TABLE chat_participants (
+    chat_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+    joined_at DATETIME DEFAULT (CURRENT_TIMESTAMP), PRIMARY KEY (chat_id, user_id),
+    FOREIGN KEY(chat_id) REFERENCES chats (id), FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE TABLE messages (
+    id INTEGER NOT NULL, content VARCHAR NOT NULL, message_type VARCHAR(5), chat_id INTEGER,
+    sender_id INTEGER, reply_to_id INTEGER, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+    updated_at DATETIME, is_edited BOOLEAN, PRIMARY KEY (id),
+    FOREIGN KEY(chat_id) REFERENCES chats (id) ON DELETE CASCADE,
+    FOREIGN KEY(sender_id) REFERENCES users (id),
+    FOREIGN KEY(reply_to_id) REFERENCES messages (id)
+);
+CREATE INDEX ix_messages_id ON messages (id);
+INSERT INTO users (id, username) VALUES (1, 'alice');
+INSERT INTO chats (id, name, creator_id) VALUES (1, 'general', 1);
+INSERT INTO user_chat VALUES (1, 1);
+INSERT INTO messages (id, content, chat_id, sender_id) VALUES (1, 'old news', 1, 1);
+"""
+
+
+def _include_object(object, name, type_, reflected, compare_to):
+    # Как в alembic/env.py: таблиц FTS5 нет в моделях
+    return not (type_ == "table" and reflected and name.startswith("messages_fts"))
+
+
+def _alembic(monkeypatch, path, action, revision):
+    # Без alembic.ini: env.py не перенастраивает логирование, URL - из settings
+    config = Config()
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{path}")
+    getattr(command, action)(config, revision)
+
+
+def test_participant_tables_migration_backfills_and_reverts(tmp_path, monkeypatch):
+    path = tmp_path / "old.db"
+    with sqlite3.connect(path) as connection:
+        connection.executescript(OLD_SCHEMA)
+
+    _alembic(monkeypatch, path, "upgrade", "head")
+    with sqlite3.connect(path) as connection:
+        rows = connection.execute(
+            "SELECT user_id, last_read_message_id, joined_at, role FROM user_chat ORDER BY user_id"
+        ).fetchall()
+        tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master")}
+        ddl = connection.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'user_chat'"
+        ).fetchone()[0]
+        roles = connection.execute("SELECT DISTINCT role FROM users").fetchall()
+        chat_columns = {row[1] for row in connection.execute("PRAGMA table_info(chats)")}
+    assert rows == [
+        (1, 5, "2024-01-01 00:00:00", "OWNER"),
+        (2, 0, "2024-02-02 00:00:00", "MEMBER"),
+        (3, 0, "2024-03-03 00:00:00", "MEMBER"),
+    ]
+    assert "chat_participants" not in tables
+    assert "ix_user_chat_chat_id_user_id" in tables
+    assert "ix_messages_chat_id_id" in tables
+    assert "WITHOUT ROWID" in ddl
+    assert roles == [("USER",)]
+    assert {"last_message_id", "last_message_preview", "last_message_at"} <= chat_columns
+    assert "last_seq" in chat_columns
+    assert "ix_messages_chat_id_seq" in tables
+
+    # Данные нумерует скрипт, схему он уже не трогает
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        backfill_message_seq.check_schema(connection)
+        backfill_message_seq.backfill(connection)
+    engine.dispose()
+    with sqlite3.connect(path) as connection:
+        assert connection.execute(
+            "SELECT id, seq, updated_at FROM messages ORDER BY id"
+        ).fetchall() == [(4, 1, None), (5, 2, None)]
+        assert connection.execute("SELECT last_seq FROM chats").fetchall() == [(2,)]
+
+    # Откат до ревизии перед слиянием таблиц участников
+    _alembic(monkeypatch, path, "downgrade", "4c9a5e7b1d42")
+    with sqlite3.connect(path) as connection:
+        assert connection.execute(
+            "SELECT chat_id, user_id FROM chat_participants ORDER BY user_id"
+        ).fetchall() == [(1, 1), (1, 2), (1, 3)]
+        assert connection.execute(
+            "SELECT user_id, last_read_message_id FROM user_chat ORDER BY user_id"
+        ).fetchall() == [(1, 5), (2, 0), (3, 0)]
+
+    _alembic(monkeypatch, path, "downgrade", "base")
+    with sqlite3.connect(path) as connection:
+        chat_columns = {row[1] for row in connection.execute("PRAGMA table_info(chats)")}
+        message_columns = {row[1] for row in connection.execute("PRAGMA table_info(messages)")}
+    assert "last_message_id" not in chat_columns
+    assert "last_seq" not in chat_columns
+    assert "seq" not in message_columns
+
+
+def test_upgrade_head_brings_a_pre_series_database_to_the_model_schema(tmp_path, monkeypatch):
+    path = tmp_path / "baseline.db"
+    with sqlite3.connect(path) as connection:
+        connection.executescript(BASELINE_SCHEMA)
+
+    _alembic(monkeypatch, path, "upgrade", "head")
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.connect() as connection:
+        context = MigrationContext.configure(
+            connection, opts={"include_object": _include_object, "compare_type": True}
+        )
+        assert compare_metadata(context, Base.metadata) == []
+    engine.dispose()
+    # Поисковый индекс создан и заполнен уже лежащими сообщениями
+    with sqlite3.connect(path) as connection:
+        assert connection.execute(
+            "SELECT rowid FROM messages_fts WHERE messages_fts MATCH 'news'"
+        ).fetchall() == [(1,)]
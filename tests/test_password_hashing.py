@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+import pytest
+from passlib.context import CryptContext
+
+from app.core import security
+from app.core.security import PasswordHasher, PasswordHashingBusy
+from app.models.user import User
+
+
+def test_login_rehashes_outdated_hash(client, db):
+    # Хэш с меньшим числом раундов, чем в текущем pwd_context
+    weak = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    old_hash = weak.hash("secret123")
+    db.add(User(email="bob@example.com", username="bob", hashed_password=old_hash))
+    db.commit()
+
+    response = client.post(
+        "/api/v1/auth/login", data={"username": "bob", "password": "secret123"}
+    )
+    assert response.status_code == 200
+
+    db.expire_all()
+    new_hash = db.query(User).filter(User.username == "bob").one().hashed_password
+    assert new_hash != old_hash
+    assert not security.pwd_context.needs_update(new_hash)
+    assert security.pwd_context.verify("secret123", new_hash)
+
+
+def test_login_with_wrong_password(client, db):
+    db.add(User(
+        email="bob@example.com",
+        username="bob",
+        hashed_password=security.get_password_hash("secret123"),
+    ))
+    db.commit()
+
+    response = client.post(
+        "/api/v1/auth/login", data={"username": "bob", "password": "nope"}
+    )
+    assert response.status_code == 401
+
+
+def test_hasher_rejects_when_queue_is_full():
+    hasher = PasswordHasher(max_workers=1, max_queue=1)
+
+    async def scenario():
+        busy = [asyncio.create_task(hasher.hash("secret")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordHashingBusy):
+            await hasher.hash("secret")
+        await asyncio.gather(*busy)
+        # Очередь освободилась - снова принимаем работу
+        assert await hasher.hash("secret")
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_request_keeps_its_slot_until_hashing_ends():
+    hasher = PasswordHasher(max_workers=1, max_queue=0)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    async def scenario():
+        waiter = asyncio.create_task(hasher._run(slow))
+        await asyncio.to_thread(started.wait, 5)
+        # Клиент ушёл, но bcrypt в пуле продолжает считать
+        waiter.cancel()
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordHashingBusy):
+            await hasher._run(slow)
+        release.set()
+        for _ in range(100):
+            if hasher._in_flight == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert await hasher._run(lambda: "free") == "free"
+
+    asyncio.run(scenario())
+
+
+def test_login_returns_503_when_hasher_is_busy(client, db, user, monkeypatch):
+    async def busy(*args):
+        raise PasswordHashingBusy()
+
+    monkeypatch.setattr(security.password_hasher, "_run", busy)
+    response = client.post(
+        "/api/v1/auth/login", data={"username": "alice", "password": "x"}
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
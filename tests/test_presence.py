@@ -0,0 +1,166 @@
+import asyncio
+import json
+
+from app.core.presence import MemoryPresenceStore, PresenceTracker, RedisPresenceStore
+from app.core.websocket import ConnectionManager
+from tests.test_websocket import FakeWebSocket, _settle
+
+
+def _tracker(**kwargs):
+    kwargs.setdefault("flush_interval", 3600)
+    tracker = PresenceTracker(MemoryPresenceStore(), **kwargs)
+    events = []
+
+    async def publish(chat_id, event):
+        events.append(event)
+
+    tracker.bind(publish)
+    return tracker, events
+
+
+async def test_typing_bursts_are_coalesced_into_one_event_per_chat():
+    tracker, events = _tracker()
+    for user_id in range(1, 51):
+        await tracker.connect(user_id, 1)
+    await tracker.flush()
+    events.clear()
+
+    for _ in range(20):
+        for user_id in range(1, 51):
+            tracker.typing(user_id, 1)
+    await tracker.flush()
+
+    assert len(events) == 1
+    assert events[0]["data"]["typing"] == {user_id: True for user_id in range(1, 51)}
+    assert events[0]["data"]["statuses"] == {}
+
+
+async def test_status_flapping_within_interval_sends_latest_state_only():
+    tracker, events = _tracker()
+    await tracker.connect(1, 1)
+    await tracker.connect(2, 1)
+    await tracker.flush()
+    events.clear()
+
+    await tracker.disconnect(2, 1)
+    await tracker.connect(2, 1)
+    await tracker.flush()
+
+    assert [event["data"]["statuses"] for event in events] == [{2: "online"}]
+
+
+async def test_connections_are_refcounted_per_user():
+    tracker, events = _tracker()
+    await tracker.connect(1, 1)
+    await tracker.connect(1, 1)
+    await tracker.disconnect(1, 1)
+    assert tracker.status(1) == "online"
+
+    await tracker.disconnect(1, 1)
+    assert tracker.status(1) == "offline"
+    await tracker.flush()
+    assert events[-1]["data"]["statuses"] == {1: "offline"}
+
+
+async def test_typing_expires_and_message_clears_it():
+    tracker, events = _tracker(typing_ttl=0.01)
+    await tracker.connect(1, 1)
+    tracker.typing(1, 1)
+    await tracker.flush()
+    assert tracker.snapshot(1)["data"]["typing"] == {1: True}
+
+    await asyncio.sleep(0.02)
+    await tracker.flush()
+    assert events[-1]["data"]["typing"] == {1: False}
+    assert tracker.snapshot(1)["data"]["typing"] == {}
+
+
+async def test_silent_user_turns_away_until_next_frame():
+    tracker, events = _tracker(heartbeat_ttl=0.01)
+    await tracker.connect(1, 1)
+    await asyncio.sleep(0.02)
+    await tracker.flush()
+    assert tracker.status(1) == "away"
+    assert events[-1]["data"]["statuses"] == {1: "away"}
+
+    tracker.touch(1)
+    await tracker.flush()
+    assert events[-1]["data"]["statuses"] == {1: "online"}
+
+
+async def test_manager_sends_snapshot_and_broadcasts_flushed_diffs():
+    tracker = PresenceTracker(MemoryPresenceStore(), flush_interval=0.01)
+    manager = ConnectionManager(presence=tracker)
+    alice, bob = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(alice, 1, user_id=1)
+    await manager.connect(bob, 1, user_id=2)
+    await _settle()
+    snapshot = json.loads(bob.sent[0])
+    assert snapshot["data"]["statuses"] == {"1": "online", "2": "online"}
+
+    tracker.typing(2, 1)
+    await asyncio.sleep(0.05)
+    events = [json.loads(m) for m in alice.sent if json.loads(m).get("type") == "presence"]
+    assert any(event["data"]["typing"] == {"2": True} for event in events)
+
+    await manager.disconnect(bob, 1)
+    await asyncio.sleep(0.05)
+    assert json.loads(alice.sent[-1])["data"]["statuses"] == {"2": "offline"}
+    await manager.close()
+
+
+async def test_redis_store_keeps_user_online_while_another_worker_holds_it(redis_url):
+    first = RedisPresenceStore(redis_url, ttl=30, key_prefix="test-presence:")
+    second = RedisPresenceStore(redis_url, ttl=30, key_prefix="test-presence:")
+    try:
+        await first.add(7)
+        await second.add(7)
+        await first.remove(7)
+        assert await first.online([7, 8]) == {7}
+        await second.remove(7)
+        assert await first.online([7]) == set()
+    finally:
+        await first.close()
+        await second.close()
+
+
+def test_websocket_typing_frame_reaches_other_participants(client, chat, user, auth_headers):
+    with client.websocket_connect(
+        f"/api/v1/messages/ws/{chat.id}", headers=auth_headers
+    ) as websocket:
+        snapshot = websocket.receive_json()
+        assert snapshot["type"] == "presence"
+        assert snapshot["data"]["statuses"] == {str(user.id): "online"}
+
+        websocket.send_json({"type": "typing", "active": True})
+        while True:
+            event = websocket.receive_json()
+            if event["type"] == "presence" and event["data"]["typing"]:
+                break
+    assert event["data"]["typing"] == {str(user.id): True}
+
+
+def test_websocket_is_released_when_storing_a_message_fails(
+    client, chat, user, auth_headers, monkeypatch
+):
+    import pytest
+    from sqlalchemy.exc import OperationalError
+
+    from app.api.endpoints import message as message_endpoint
+    from app.core.websocket import manager
+
+    async def locked(frame, sender):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(message_endpoint, "_store_message", locked)
+    with pytest.raises(OperationalError):
+        with client.websocket_connect(
+            f"/api/v1/messages/ws/{chat.id}", headers=auth_headers
+        ) as websocket:
+            websocket.receive_json()
+            assert chat.id in manager.active_connections
+            websocket.send_text("hello")
+            websocket.receive_json()
+
+    assert chat.id not in manager.active_connections
+    assert manager.presence.status(user.id) == "offline"
@@ -0,0 +1,78 @@
+import time
+
+from app.core.cache import TTLCache, principal_cache
+from app.schemas.user import UserUpdate
+from app.services.user import UserService
+
+
+def _user_queries(counter):
+    return [s for s in counter.statements if "FROM users" in s]
+
+
+def test_authenticated_requests_reuse_cached_principal(client, chat, auth_headers, count_queries):
+    with count_queries() as first:
+        assert client.get("/api/v1/chats/", headers=auth_headers).status_code == 200
+    assert len(_user_queries(first)) == 1
+
+    with count_queries() as second:
+        response = client.get("/api/v1/chats/", headers=auth_headers)
+    assert response.status_code == 200
+    assert [c["id"] for c in response.json()] == [chat.id]
+    assert _user_queries(second) == []
+
+
+def test_user_update_invalidates_principal(client, db, user, auth_headers):
+    assert client.get("/api/v1/chats/", headers=auth_headers).status_code == 200
+    assert principal_cache.get("alice") is not None
+
+    UserService.update(db, user, UserUpdate(username="alice2"))
+    assert principal_cache.get("alice") is None
+
+    # Токен со старым username больше не должен проходить
+    assert client.get("/api/v1/chats/", headers=auth_headers).status_code == 401
+
+
+def test_principal_cache_holds_no_password_hash(client, chat, auth_headers):
+    assert client.get("/api/v1/chats/", headers=auth_headers).status_code == 200
+    assert principal_cache.get("alice") == {
+        "id": 1, "username": "alice", "email": "alice@example.com",
+        "is_active": True, "role": "USER",
+    }
+
+
+def test_login_rehash_invalidates_principal(client, db, user, auth_headers):
+    from passlib.context import CryptContext
+
+    user.hashed_password = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("secret123")
+    db.commit()
+    assert client.get("/api/v1/chats/", headers=auth_headers).status_code == 200
+    assert principal_cache.get("alice") is not None
+
+    response = client.post(
+        "/api/v1/auth/login", data={"username": "alice", "password": "secret123"}
+    )
+    assert response.status_code == 200
+    assert principal_cache.get("alice") is None
+
+
+def test_ttl_cache_expires_and_evicts(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = TTLCache(ttl=10, max_size=2)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    # "b" - самый давно использованный, его и вытесняем
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+    now[0] += 11
+    assert cache.get("a") is None
+
+
+def test_ttl_cache_disabled_with_zero_ttl():
+    cache = TTLCache(ttl=0, max_size=10)
+    cache.set("a", 1)
+    assert cache.get("a") is None
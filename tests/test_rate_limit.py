@@ -0,0 +1,175 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.core import rate_limit
+from app.core.middleware import WS_RATE_LIMIT_CLOSE_CODE, RateLimitMiddleware
+from app.core.rate_limit import (
+    MemoryRateLimitBackend,
+    RateLimiter,
+    RedisRateLimitBackend,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [600.0]  # начало минутного окна
+    monkeypatch.setattr(rate_limit.time, "time", lambda: now[0])
+    return now
+
+
+async def _hits(backend, key, count, limit=3, window=60):
+    return [await backend.hit(key, limit, window) for _ in range(count)]
+
+
+async def test_memory_backend_blocks_over_limit(clock):
+    backend = MemoryRateLimitBackend()
+    results = await _hits(backend, "k", 4)
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results[:3]] == [2, 1, 0]
+    assert results[3].retry_after == pytest.approx(60)
+
+
+async def test_previous_window_is_weighted(clock):
+    backend = MemoryRateLimitBackend()
+    await _hits(backend, "k", 3)
+
+    # Четверть следующего окна: предыдущее ещё весит 0.75 * 3 = 2.25
+    clock[0] += 75
+    assert not (await backend.hit("k", 3, 60)).allowed
+    # Половина окна: вес 1.5, один запрос проходит
+    clock[0] += 15
+    assert [r.allowed for r in await _hits(backend, "k", 2)] == [True, False]
+
+
+async def test_idle_keys_are_evicted(clock):
+    backend = MemoryRateLimitBackend()
+    for i in range(100):
+        await backend.hit(f"ip:{i}", 3, 60)
+    assert len(backend) == 100
+
+    clock[0] += 120
+    await backend.hit("ip:fresh", 3, 60)
+    assert len(backend) == 1
+
+
+async def test_memory_backend_is_bounded(clock):
+    backend = MemoryRateLimitBackend(max_keys=10)
+    for i in range(50):
+        await backend.hit(f"ip:{i}", 3, 60)
+    assert len(backend) == 10
+
+
+async def test_limits_per_route_and_per_user(clock):
+    limiter = RateLimiter(
+        MemoryRateLimitBackend(),
+        anonymous_limit=2,
+        user_limit=5,
+        route_limits={"/api/v1/auth/login": 1},
+    )
+    assert [
+        (await limiter.hit("/api/v1/auth/login", "1.1.1.1")).allowed for _ in range(2)
+    ] == [True, False]
+    # Лимит маршрута не расходует общий
+    assert (await limiter.hit("/api/v1/chats/", "1.1.1.1")).limit == 2
+    # Пользователь считается отдельно от своего IP и со своим лимитом
+    result = await limiter.hit("/api/v1/chats/", "1.1.1.1", user="alice")
+    assert (result.allowed, result.limit, result.remaining) == (True, 5, 4)
+
+
+async def test_redis_backend_is_shared_between_instances(redis_url, clock):
+    first = RedisRateLimitBackend(redis_url, key_prefix=f"test:{time.perf_counter()}:")
+    second = RedisRateLimitBackend(redis_url, key_prefix=first._prefix)
+    try:
+        results = [await first.hit("k", 3, 60), await second.hit("k", 3, 60),
+                   await first.hit("k", 3, 60), await second.hit("k", 3, 60)]
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert results[3].retry_after == pytest.approx(60)
+
+        clock[0] += 90
+        assert [r.allowed for r in await _hits(second, "k", 2)] == [True, False]
+    finally:
+        await first.close()
+        await second.close()
+
+
+def _limited_app(limit=2, ws_per_minute=60, ws_burst=2):
+    from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.websocket("/ws")
+    async def echo(websocket: WebSocket):
+        await websocket.accept()
+        try:
+            while True:
+                await websocket.send_text(await websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+
+    limiter = RateLimiter(MemoryRateLimitBackend(), anonymous_limit=limit, user_limit=limit)
+    app.add_middleware(
+        RateLimitMiddleware,
+        limiter=limiter,
+        ws_messages_per_minute=ws_per_minute,
+        ws_message_burst=ws_burst,
+    )
+    return app
+
+
+def test_http_over_limit_gets_429():
+    client = TestClient(_limited_app(limit=2))
+    responses = [client.get("/ping") for _ in range(3)]
+
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    assert responses[0].headers["X-RateLimit-Remaining"] == "1"
+    assert responses[2].json() == {"detail": "Too many requests. Please try again later."}
+    assert int(responses[2].headers["Retry-After"]) > 0
+
+
+def test_websocket_handshake_over_limit_is_refused():
+    client = TestClient(_limited_app(limit=1))
+    with client.websocket_connect("/ws") as ws:
+        ws.send_text("hi")
+        assert ws.receive_text() == "hi"
+
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with client.websocket_connect("/ws"):
+            pass
+    assert exc.value.code == WS_RATE_LIMIT_CLOSE_CODE
+
+
+def test_websocket_message_flood_is_closed():
+    client = TestClient(_limited_app(ws_burst=2))
+    with client.websocket_connect("/ws") as ws:
+        for text in ("a", "b"):
+            ws.send_text(text)
+            assert ws.receive_text() == text
+        ws.send_text("c")
+        message = ws.receive()
+    assert message == {
+        "type": "websocket.close",
+        "code": WS_RATE_LIMIT_CLOSE_CODE,
+        "reason": "Message rate limit exceeded",
+    }
+
+
+def test_app_limits_login_route(client):
+    responses = [
+        client.post(
+            "/api/v1/auth/login",
+            data={"username": "nobody", "password": "x"},
+            headers={"Origin": "http://localhost:5173"},
+        )
+        for _ in range(11)
+    ]
+    assert {r.status_code for r in responses[:10]} == {401}
+    assert responses[10].status_code == 429
+    # Ответ 429 проходит через CORS, иначе браузер его не прочитает
+    assert responses[10].headers["access-control-allow-origin"] == "http://localhost:5173"
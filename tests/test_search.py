@@ -0,0 +1,112 @@
+from app.models.chat import Chat
+from app.models.message import Message
+from app.models.user import User
+from app.schemas.message import MessageCreate
+from app.services.message import MessageService
+from app.services.search import MessageSearchService
+
+
+def _search(client, headers, **params):
+    response = client.get("/api/v1/messages/search", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response
+
+
+def test_search_ranks_highlights_and_escapes(client, db, chat, user, auth_headers):
+    db.add_all([
+        Message(content="deploy <b>tomorrow</b> morning", chat_id=chat.id, sender_id=user.id),
+        Message(content="deploy deploy deploy", chat_id=chat.id, sender_id=user.id),
+        Message(content="lunch?", chat_id=chat.id, sender_id=user.id),
+    ])
+    db.commit()
+
+    hits = _search(client, auth_headers, q="deploy").json()
+    assert [hit["content"] for hit in hits] == [
+        "deploy deploy deploy", "deploy <b>tomorrow</b> morning",
+    ]
+    assert hits[0]["sender"]["username"] == "alice"
+    assert hits[1]["snippet"] == "<mark>deploy</mark> &lt;b&gt;tomorrow&lt;/b&gt; morning"
+
+    # Последнее слово ищется по префиксу, операторы FTS5 не интерпретируются
+    assert len(_search(client, auth_headers, q="tomorrow mor").json()) == 1
+    assert _search(client, auth_headers, q='lunch" OR "deploy').json() == []
+
+
+def test_search_follows_inserts_edits_and_deletes(client, db, chat, user, auth_headers):
+    MessageService.create_many(db, [
+        (MessageCreate(content=f"batch item {i}", chat_id=chat.id), user.id) for i in range(3)
+    ])
+    assert len(_search(client, auth_headers, q="batch").json()) == 3
+
+    message = db.query(Message).first()
+    message.content = "renamed"
+    db.commit()
+    assert len(_search(client, auth_headers, q="batch").json()) == 2
+    assert len(_search(client, auth_headers, q="renamed").json()) == 1
+
+    MessageService.delete(db, message)
+    assert _search(client, auth_headers, q="renamed").json() == []
+
+
+def test_search_is_scoped_to_own_chats(client, db, chat, user, auth_headers):
+    eve = User(email="eve@example.com", username="eve", hashed_password="x")
+    secret = Chat(name="secret", creator=eve)
+    secret.participants.append(eve)
+    db.add(secret)
+    db.commit()
+    db.add_all([
+        Message(content="launch codes", chat_id=secret.id, sender_id=eve.id),
+        Message(content="launch party", chat_id=chat.id, sender_id=user.id),
+    ])
+    db.commit()
+
+    assert [h["content"] for h in _search(client, auth_headers, q="launch").json()] == ["launch party"]
+    response = client.get(
+        "/api/v1/messages/search", params={"q": "launch", "chat_id": secret.id}, headers=auth_headers
+    )
+    assert response.status_code == 403
+
+
+def test_search_cursor_pagination(client, make_messages, auth_headers):
+    make_messages(7)
+    seen, cursor = [], None
+    while True:
+        params = {"q": "message", "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        response = _search(client, auth_headers, **params)
+        seen.extend(hit["id"] for hit in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 7
+
+    first = _search(client, auth_headers, q="message", limit=3, order="recent")
+    second = _search(
+        client, auth_headers, q="message", limit=3, order="recent",
+        cursor=first.headers["X-Next-Cursor"],
+    )
+    ids = [hit["id"] for hit in first.json() + second.json()]
+    assert ids == sorted(seen, reverse=True)[:6]
+
+    bad = client.get(
+        "/api/v1/messages/search", params={"q": "x", "cursor": "!!"}, headers=auth_headers
+    )
+    assert bad.status_code == 400
+
+
+def test_recent_order_pages_exactly_while_messages_arrive(client, make_messages, auth_headers):
+    existing = [m.id for m in make_messages(6)]
+    first = _search(client, auth_headers, q="message", limit=3, order="recent")
+    # Новые совпадения между страницами не сдвигают продолжение
+    make_messages(4)
+    second = _search(
+        client, auth_headers, q="message", limit=3, order="recent",
+        cursor=first.headers["X-Next-Cursor"],
+    )
+    assert [hit["id"] for hit in first.json() + second.json()] == existing
+
+
+def test_match_query_quotes_terms():
+    assert MessageSearchService.match_query("Привет, мир") == '"Привет" "мир"*'
+    assert MessageSearchService.match_query("!!!") is None
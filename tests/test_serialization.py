@@ -0,0 +1,69 @@
+from typing import List
+
+import pytest
+from fastapi import Response
+
+from app.core.config import settings
+from app.core.serialization import serialize, type_adapter
+from app.schemas.message import Message
+
+
+@pytest.fixture
+def fast_json(monkeypatch):
+    def _set(enabled: bool):
+        monkeypatch.setattr(settings, "FAST_JSON_RESPONSES", enabled)
+    return _set
+
+
+@pytest.mark.parametrize("path", [
+    "/api/v1/messages/chat/{chat_id}?limit=5",
+    "/api/v1/chats/",
+    "/api/v1/users/",
+])
+def test_fast_path_matches_regular_responses(
+    client, chat, make_messages, auth_headers, fast_json, path
+):
+    make_messages(12)
+    url = path.format(chat_id=chat.id)
+
+    fast_json(False)
+    regular = client.get(url, headers=auth_headers)
+    fast_json(True)
+    fast = client.get(url, headers=auth_headers)
+
+    assert fast.status_code == regular.status_code == 200
+    assert fast.content == regular.content
+    assert fast.headers["content-type"] == regular.headers["content-type"]
+    assert fast.headers.get("x-next-cursor") == regular.headers.get("x-next-cursor")
+
+
+def test_serialize_validates_once_and_keeps_response_headers(
+    db, make_messages, fast_json, monkeypatch
+):
+    fast_json(True)
+    messages = make_messages(3)
+    adapter = type_adapter(List[Message])
+    calls = []
+    original = adapter.validate_python
+
+    def counting(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(adapter, "validate_python", counting)
+    response = Response()
+    del response.headers["content-length"]
+    response.headers["X-Next-Cursor"] = "abc"
+
+    result = serialize(List[Message], messages, response)
+
+    assert calls == [1]
+    assert result.headers["x-next-cursor"] == "abc"
+    assert result.headers["content-type"] == "application/json"
+    assert type_adapter(List[Message]) is adapter
+
+
+def test_serialize_is_a_no_op_when_disabled(fast_json):
+    fast_json(False)
+    content = [{"id": 1}]
+    assert serialize(List[Message], content) is content
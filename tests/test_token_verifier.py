@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from jose import jwt
+
+from app.core import security
+from app.core.security import TokenVerifier
+
+
+def _verifier(keys, active_kid):
+    return TokenVerifier(
+        keys=keys,
+        active_kid=active_kid,
+        algorithm="HS256",
+        cache_size=100,
+        default_expire_minutes=30,
+    )
+
+
+def test_rotated_key_keeps_old_tokens_valid():
+    old = _verifier({"k1": "secret-1"}, "k1")
+    token = old.create({"sub": "alice"})
+    assert jwt.get_unverified_header(token)["kid"] == "k1"
+
+    # Новый ключ активен, старый ещё принимается
+    rotated = _verifier({"k1": "secret-1", "k2": "secret-2"}, "k2")
+    assert rotated.verify(token)["sub"] == "alice"
+    assert jwt.get_unverified_header(rotated.create({"sub": "bob"}))["kid"] == "k2"
+
+    # Старый ключ убран - его токены больше не проходят
+    retired = _verifier({"k2": "secret-2"}, "k2")
+    assert retired.verify(token) is None
+
+
+def test_rejects_forged_expired_and_unknown_kid_tokens():
+    verifier = _verifier({"k1": "secret-1"}, "k1")
+    forged = jwt.encode({"sub": "alice"}, "other", algorithm="HS256", headers={"kid": "k1"})
+    unknown = jwt.encode({"sub": "alice"}, "secret-1", algorithm="HS256", headers={"kid": "k9"})
+    expired = verifier.create({"sub": "alice"}, expires_delta=timedelta(seconds=-1))
+
+    assert verifier.verify(forged) is None
+    assert verifier.verify(unknown) is None
+    assert verifier.verify(expired) is None
+    assert verifier.verify("not a token") is None
+
+
+def test_token_without_kid_is_checked_with_active_key():
+    verifier = _verifier({"k1": "secret-1"}, "k1")
+    legacy = jwt.encode({"sub": "alice"}, "secret-1", algorithm="HS256")
+    assert verifier.verify(legacy)["sub"] == "alice"
+
+
+def test_verified_claims_are_cached(monkeypatch):
+    verifier = _verifier({"k1": "secret-1"}, "k1")
+    token = verifier.create({"sub": "alice"})
+    assert verifier.verify(token)["sub"] == "alice"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("signature checked twice")
+
+    monkeypatch.setattr(security.jwt, "decode", fail)
+    assert verifier.verify(token)["sub"] == "alice"
@@ -0,0 +1,288 @@
+import asyncio
+import json
+import multiprocessing
+
+import msgpack
+
+from app.core.events import negotiate
+from app.core.websocket import ConnectionManager, RedisBroadcastBackend
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0):
+        self.sent = []
+        self.accepted = False
+        self.closed_with = None
+        self.delay = delay
+
+    async def accept(self, subprotocol=None):
+        self.accepted = True
+        self.subprotocol = subprotocol
+
+    async def send_text(self, data):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        await self.send_text(data)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def _settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+async def test_memory_backend_delivers_to_chat_sockets_only():
+    manager = ConnectionManager()
+    in_chat, other_chat = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(in_chat, 1)
+    await manager.connect(other_chat, 2)
+
+    await manager.broadcast_to_chat(1, {"content": "hi"})
+    await _settle()
+
+    assert [json.loads(m) for m in in_chat.sent] == [{"content": "hi"}]
+    assert other_chat.sent == []
+
+
+async def test_disconnect_drops_empty_chat():
+    manager = ConnectionManager()
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, 1)
+    await manager.disconnect(websocket, 1)
+    assert manager.active_connections == {}
+
+
+async def test_slow_consumer_does_not_delay_others_and_is_disconnected():
+    manager = ConnectionManager(queue_size=2, slow_consumer_policy="disconnect")
+    fast, slow = FakeWebSocket(), FakeWebSocket(delay=10)
+    await manager.connect(fast, 1)
+    await manager.connect(slow, 1)
+
+    for i in range(5):
+        await manager.broadcast_to_chat(1, {"n": i})
+        await _settle()
+
+    assert len(fast.sent) == 5
+    assert slow.closed_with == 1013
+    assert list(manager.active_connections[1]) == [fast]
+    await manager.close()
+
+
+async def test_eviction_task_is_tracked_until_done():
+    manager = ConnectionManager(queue_size=1, slow_consumer_policy="disconnect")
+    slow = FakeWebSocket(delay=10)
+    await manager.connect(slow, 1)
+
+    for i in range(3):
+        await manager.broadcast_to_chat(1, {"n": i})
+    # Вытеснение запланировано, но ещё не выполнено - задача не потеряна
+    assert len(manager._pending) == 1
+    await manager.close()
+    assert slow.closed_with == 1013
+    assert manager._pending == set()
+
+
+async def test_drop_policy_keeps_slow_consumer_connected():
+    manager = ConnectionManager(queue_size=2, slow_consumer_policy="drop")
+    slow = FakeWebSocket(delay=10)
+    await manager.connect(slow, 1)
+
+    for i in range(5):
+        await manager.broadcast_to_chat(1, {"n": i})
+        await _settle()
+
+    connection = manager.active_connections[1][slow]
+    # Одно сообщение уже у writer-задачи, два в очереди, остальные пропущены
+    assert connection.dropped == 2
+    assert slow.closed_with is None
+    await manager.close()
+
+
+async def test_failed_send_removes_connection():
+    manager = ConnectionManager()
+    broken = FakeWebSocket()
+
+    async def fail(data):
+        raise RuntimeError("connection lost")
+
+    broken.send_text = fail
+    await manager.connect(broken, 1)
+    await manager.broadcast_to_chat(1, {"content": "hi"})
+    await _settle()
+
+    assert manager.active_connections == {}
+
+
+async def test_each_socket_gets_its_negotiated_encoding():
+    manager = ConnectionManager()
+    as_json, as_msgpack = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(as_json, 1)
+    await manager.connect(as_msgpack, 1, subprotocol="pet-chat.msgpack")
+    await manager.broadcast_to_chat(1, {"type": "message.created", "chat_id": 1, "seq": 1})
+    await _settle()
+
+    assert as_msgpack.subprotocol == "pet-chat.msgpack"
+    assert json.loads(as_json.sent[0]) == msgpack.unpackb(as_msgpack.sent[0])
+    assert isinstance(as_msgpack.sent[0], bytes)
+    await manager.close()
+
+
+def test_negotiate_picks_first_supported_subprotocol():
+    assert negotiate(["v2.chat", "pet-chat.msgpack", "pet-chat.json"]) == "pet-chat.msgpack"
+    assert negotiate(["v2.chat"]) is None
+
+
+async def _missing_loader(chat_id, after_seq, limit):
+    raise AssertionError("replay should come from the buffer")
+
+
+async def test_reconnect_replays_gap_from_buffer():
+    manager = ConnectionManager()
+    stays = FakeWebSocket()
+    await manager.connect(stays, 1)
+    for seq in range(1, 6):
+        await manager.broadcast_to_chat(1, {"seq": seq, "content": f"m{seq}"})
+
+    back = FakeWebSocket()
+    await manager.connect(back, 1, last_seq=3, load_missed=_missing_loader)
+    await manager.broadcast_to_chat(1, {"seq": 6, "content": "m6"})
+    await _settle()
+
+    frames = [json.loads(m) for m in back.sent]
+    assert [f.get("seq") for f in frames] == [4, 5, None, 6]
+    assert frames[2] == {
+        "type": "replay", "chat_id": 1, "data": {"last_seq": 5, "complete": True},
+    }
+    await manager.close()
+
+
+async def test_reconnect_falls_back_to_loader_when_buffer_is_short():
+    manager = ConnectionManager(replay_buffer_size=2, replay_limit=3)
+    stays = FakeWebSocket()
+    await manager.connect(stays, 1)
+    for seq in range(1, 6):
+        await manager.broadcast_to_chat(1, {"seq": seq})
+    calls = []
+
+    async def load_missed(chat_id, after_seq, limit):
+        calls.append((chat_id, after_seq, limit))
+        # Пока идёт запрос к базе, в чат приходит новое сообщение
+        await manager.broadcast_to_chat(1, {"seq": 6})
+        return [{"seq": seq} for seq in range(after_seq + 1, after_seq + 1 + limit)]
+
+    back = FakeWebSocket()
+    await manager.connect(back, 1, last_seq=1, load_missed=load_missed)
+    await _settle()
+
+    assert calls == [(1, 1, 3)]
+    frames = [json.loads(m) for m in back.sent]
+    assert [f.get("seq") for f in frames] == [2, 3, 4, None, 6]
+    assert frames[3]["data"]["complete"] is False
+    await manager.close()
+
+
+async def test_buffer_is_dropped_with_last_subscriber():
+    manager = ConnectionManager()
+    first = FakeWebSocket()
+    await manager.connect(first, 1)
+    await manager.broadcast_to_chat(1, {"seq": 1})
+    await manager.disconnect(first, 1)
+
+    loaded = []
+
+    async def load_missed(chat_id, after_seq, limit):
+        loaded.append(after_seq)
+        return []
+
+    await manager.connect(FakeWebSocket(), 1, last_seq=0, load_missed=load_missed)
+    assert loaded == [0]
+    await manager.close()
+
+
+class FakePubSub:
+    """Redis pub/sub whose replies the test hands out itself."""
+
+    def __init__(self):
+        self.replies = asyncio.Queue()
+        self.subscribed = []
+
+    async def subscribe(self, channel):
+        self.subscribed.append(channel)
+
+    async def get_message(self, timeout):
+        try:
+            return await asyncio.wait_for(self.replies.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        pass
+
+
+async def test_redis_subscribe_waits_for_confirmation():
+    backend = RedisBroadcastBackend("redis://localhost:1")
+    backend._pubsub = pubsub = FakePubSub()
+    delivered = []
+
+    async def deliver(chat_id, data):
+        delivered.append((chat_id, data))
+
+    backend.bind(deliver)
+    subscribing = asyncio.create_task(backend.subscribe(7))
+    await asyncio.sleep(0.05)
+    # Команда ушла, но Redis ещё не подтвердил - сообщения пока не доходят
+    assert pubsub.subscribed == ["chat:7"]
+    assert not subscribing.done()
+
+    await pubsub.replies.put({"type": "subscribe", "channel": "chat:7", "data": 1})
+    await asyncio.wait_for(subscribing, 1)
+    await pubsub.replies.put({"type": "message", "channel": "chat:7", "data": "{}"})
+    await asyncio.sleep(0.05)
+    assert delivered == [(7, "{}")]
+    await backend.close()
+
+
+def _worker(url, ready, received):
+    async def run():
+        manager = ConnectionManager(RedisBroadcastBackend(url))
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, 7)
+        ready.set()
+        for _ in range(100):
+            if websocket.sent:
+                break
+            await asyncio.sleep(0.05)
+        received.put(websocket.sent)
+        await manager.close()
+
+    asyncio.run(run())
+
+
+async def test_redis_backend_delivers_across_processes(redis_url):
+    ctx = multiprocessing.get_context("spawn")
+    ready, received = ctx.Event(), ctx.Queue()
+    worker = ctx.Process(target=_worker, args=(redis_url, ready, received))
+    worker.start()
+    try:
+        assert await asyncio.to_thread(ready.wait, 10)
+        manager = ConnectionManager(RedisBroadcastBackend(redis_url))
+        local = FakeWebSocket()
+        await manager.connect(local, 7)
+        await manager.broadcast_to_chat(7, {"content": "from worker A"})
+
+        sent = await asyncio.to_thread(received.get, True, 10)
+        assert [json.loads(m) for m in sent] == [{"content": "from worker A"}]
+        for _ in range(20):
+            if local.sent:
+                break
+            await asyncio.sleep(0.05)
+        # Отправитель получает своё сообщение ровно один раз - через канал
+        assert len(local.sent) == 1
+        await manager.close()
+    finally:
+        worker.join(10)